@@ -0,0 +1,88 @@
+"""Load test for ShardedCounter against a simulated document store.
+
+Each shard document accepts one write at a time and every write holds it for ``--write-latency``
+seconds, which models Firestore's per-document write serialization. Throughput should grow with the
+shard count until the writer threads, not the documents, become the bottleneck.
+
+    PYTHONPATH=src python benchmarks/counter_load.py --threads 32 --shards 1 2 4 8 16
+"""
+
+import argparse
+import threading
+import time
+from collections import defaultdict
+
+from pybot.counter import ShardedCounter
+
+
+class SimulatedShardStore:
+    def __init__(self, write_latency: float, read_latency: float):
+        self.write_latency = write_latency
+        self.read_latency = read_latency
+        self._docs: defaultdict[tuple[str, int], int] = defaultdict(int)
+        self._doc_locks: defaultdict[tuple[str, int], threading.Lock] = defaultdict(threading.Lock)
+        self._guard = threading.Lock()
+
+    def incr_shard(self, key: str, amount: int, shard: int) -> None:
+        with self._guard:
+            lock = self._doc_locks[(key, shard)]
+        with lock:
+            time.sleep(self.write_latency)
+            self._docs[(key, shard)] += amount
+
+    def get_count(self, key: str) -> int:
+        time.sleep(self.read_latency)
+        with self._guard:
+            return sum(v for (k, _), v in self._docs.items() if k == key)
+
+
+def run(shards: int, threads: int, duration: float, args: argparse.Namespace) -> tuple[float, bool]:
+    store = SimulatedShardStore(args.write_latency, args.read_latency)
+    counter = ShardedCounter(
+        store, shards=shards, flush_interval=args.flush_interval, read_interval=args.read_interval
+    ).start()
+    stop = threading.Event()
+    ops = [0] * threads
+    monotonic = [True] * threads
+
+    def worker(i: int) -> None:
+        last = 0
+        while not stop.is_set():
+            value = counter.incr('hot')
+            monotonic[i] &= value > last
+            last = value
+            ops[i] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for w in workers:
+        w.start()
+    time.sleep(duration)
+    stop.set()
+    for w in workers:
+        w.join()
+    counter.close()
+    assert store.get_count('hot') == sum(ops), 'lost increments'
+    return sum(ops) / duration, all(monotonic)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n', 1)[0])
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=2.0)
+    parser.add_argument('--write-latency', type=float, default=0.005)
+    parser.add_argument('--read-latency', type=float, default=0.001)
+    parser.add_argument('--flush-interval', type=float, default=0.0)
+    parser.add_argument('--read-interval', type=float, default=0.0)
+    args = parser.parse_args()
+
+    print(f'{"shards":>6} {"ops/s":>10} {"speedup":>8} monotonic')
+    baseline = None
+    for shards in args.shards:
+        throughput, monotonic = run(shards, args.threads, args.duration, args)
+        baseline = baseline or throughput
+        print(f'{shards:>6} {throughput:>10.1f} {throughput / baseline:>7.2f}x {monotonic}')
+
+
+if __name__ == '__main__':
+    main()
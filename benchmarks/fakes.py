@@ -0,0 +1,222 @@
+"""Local stand-ins for Telegram and the LLM endpoint used by the benchmarks.
+
+Nothing here talks to the network beyond 127.0.0.1, so every benchmark can run offline on one box.
+"""
+
+import itertools
+import json
+import random
+import threading
+import time
+import urllib.request
+from collections import Counter
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+
+def classify_prompt(prompt: str) -> str:
+    if 'matchmaking assistant' in prompt:
+        return 'register'
+    if 'event planner' in prompt:
+        return 'events'
+    return 'message'
+
+
+def fake_completion(prompt: str) -> str:
+    kind = classify_prompt(prompt)
+    if kind == 'events' and 'following user profiles' in prompt:
+        profiles = prompt.count('\nProfile ') - 2  # minus the two in the format example
+        return '\n'.join(f'Profile {n}:\n' + fake_completion('event planner') for n in range(1, profiles + 1))
+    if kind == 'events':
+        lines = [f'{i}. Event {random.randrange(10**6)} - 2025-0{i}-1{i} - https://example.com/{i}' for i in (1, 2, 3)]
+        return '\n'.join(lines)
+    if kind == 'register':
+        return '- User 1: shared interests\n- User 2: similar description'
+    return f'echo: {prompt[:200]}'
+
+
+class FakeLLMServer:
+    """Chat-completions endpoint with configurable latency, error rate and SSE streaming."""
+
+    def __init__(self, latency: float = 0.2, jitter: float = 0.05, error_rate: float = 0.0, token_delay: float = 0.01):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.token_delay = token_delay
+        self.calls: Counter[str] = Counter()
+        self.errors: Counter[str] = Counter()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self._server.server_address[1]}'
+
+    def start(self) -> 'FakeLLMServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-llm', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler_class(self) -> type[BaseHTTPRequestHandler]:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self) -> None:  # noqa: N802
+                payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                prompt = payload['messages'][-1]['content']
+                kind = classify_prompt(prompt)
+                with fake._lock:
+                    fake.calls[kind] += 1
+                time.sleep(max(random.gauss(fake.latency, fake.jitter), 0))
+                if random.random() < fake.error_rate:
+                    with fake._lock:
+                        fake.errors[kind] += 1
+                    self.send_response(random.choice([HTTPStatus.TOO_MANY_REQUESTS, HTTPStatus.SERVICE_UNAVAILABLE]))
+                    self.send_header('Retry-After', '0')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                content = fake_completion(prompt)
+                if payload.get('stream'):
+                    self._stream(content)
+                else:
+                    body = json.dumps({'choices': [{'message': {'role': 'assistant', 'content': content}}]}).encode()
+                    self.send_response(HTTPStatus.OK)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+            def _stream(self, content: str) -> None:
+                self.send_response(HTTPStatus.OK)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                for token in content.split(' '):
+                    chunk = {'choices': [{'delta': {'content': token + ' '}}]}
+                    self.wfile.write(f'data: {json.dumps(chunk)}\n\n'.encode())
+                    self.wfile.flush()
+                    time.sleep(fake.token_delay)
+                self.wfile.write(b'data: [DONE]\n\n')
+                self.close_connection = True
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        return Handler
+
+
+class FakeSentMessage:
+    def __init__(self, bot: 'FakeBot', chat_id: int, text: str):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.text = text
+
+    def edit_text(self, text: str) -> 'FakeSentMessage':
+        self.text = text
+        self.bot.record(self.chat_id, text, edited=True)
+        return self
+
+
+class FakeBot:
+    """Records outgoing messages instead of calling the Bot API."""
+
+    def __init__(self):
+        self.sent = 0
+        self.edits = 0
+        self._lock = threading.Lock()
+
+    def record(self, chat_id: int, text: str, edited: bool = False) -> None:
+        with self._lock:
+            if edited:
+                self.edits += 1
+            else:
+                self.sent += 1
+
+    def send_message(self, chat_id: int, text: str, **_: Any) -> FakeSentMessage:
+        self.record(chat_id, text)
+        return FakeSentMessage(self, chat_id, text)
+
+
+class FakeUser:
+    def __init__(self, user_id: int, username: str):
+        self.id = user_id
+        self.username = username
+
+
+class FakeChat:
+    def __init__(self, chat_id: int):
+        self.id = chat_id
+
+
+class FakeMessage:
+    def __init__(self, bot: FakeBot, chat: FakeChat, user: FakeUser, text: str):
+        self.bot = bot
+        self.chat = chat
+        self.from_user = user
+        self.text = text
+
+    def reply_text(self, text: str, **_: Any) -> FakeSentMessage:
+        return self.bot.send_message(self.chat.id, text)
+
+
+class FakeUpdate:
+    _ids = itertools.count(1)
+
+    def __init__(self, bot: FakeBot, user: FakeUser, text: str):
+        self.update_id = next(self._ids)
+        self.effective_chat = FakeChat(user.id)
+        self.message = FakeMessage(bot, self.effective_chat, user, text)
+        self.effective_message = self.message
+        self.effective_user = user
+
+
+class FakeContext:
+    def __init__(self, bot: FakeBot, args: list[str] | None = None):
+        self.bot = bot
+        self.args = args
+
+
+def update_payload(update_id: int, user_id: int, username: str, text: str) -> dict[str, Any]:
+    """A Bot API ``Update`` as Telegram would POST it to a webhook."""
+    entities = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}] if text.startswith('/') else []
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': username, 'username': username},
+            'text': text,
+            'entities': entities,
+        },
+    }
+
+
+class FakeTelegram:
+    """Plays Telegram's side of a webhook: POSTs updates to one or more bot replicas."""
+
+    def __init__(self, urls: list[str], secret_token: str | None = None):
+        self.urls = urls
+        self.secret_token = secret_token
+        self._next = itertools.cycle(urls)
+
+    def post(self, payload: dict[str, Any]) -> int:
+        headers = {'Content-Type': 'application/json'}
+        if self.secret_token:
+            headers['X-Telegram-Bot-Api-Secret-Token'] = self.secret_token
+        request = urllib.request.Request(next(self._next), json.dumps(payload).encode(), headers, method='POST')
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
@@ -0,0 +1,234 @@
+"""End-to-end load test: synthetic users drive TelegramCommandHandler against local stand-ins.
+
+The LLM is a local HTTP server with configurable latency, error rate and streaming, storage is the
+in-memory repository and Telegram is replaced by recording fakes. Each virtual user registers, then
+loops over a weighted mix of /register, /events, /add and free text. The report lists p50/p95/p99
+latency and throughput per command plus the upstream LLM calls each command caused. Budgets turn it
+into a regression gate: the exit status is non-zero when one is exceeded.
+
+    PYTHONPATH=src python benchmarks/loadtest.py --users 50 --duration 20 --llm-latency 0.5 --max-p99 3000
+"""
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable
+
+from fakes import FakeBot, FakeContext, FakeLLMServer, FakeUpdate, FakeUser
+
+from pybot.chatbot import TelegramBot
+from pybot.setting import (
+    AppConfig,
+    CacheConfig,
+    ChatGPTConfig,
+    ConversationConfig,
+    EventBatchConfig,
+    HistoryConfig,
+    OutboxConfig,
+    PrecomputeConfig,
+    RateLimitConfig,
+    RedisConfig,
+    RequestLogConfig,
+    StartupConfig,
+    StorageConfig,
+    TelegramConfig,
+)
+
+INTERESTS = ['gaming', 'vr', 'music', 'hiking', 'cooking', 'chess', 'anime', 'football', 'jazz', 'python']
+KEYWORDS = ['hello', 'pizza', 'python', 'bot']
+
+
+def build_config(args: argparse.Namespace, llm_url: str) -> AppConfig:
+    return AppConfig(
+        telegram=TelegramConfig(access_token='123456:load-test', stream_replies=args.stream, edit_interval=0.2),
+        chatgpt=ChatGPTConfig(
+            basicurl=llm_url,
+            modelname='fake',
+            apiversion='fake',
+            access_token='fake',
+            max_concurrency=args.llm_concurrency,
+            backoff_base=0.05,
+        ),
+        redis=RedisConfig(host='127.0.0.1', port=6379),
+        storage=StorageConfig(backend='memory'),
+        ratelimit=RateLimitConfig(backend='memory', limit=10**9),
+        requestlog=RequestLogConfig(backend='memory'),
+        cache=CacheConfig(enabled=not args.no_cache),
+        history=HistoryConfig(backend='memory'),
+        conversation=ConversationConfig(backend='memory'),
+        startup=StartupConfig(warm_up=False),
+        outbox=OutboxConfig(enabled=args.outbox),
+        precompute=PrecomputeConfig(enabled=args.precompute, backend='memory', interval=1.0, budget=10**6),
+        eventbatch=EventBatchConfig(enabled=args.batch > 1, max_size=max(args.batch, 1), max_wait=args.batch_wait),
+    )
+
+
+def command_args(command: str, rng: random.Random) -> tuple[str, list[str] | None]:
+    if command == 'register':
+        interests = rng.sample(INTERESTS, 3)
+        return '/register ' + ' '.join(interests), [*interests, '"I', 'like', 'meeting', 'people"']
+    if command == 'add':
+        keyword = rng.choice(KEYWORDS)
+        return f'/add {keyword}', [keyword]
+    if command == 'message':
+        return rng.choice(['hi there', 'what should I do this weekend?', 'tell me a joke']), None
+    return f'/{command}', None
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: defaultdict[str, list[float]] = defaultdict(list)
+        self.failures: defaultdict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, command: str, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self.latencies[command].append(seconds * 1000)
+            if not ok:
+                self.failures[command] += 1
+
+
+def percentile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+def run_user(
+    user_id: int,
+    bot: TelegramBot,
+    fake_bot: FakeBot,
+    mix: dict[str, float],
+    deadline: float,
+    recorder: Recorder,
+) -> None:
+    rng = random.Random(user_id)
+    user = FakeUser(user_id, f'user{user_id}')
+    handler = bot.command_handler
+    commands: dict[str, Callable[[Any, Any], Any]] = {
+        'register': handler.register,
+        'events': handler.events,
+        'more_events': handler.more_events,
+        'add': handler.add,
+        'message': handler.handle_message,
+    }
+    sequence = ['register']
+    while time.monotonic() < deadline:
+        command = sequence.pop() if sequence else rng.choices(list(mix), weights=list(mix.values()))[0]
+        text, args = command_args(command, rng)
+        started = time.perf_counter()
+        ok = True
+        try:
+            commands[command](FakeUpdate(fake_bot, user, text), FakeContext(fake_bot, args))
+        except Exception:
+            ok = False
+        recorder.record(command, time.perf_counter() - started, ok)
+
+
+def build_report(
+    bot: TelegramBot, fake_bot: FakeBot, llm: FakeLLMServer, recorder: Recorder, elapsed: float
+) -> dict[str, Any]:
+    """Print the per-command table and component stats, and return them as one report."""
+    report: dict[str, Any] = {'elapsed': elapsed, 'commands': {}}
+    total = 0
+    print(f'{"command":<10} {"count":>7} {"fail":>5} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"req/s":>8} {"llm":>6}')
+    for command, samples in sorted(recorder.latencies.items()):
+        total += len(samples)
+        row = {
+            'count': len(samples),
+            'failures': recorder.failures[command],
+            'p50': statistics.median(samples),
+            'p95': percentile(samples, 0.95),
+            'p99': percentile(samples, 0.99),
+            'throughput': len(samples) / elapsed,
+            'llm_calls': llm.calls[command],
+            'llm_errors': llm.errors[command],
+        }
+        report['commands'][command] = row
+        print(
+            f'{command:<10} {row["count"]:>7} {row["failures"]:>5} {row["p50"]:>9.1f} {row["p95"]:>9.1f} '
+            f'{row["p99"]:>9.1f} {row["throughput"]:>8.1f} {row["llm_calls"]:>6}'
+        )
+    report['throughput'] = total / elapsed
+    report['messages_sent'] = fake_bot.sent
+    report['log_sink'] = bot.log_sink.stats()
+    if bot.outbox is not None:
+        report['outbox'] = bot.outbox.stats()
+        print(f"outbox: {report['outbox']}")
+    if bot.precomputer is not None:
+        report['precompute'] = bot.precomputer.stats()
+        print(f"precompute: {report['precompute']}")
+    if bot.event_service.batcher is not None:
+        report['event_batches'] = bot.event_service.batcher.stats()
+        print(f"event batches: {report['event_batches']}")
+    print(f'total {total} requests in {elapsed:.1f}s = {report["throughput"]:.1f} req/s, {fake_bot.sent} replies')
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n', 1)[0])
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--mix', default='register=1,events=3,add=4,message=2', help='command=weight,...')
+    parser.add_argument('--llm-latency', type=float, default=0.2)
+    parser.add_argument('--llm-jitter', type=float, default=0.05)
+    parser.add_argument('--llm-error-rate', type=float, default=0.0)
+    parser.add_argument('--llm-concurrency', type=int, default=16)
+    parser.add_argument('--stream', action='store_true', help='stream free-text replies')
+    parser.add_argument('--no-cache', action='store_true', help='disable the completion cache')
+    parser.add_argument('--outbox', action='store_true', help='send replies through the rate-limited outbox')
+    parser.add_argument('--precompute', action='store_true', help='serve /events from background-generated sets')
+    parser.add_argument('--batch', type=int, default=1, help='batch up to this many /events profiles per LLM call')
+    parser.add_argument('--batch-wait', type=float, default=0.1, help='seconds to collect an /events batch')
+    parser.add_argument('--json', help='write the report to this file')
+    parser.add_argument('--max-p99', type=float, help='fail if any command p99 exceeds this many ms')
+    parser.add_argument('--min-throughput', type=float, help='fail if total requests/s falls below this')
+    args = parser.parse_args()
+    mix = {name: float(weight) for name, weight in (item.split('=') for item in args.mix.split(','))}
+
+    llm = FakeLLMServer(args.llm_latency, args.llm_jitter, args.llm_error_rate).start()
+    bot = TelegramBot(build_config(args, llm.url))
+    fake_bot = FakeBot()
+    bot.log_sink.start()
+    if bot.precomputer is not None:
+        bot.precomputer.start()
+    if bot.outbox is not None:
+        bot.outbox.sender = fake_bot
+        bot.outbox.start()
+    recorder = Recorder()
+    deadline = time.monotonic() + args.duration
+    users = [
+        threading.Thread(target=run_user, args=(i, bot, fake_bot, mix, deadline, recorder))
+        for i in range(1, args.users + 1)
+    ]
+    started = time.perf_counter()
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+    elapsed = time.perf_counter() - started
+    bot.log_sink.close()
+    if bot.outbox is not None:
+        bot.outbox.close()
+    if bot.precomputer is not None:
+        bot.precomputer.close()
+    llm.stop()
+
+    report = build_report(bot, fake_bot, llm, recorder, elapsed)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    failed = args.min_throughput is not None and report['throughput'] < args.min_throughput
+    if args.max_p99 is not None:
+        failed |= any(row['p99'] > args.max_p99 for row in report['commands'].values())
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
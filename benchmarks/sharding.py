@@ -0,0 +1,165 @@
+"""Sharding benchmark: update throughput of the supervisor with 1..N shard processes on one host.
+
+Every shard runs the real TelegramCommandHandler with its own in-memory repository and a local fake
+LLM, so the work is CPU-bound and scales only as far as the shards spread over cores. Each chat
+registers first and then sends a mix of /add, /events and free text; shards check that they see
+every chat's updates in the order they were routed. Stores are per shard here, so matchmaking scans
+fewer profiles as shards are added; keep --users small relative to --updates to limit that effect.
+
+    PYTHONPATH=src python benchmarks/sharding.py --workers 1,2,4 --updates 4000 --min-speedup 1.5
+"""
+
+import argparse
+import functools
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from typing import Any
+
+from fakes import FakeBot, FakeContext, FakeLLMServer, FakeUpdate, FakeUser, update_payload
+
+from pybot.chatbot import TelegramBot
+from pybot.setting import (
+    AppConfig,
+    ChatGPTConfig,
+    ConversationConfig,
+    HistoryConfig,
+    MetricsConfig,
+    OutboxConfig,
+    RateLimitConfig,
+    RedisConfig,
+    RequestLogConfig,
+    StartupConfig,
+    StorageConfig,
+    TelegramConfig,
+)
+from pybot.supervisor import ShardSupervisor
+
+INTERESTS = ['gaming', 'vr', 'music', 'hiking', 'cooking', 'chess', 'anime', 'football', 'jazz', 'python']
+MIX = {'add': 4, 'events': 2, 'message': 4}
+
+
+def build_config() -> AppConfig:
+    return AppConfig(
+        telegram=TelegramConfig(access_token='123456:sharding-benchmark'),
+        chatgpt=ChatGPTConfig(basicurl='http://127.0.0.1:9', modelname='fake', apiversion='fake', access_token='fake'),
+        redis=RedisConfig(host='127.0.0.1', port=6379),
+        storage=StorageConfig(backend='memory'),
+        ratelimit=RateLimitConfig(backend='memory', limit=10**9),
+        requestlog=RequestLogConfig(backend='memory'),
+        history=HistoryConfig(backend='memory'),
+        conversation=ConversationConfig(backend='memory'),
+        startup=StartupConfig(warm_up=False),
+        metrics=MetricsConfig(enabled=False),
+        outbox=OutboxConfig(enabled=False),
+    )
+
+
+def run_shard(llm_latency: float, results: Any, config: AppConfig, index: int, updates: Any) -> None:
+    """Shard entry point: like ``pybot.supervisor.run_shard`` but with Telegram and the LLM faked."""
+    llm = FakeLLMServer(llm_latency, 0.0).start()
+    bot = TelegramBot(config.model_copy(update={'chatgpt': config.chatgpt.model_copy(update={'basicurl': llm.url})}))
+    fake_bot = FakeBot()
+    handler = bot.command_handler
+    commands = {
+        'register': handler.register,
+        'events': handler.events,
+        'add': handler.add,
+        'message': handler.handle_message,
+    }
+    last: dict[int, int] = {}
+    handled = out_of_order = 0
+    results.put(('ready', index, 0, 0, time.time()))
+    while (data := updates.get()) is not None:
+        message = data['message']
+        chat_id = message['chat']['id']
+        out_of_order += last.get(chat_id, -1) > data['update_id']
+        last[chat_id] = data['update_id']
+        text = message['text']
+        command = text.split()[0][1:] if text.startswith('/') else 'message'
+        user = FakeUser(message['from']['id'], message['from']['username'])
+        commands[command](FakeUpdate(fake_bot, user, text), FakeContext(fake_bot, text.split()[1:] or None))
+        handled += 1
+    llm.stop()
+    results.put(('done', index, handled, out_of_order, time.time()))
+
+
+def make_updates(users: int, count: int, seed: int = 1) -> list[dict[str, Any]]:
+    rng = random.Random(seed)
+    texts = []
+    for user_id in range(1, users + 1):
+        texts.append((user_id, '/register ' + ' '.join(rng.sample(INTERESTS, 3)) + ' "I like meeting people"'))
+    while len(texts) < count:
+        user_id = rng.randrange(1, users + 1)
+        command = rng.choices(list(MIX), weights=list(MIX.values()))[0]
+        if command == 'add':
+            texts.append((user_id, f'/add {rng.choice(INTERESTS)}'))
+        elif command == 'events':
+            texts.append((user_id, '/events'))
+        else:
+            texts.append((user_id, rng.choice(['hi there', 'what should I do this weekend?', 'tell me a joke'])))
+    return [update_payload(i, user_id, f'user{user_id}', text) for i, (user_id, text) in enumerate(texts, 1)]
+
+
+def measure(workers: int, updates: list[dict[str, Any]], llm_latency: float) -> dict[str, Any]:
+    results = multiprocessing.get_context('spawn').Queue()
+    target = functools.partial(run_shard, llm_latency, results)
+    supervisor = ShardSupervisor(build_config(), workers=workers, queue_size=len(updates) + 1, target=target).start()
+    for _ in range(workers):
+        results.get()
+    started = time.time()
+    for update in updates:
+        supervisor.route(update)
+    # Closing queues the end marker behind every routed update, so it returns once all were handled.
+    supervisor.close(timeout=600)
+    done = [results.get() for _ in range(workers)]
+    elapsed = max(row[4] for row in done) - started
+    handled = sum(row[2] for row in done)
+    return {
+        'workers': workers,
+        'elapsed': elapsed,
+        'handled': handled,
+        'out_of_order': sum(row[3] for row in done),
+        'per_shard': sorted(row[2] for row in done),
+        'throughput': handled / elapsed,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n', 1)[0])
+    default_workers = ','.join(str(n) for n in (1, 2, 4, 8) if n <= (os.cpu_count() or 1))
+    parser.add_argument('--workers', default=default_workers, help='comma-separated shard counts to compare')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--updates', type=int, default=4000)
+    parser.add_argument('--llm-latency', type=float, default=0.0)
+    parser.add_argument('--json', help='write the report to this file')
+    parser.add_argument('--min-speedup', type=float, help='fail if the largest shard count is not this much faster')
+    args = parser.parse_args()
+
+    updates = make_updates(args.users, args.updates)
+    report = []
+    print(f'{"workers":>7} {"updates":>8} {"seconds":>8} {"upd/s":>8} {"speedup":>8} {"unordered":>9}')
+    for workers in (int(n) for n in args.workers.split(',')):
+        row = measure(workers, updates, args.llm_latency)
+        row['speedup'] = row['throughput'] / report[0]['throughput'] if report else 1.0
+        report.append(row)
+        print(
+            f'{workers:>7} {row["handled"]:>8} {row["elapsed"]:>8.2f} {row["throughput"]:>8.1f} '
+            f'{row["speedup"]:>8.2f} {row["out_of_order"]:>9}'
+        )
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    failed = any(row['out_of_order'] or row['handled'] != len(updates) for row in report)
+    if args.min_speedup is not None:
+        failed |= report[-1]['speedup'] < args.min_speedup
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
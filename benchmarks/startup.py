@@ -0,0 +1,91 @@
+"""Startup-time benchmark: import, construction and warm-up cost of the bot process.
+
+Every run happens in a fresh interpreter so module caches do not hide regressions. The default
+configuration uses in-memory backends, so the benchmark runs offline; pass ``--config`` to measure
+a real deployment. The exit status is non-zero when a phase exceeds its budget.
+
+    PYTHONPATH=src python benchmarks/startup.py --runs 5 --max-import 1.5 --max-construct 0.5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+PROBE = """
+import json, time
+started = time.perf_counter()
+from pybot.chatbot import TelegramBot
+imported = time.perf_counter()
+bot = TelegramBot()
+constructed = time.perf_counter()
+warm_up = bot.warm_up() if {warm_up} else 0.0
+print(json.dumps({{'import': imported - started, 'construct': constructed - imported, 'warm_up': warm_up}}))
+"""
+
+OFFLINE_INI = """
+[TELEGRAM]
+ACCESS_TOKEN = 123456:offline-benchmark-token
+[CHATGPT]
+BASICURL = http://127.0.0.1:9
+MODELNAME = offline
+APIVERSION = offline
+ACCESS_TOKEN = offline
+[REDIS]
+HOST = 127.0.0.1
+PORT = 6379
+[STORAGE]
+BACKEND = memory
+[REQUESTLOG]
+BACKEND = memory
+[HISTORY]
+BACKEND = memory
+[CONVERSATION]
+BACKEND = memory
+[PRECOMPUTE]
+BACKEND = memory
+"""
+
+
+def probe(config: str, warm_up: bool) -> dict[str, float]:
+    env = {**os.environ, 'PYBOT_CONFIG': config}
+    env.pop('TELEGRAM_ACCESS_TOKEN', None)
+    env.pop('CHATGPT_ACCESS_TOKEN', None)
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE.format(warm_up=warm_up)], env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n', 1)[0])
+    parser.add_argument('--config', help='INI to load; defaults to an offline in-memory configuration')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--warm-up', action='store_true', help='also time TelegramBot.warm_up (needs network)')
+    parser.add_argument('--max-import', type=float, default=None)
+    parser.add_argument('--max-construct', type=float, default=None)
+    parser.add_argument('--max-warm-up', type=float, default=None)
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile('w', suffix='.ini', delete=False) as ini:
+        ini.write(OFFLINE_INI)
+    try:
+        runs = [probe(args.config or ini.name, args.warm_up) for _ in range(args.runs)]
+    finally:
+        os.unlink(ini.name)
+
+    failed = False
+    budgets = {'import': args.max_import, 'construct': args.max_construct, 'warm_up': args.max_warm_up}
+    for phase, budget in budgets.items():
+        median = statistics.median(run[phase] for run in runs)
+        over = budget is not None and median > budget
+        failed |= over
+        print(f'{phase:<10} median {median * 1000:8.1f} ms' + (f'  (budget {budget * 1000:.0f} ms)' if budget else ''))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
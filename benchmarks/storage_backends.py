@@ -0,0 +1,86 @@
+"""Compare per-operation latency of the storage backends on the bot's hot paths.
+
+Backends are built from the command line, so no .ini is needed:
+
+    PYTHONPATH=src python benchmarks/storage_backends.py --backends memory redis firebase --ops 200 \
+        --redis-host 127.0.0.1 --firebase-credentials secret/serviceAccountKey.json
+"""
+
+import argparse
+import statistics
+import time
+import uuid
+from typing import Callable
+
+from pybot.repository import MemoryRepository, Repository
+from pybot.setting import RedisConfig
+
+
+def build(backend: str, args: argparse.Namespace) -> Repository:
+    if backend == 'memory':
+        return MemoryRepository()
+    if backend == 'redis':
+        from pybot.repository.redis import RedisRepository
+
+        redis = RedisConfig(
+            host=args.redis_host, port=args.redis_port, password=args.redis_password, ssl=args.redis_ssl
+        )
+        return RedisRepository(redis)
+    if backend == 'firebase':
+        from pybot.repository.firebase import FirebaseRepository
+
+        return FirebaseRepository(args.firebase_credentials)
+    raise ValueError(f'Unknown storage backend: {backend}')
+
+
+def measure(fn: Callable[[int], object], ops: int) -> list[float]:
+    samples = []
+    for i in range(ops):
+        start = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def workloads(repo: Repository, prefix: str) -> dict[str, Callable[[int], object]]:
+    names = [f'{prefix}-user-{i}' for i in range(20)]
+    for name in names:
+        repo.save_user({'name': name, 'username': name, 'interests': ['bench'], 'description': ''})
+    return {
+        'get_user': lambda i: repo.get_user(names[i % len(names)]),
+        'get_users(20)': lambda i: repo.get_users(names),
+        'incr': lambda i: repo.incr(f'{prefix}-counter'),
+        'incr_many(20)': lambda i: repo.incr_many({f'{prefix}-counter-{j}': 1 for j in range(20)}),
+        'rpush': lambda i: repo.rpush(f'{prefix}-list', str(i)),
+        'rpush_many(100)': lambda i: repo.rpush_many(f'{prefix}-list', [str(j) for j in range(100)]),
+        'push_capped': lambda i: repo.push_capped(f'{prefix}-ring', [str(i)], 50),
+        'read_window(20)': lambda i: repo.read_window(f'{prefix}-ring', 0, 20),
+        'incr_fields(2)': lambda i: repo.incr_fields({f'{prefix}-period': {'a:0': 1}, f'{prefix}-period:u': {'0': 1}}),
+        'get_fields(60)': lambda i: repo.get_fields([f'{prefix}-period'] * 60),
+        'rate_limit': lambda i: repo.rate_limit(f'{prefix}-rate', 10**9, 60),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n', 1)[0])
+    parser.add_argument('--backends', nargs='+', default=['memory'])
+    parser.add_argument('--ops', type=int, default=200)
+    parser.add_argument('--redis-host', default='127.0.0.1')
+    parser.add_argument('--redis-port', type=int, default=6379)
+    parser.add_argument('--redis-password')
+    parser.add_argument('--redis-ssl', action='store_true')
+    parser.add_argument('--firebase-credentials', default='secret/serviceAccountKey.json')
+    args = parser.parse_args()
+
+    print(f'{"backend":<10} {"operation":<16} {"p50 ms":>9} {"p95 ms":>9} {"ops/s":>10}')
+    for backend in args.backends:
+        repo = build(backend, args)
+        for name, fn in workloads(repo, f'bench-{uuid.uuid4().hex[:8]}').items():
+            samples = sorted(measure(fn, args.ops))
+            p95 = samples[int(len(samples) * 0.95) - 1]
+            throughput = 1000 / statistics.mean(samples)
+            print(f'{backend:<10} {name:<16} {statistics.median(samples):>9.3f} {p95:>9.3f} {throughput:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
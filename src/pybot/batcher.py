@@ -0,0 +1,121 @@
+import logging
+import threading
+import time
+from typing import Callable, Generic, Sequence, TypeVar
+
+from pybot.deadline import remaining
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+class _Entry(Generic[T, R]):
+    __slots__ = ('item', 'enqueued', 'done', 'result', 'fallback')
+
+    def __init__(self, item: T):
+        self.item = item
+        self.enqueued = time.monotonic()
+        self.done = threading.Event()
+        self.result: R | None = None
+        self.fallback = False
+
+
+class MicroBatcher(Generic[T, R]):
+    """Collects concurrent submissions for up to ``max_wait`` seconds and runs them as one batch.
+
+    The first caller of a window leads: it waits until the window expires or ``max_size`` items have
+    arrived, then runs ``batch_fn`` on everything collected. ``batch_fn`` returns one result per item, or
+    None where it could not produce one; those callers fall back to ``single_fn`` in their own thread.
+    A caller whose deadline passes while another thread runs its batch gets ``TimeoutError``.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[Sequence[T]], Sequence[R | None]],
+        single_fn: Callable[[T], R],
+        max_size: int = 8,
+        max_wait: float = 0.1,
+    ):
+        self.batch_fn = batch_fn
+        self.single_fn = single_fn
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self._pending: list[_Entry[T, R]] = []
+        self._cond = threading.Condition()
+        self.batches = 0
+        self.items = 0
+        self.fallbacks = 0
+        self.largest = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def submit(self, item: T) -> R:
+        entry: _Entry[T, R] = _Entry(item)
+        with self._cond:
+            batch = self._pending
+            batch.append(entry)
+            leader = len(batch) == 1
+            if len(batch) >= self.max_size:
+                self._pending = []
+                self._cond.notify_all()
+            elif leader:
+                deadline = entry.enqueued + self.max_wait
+                while self._pending is batch and (left := deadline - time.monotonic()) > 0:
+                    self._cond.wait(left)
+                if self._pending is batch:
+                    self._pending = []
+        if leader:
+            self._run(batch)
+
+        if not entry.done.wait(remaining()):
+            # The batch is still running for the others; this caller's deadline has passed.
+            raise TimeoutError('Batch did not finish before the deadline')
+        if entry.fallback:
+            return self.single_fn(item)
+        return entry.result  # type: ignore
+
+    def stats(self) -> dict[str, float]:
+        with self._cond:
+            return {
+                'batches': self.batches,
+                'items': self.items,
+                'fallbacks': self.fallbacks,
+                'size_avg': self.items / self.batches if self.batches else 0.0,
+                'size_max': self.largest,
+                'wait_avg': self._wait_total / self.items if self.items else 0.0,
+                'wait_max': self._wait_max,
+            }
+
+    def _run(self, batch: list[_Entry[T, R]]) -> None:
+        started = time.monotonic()
+        with self._cond:
+            self.batches += 1
+            self.items += len(batch)
+            self.largest = max(self.largest, len(batch))
+            for entry in batch:
+                waited = started - entry.enqueued
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+
+        if len(batch) == 1:
+            # Nothing to amortise: the caller makes its ordinary single call.
+            batch[0].fallback = True
+            batch[0].done.set()
+            return
+        results: Sequence[R | None] = []
+        try:
+            results = self.batch_fn([entry.item for entry in batch])
+        except Exception as e:
+            logging.warning(f'Batch of {len(batch)} failed, falling back to single calls: {e}')
+        fallbacks = 0
+        for index, entry in enumerate(batch):
+            # Missing or unparsable results leave the caller to its own single call.
+            result = results[index] if index < len(results) else None
+            if result is None:
+                entry.fallback = True
+                fallbacks += 1
+            else:
+                entry.result = result
+            entry.done.set()
+        with self._cond:
+            self.fallbacks += fallbacks
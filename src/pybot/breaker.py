@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """Fails fast once too many recent calls failed or were slow, and probes before closing again.
+
+    Outcomes of the last ``window`` calls are kept; with at least ``min_calls`` of them, a share of bad
+    ones (errors, or calls slower than ``slow_call``) at or above ``error_rate`` opens the circuit for
+    ``open_seconds``. After that a single probe call is let through: success closes the circuit,
+    failure opens it again.
+    """
+
+    def __init__(
+        self,
+        window: int = 20,
+        *,
+        min_calls: int = 10,
+        error_rate: float = 0.5,
+        slow_call: float = 20.0,
+        open_seconds: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call = slow_call
+        self.open_seconds = open_seconds
+        self.clock = clock
+        self._outcomes: deque[bool] = deque(maxlen=window)  # True for a bad call
+        self._bad = 0
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, success: bool, latency: float = 0.0) -> None:
+        bad = not success or latency >= self.slow_call
+        with self._lock:
+            state = self._current_state()
+            if state == OPEN or (state == HALF_OPEN and not self._probing):
+                # Late outcomes of calls started before the circuit opened.
+                return
+            if state == HALF_OPEN:
+                # The probe's outcome decides whether the circuit closes.
+                self._probing = False
+                if bad:
+                    self._open()
+                else:
+                    self._state = CLOSED
+                    self._outcomes.clear()
+                    self._bad = 0
+                return
+            if len(self._outcomes) == self.window:
+                self._bad -= self._outcomes[0]
+            self._outcomes.append(bad)
+            self._bad += bad
+            if len(self._outcomes) >= self.min_calls and self._bad >= self.error_rate * len(self._outcomes):
+                self._open()
+
+    def cancel(self) -> None:
+        """Hand back a call ``allow`` let through that ended without telling anything about the upstream."""
+        with self._lock:
+            if self._current_state() == HALF_OPEN:
+                self._probing = False
+
+    def stats(self) -> dict[str, float]:
+        with self._lock:
+            return {
+                'state': {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}[self._current_state()],
+                'bad_ratio': self._bad / len(self._outcomes) if self._outcomes else 0.0,
+                'opened': self.opened,
+                'rejected': self.rejected,
+            }
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and self.clock() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+        return self._state
+
+    def _open(self) -> None:
+        self._state = OPEN
+        self._opened_at = self.clock()
+        self.opened += 1
@@ -0,0 +1,122 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, TypeVar
+
+from pybot.repository import Repository
+from pybot.setting import CacheConfig
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+
+def prompt_key(prompt: str) -> str:
+    """Stable key for a prompt, insensitive to whitespace differences."""
+    normalized = ' '.join(prompt.split())
+    return 'llm:' + hashlib.sha256(normalized.encode()).hexdigest()
+
+
+class TTLCache(Generic[K, V]):
+    """Thread-safe LRU cache whose entries also expire after ``ttl`` seconds."""
+
+    def __init__(self, max_size: int = 1024, ttl: float = 3600, clock: Callable[[], float] = time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: K) -> V | None:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires, value = item
+            if expires <= self.clock():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: K, value: V) -> None:
+        with self._lock:
+            self._data[key] = (self.clock() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: K) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+
+class CompletionCache:
+    """LLM completion cache: an in-process LRU in front of an optional shared repository tier."""
+
+    def __init__(self, local: TTLCache[str, str], shared: Repository | None = None, ttl: int = 3600):
+        self.local = local
+        self.shared = shared
+        self.ttl = ttl
+        self.logger = logging.getLogger(__name__)
+        self.shared_hits = 0
+        self.shared_misses = 0
+
+    @classmethod
+    def from_config(cls, config: CacheConfig, shared: Repository | None = None) -> 'CompletionCache':
+        return cls(TTLCache(config.max_size, config.ttl), shared, config.ttl)
+
+    def get(self, prompt: str) -> str | None:
+        key = prompt_key(prompt)
+        value = self.local.get(key)
+        if value is not None or self.shared is None:
+            return value
+        try:
+            value = self.shared.get(key)
+        except Exception as e:
+            self.logger.warning(f'Shared completion cache read failed: {e}')
+            return None
+        if value is None:
+            self.shared_misses += 1
+            return None
+        self.shared_hits += 1
+        self.local.set(key, value)
+        return value
+
+    def set(self, prompt: str, value: str) -> None:
+        key = prompt_key(prompt)
+        self.local.set(key, value)
+        if self.shared is None:
+            return
+        try:
+            self.shared.set(key, value, ttl=self.ttl)
+        except Exception as e:
+            self.logger.warning(f'Shared completion cache write failed: {e}')
+
+    def stats(self) -> dict[str, float]:
+        return {**self.local.stats(), 'shared_hits': self.shared_hits, 'shared_misses': self.shared_misses}
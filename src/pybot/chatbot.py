@@ -1,55 +1,375 @@
+import functools
 import logging
-from typing import Self
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Mapping, Self
 
-from handlers import TelegramCommandHandler
-from repository import FirebaseRepository
-from service.chatgpt import ChatGPTService
-from service.event import EventService
-from service.user import UserService
-from setting import config
-from telegram.ext import CommandHandler, Dispatcher, Filters, MessageHandler, Updater
+from telegram import Update
+from telegram.ext import CallbackContext, CommandHandler, Filters, MessageHandler, Updater
+
+from pybot.cache import CompletionCache, TTLCache
+from pybot.conversation import ConversationStore
+from pybot.counter import ShardedCounter
+from pybot.executor import ChatExecutor
+from pybot.handlers import TelegramCommandHandler
+from pybot.history import EventHistory
+from pybot.limiter import create_limiter
+from pybot.logsink import RequestLogSink
+from pybot.metrics import REGISTRY, InstrumentedRepository, MetricsExporter
+from pybot.outbox import Outbox
+from pybot.precompute import EventPrecomputer
+from pybot.repository import PubSub, Repository, create_repository
+from pybot.rollup import LogRollup
+from pybot.service.chatgpt import ChatGPTService
+from pybot.service.event import EventService
+from pybot.service.user import UserService
+from pybot.setting import AppConfig, StorageBackend, get_config
+from pybot.webhook import WebhookServer
 
 
 class TelegramBot:
-    def __init__(self):
+    def __init__(self, config: AppConfig | None = None):
+        config = config or get_config()
         self.config = config
-        self.chatgpt_service = ChatGPTService(config.chatgpt)
-        self.firebase_repo = FirebaseRepository()
-        self.user_service = UserService(self.chatgpt_service, self.firebase_repo)
-        self.event_service = EventService(self.chatgpt_service, self.firebase_repo)
+        # Set once clients are warmed up and updates are being received.
+        self.ready = threading.Event()
+        self.repositories: dict[str, Repository] = {}
+        self.repo = self.repository(config.storage.backend)
+        self.completion_cache = None
+        if config.cache.enabled:
+            shared = self.repository(config.cache.backend) if config.cache.backend != 'memory' else None
+            self.completion_cache = CompletionCache.from_config(config.cache, shared)
+        self.chatgpt_service = ChatGPTService(config.chatgpt, self.completion_cache)
+        invalidation = config.profilecache.invalidation
+        self.user_service = UserService(
+            self.chatgpt_service,
+            self.repo,
+            match_top_k=config.matching.top_k,
+            profile_cache=TTLCache(config.profilecache.max_size, config.profilecache.ttl),
+            invalidation=self.pubsub(invalidation) if invalidation != 'none' else None,
+            prompt_budget=config.prompt.max_tokens,
+        )
+        self.event_service = EventService(
+            self.chatgpt_service,
+            self.repo,
+            history=EventHistory(self.repository(config.history.backend), config.history.cap),
+            prompt_window=config.history.prompt_window,
+            prompt_budget=config.prompt.max_tokens,
+            batch_size=config.eventbatch.max_size if config.eventbatch.enabled else 1,
+            batch_wait=config.eventbatch.max_wait,
+        )
+        limiter_repo = self.repository(config.ratelimit.backend) if config.ratelimit.backend != 'memory' else None
+        self.limiter = create_limiter(config.ratelimit, limiter_repo)
+        log_repo = self.repository(config.requestlog.backend)
+        self.rollup = LogRollup.from_config(log_repo, config.rollup) if config.rollup.enabled else None
+        self.log_sink = RequestLogSink.from_config(log_repo, config.requestlog, rollup=self.rollup)
+        self.counter = ShardedCounter(
+            self.repo,
+            config.counter.shards,
+            config.counter.flush_interval,
+            read_interval=config.counter.read_interval,
+        )
+        self.precomputer = None
+        if config.precompute.enabled:
+            self.precomputer = EventPrecomputer.from_config(
+                self.event_service,
+                self.user_service,
+                self.repository(config.precompute.backend),
+                config.precompute,
+                idle=self._llm_idle,
+            )
+        self.conversations = None
+        if config.conversation.enabled:
+            backend = config.conversation.backend
+            snapshots = self.repository(backend) if backend != 'memory' else None
+            self.conversations = ConversationStore.from_config(snapshots, config.conversation)
+        self.updater = Updater(token=config.telegram.access_token, use_context=True)
+        self.dispatcher = self.updater.dispatcher
+        self.outbox = Outbox.from_config(self.updater.bot, config.outbox) if config.outbox.enabled else None
         self.command_handler = TelegramCommandHandler(
-            self.firebase_repo,
+            self.repo,
             self.chatgpt_service,
             self.user_service,
             self.event_service,
+            limiter=self.limiter,
+            log_sink=self.log_sink,
+            stream_replies=config.telegram.stream_replies,
+            edit_interval=config.telegram.edit_interval,
+            counter=self.counter,
+            precomputer=self.precomputer,
+            outbox=self.outbox,
+            deadlines=config.deadline.model_dump(by_alias=True),
+            conversations=self.conversations,
+            history_tokens=config.conversation.window_tokens,
+            rollup=self.rollup,
         )
-        self.updater = Updater(token=config.telegram.access_token, use_context=True)
-        self.dispatcher = self.updater.dispatcher
+        self.executor = ChatExecutor.from_config(config.dispatch) if config.dispatch.concurrent else None
+        self.metrics = MetricsExporter.from_config(config.metrics) if config.metrics.enabled else None
+        if self.metrics is not None:
+            self._register_gauges()
+
+    def _register_gauges(self) -> None:
+        """Expose the queue depths and counters the components already keep as metrics gauges."""
+        sources: list[tuple[str, str, Callable[[], Mapping[str, float]], str]] = [
+            ('pybot_log_queue_depth', 'Request log entries waiting to be flushed', self.log_sink.stats, 'queued'),
+            ('pybot_log_dropped_total', 'Request log entries dropped on overflow', self.log_sink.stats, 'dropped'),
+            ('pybot_log_expired_total', 'Hourly request log lists expired', self.log_sink.stats, 'expired'),
+            ('pybot_llm_in_flight', 'Distinct LLM prompts in flight', self.chatgpt_service.inflight.stats, 'in_flight'),
+            (
+                'pybot_llm_deduplicated_total',
+                'LLM calls saved by coalescing',
+                self.chatgpt_service.inflight.stats,
+                'deduplicated',
+            ),
+        ]
+        stats: Callable[[], Mapping[str, float]] = self.chatgpt_service.stats
+        sources.append(('pybot_llm_breaker_state', 'LLM circuit state: 0 closed, 1 half-open, 2 open', stats, 'state'))
+        sources.append(('pybot_llm_breaker_rejected_total', 'LLM calls failed fast by the breaker', stats, 'rejected'))
+        sources.append(('pybot_llm_hedges_total', 'Hedged duplicate LLM requests', stats, 'hedges'))
+        sources.append(('pybot_llm_fallbacks_total', 'Failed LLM calls answered from cache', stats, 'fallbacks'))
+        if self.completion_cache is not None:
+            stats = self.completion_cache.stats
+            sources.append(('pybot_llm_cache_hits_total', 'Completion cache hits', stats, 'hits'))
+            sources.append(('pybot_llm_cache_misses_total', 'Completion cache misses', stats, 'misses'))
+        if self.event_service.batcher is not None:
+            stats = self.event_service.batcher.stats
+            sources.append(('pybot_event_batch_size_avg', 'Average profiles per event batch', stats, 'size_avg'))
+            sources.append(('pybot_event_batch_wait_max_seconds', 'Longest event batch wait', stats, 'wait_max'))
+            sources.append(('pybot_event_batch_fallbacks_total', 'Batched profiles retried alone', stats, 'fallbacks'))
+        if self.precomputer is not None:
+            stats = self.precomputer.stats
+            sources.append(('pybot_precompute_hits_total', 'Recommendations served precomputed', stats, 'hits'))
+            sources.append(('pybot_precompute_misses_total', 'Recommendations generated inline', stats, 'misses'))
+            sources.append(('pybot_precompute_pending', 'Background generations queued', stats, 'pending'))
+        if self.outbox is not None:
+            stats = self.outbox.stats
+            sources.append(('pybot_outbox_queue_depth', 'Outgoing messages waiting to be sent', stats, 'queue_depth'))
+            sources.append(('pybot_outbox_retried_total', 'Sends retried after RetryAfter or errors', stats, 'retried'))
+            sources.append(('pybot_outbox_failed_total', 'Outgoing messages given up on', stats, 'failed'))
+        if self.conversations is not None:
+            stats = self.conversations.stats
+            sources.append(('pybot_conversation_chats', 'Chats with conversation memory held', stats, 'chats'))
+            sources.append(('pybot_conversation_bytes', 'Text held in conversation memory', stats, 'bytes'))
+            sources.append(('pybot_conversation_evictions_total', 'Chats evicted from memory', stats, 'evictions'))
+        if self.executor is not None:
+            stats = self.executor.stats
+            sources.append(('pybot_update_queue_depth', 'Updates waiting for a worker', stats, 'queue_depth'))
+            sources.append(('pybot_busy_workers', 'Workers currently running a handler', stats, 'busy_workers'))
+            sources.append(('pybot_update_wait_max_seconds', 'Longest update queue wait', stats, 'wait_max'))
+            sources.append(('pybot_chat_queue_depth_max', 'Most updates queued for one chat', stats, 'chat_depth_max'))
+            sources.append(
+                ('pybot_update_oldest_wait_seconds', 'Age of the oldest queued update', stats, 'oldest_wait')
+            )
+            backlog = self.executor.backlog
+            REGISTRY.gauge(
+                'pybot_chat_queue_depth',
+                'Updates queued for the most backed-up chats',
+                lambda: {(str(chat),): depth for chat, depth, _ in backlog()},
+                ('chat',),
+            )
+            REGISTRY.gauge(
+                'pybot_chat_oldest_wait_seconds',
+                'Age of the oldest queued update of the most backed-up chats',
+                lambda: {(str(chat),): wait for chat, _, wait in backlog()},
+                ('chat',),
+            )
+        for name, help, stats, key in sources:
+            REGISTRY.gauge(name, help, functools.partial(lambda s, k: s()[k], stats, key))
+
+    def _llm_idle(self) -> bool:
+        # Background generation only uses what interactive requests leave of the LLM concurrency.
+        return self.chatgpt_service.inflight.stats()['in_flight'] < self.config.chatgpt.max_concurrency // 2
+
+    def repository(self, backend: StorageBackend) -> Repository:
+        """One shared instance per backend name, so features configured on the same backend share it."""
+        if backend not in self.repositories:
+            repo = create_repository(backend, self.config)
+            if self.config.metrics.enabled:
+                repo = InstrumentedRepository(repo, backend)  # type: ignore
+            self.repositories[backend] = repo
+        return self.repositories[backend]
+
+    def pubsub(self, backend: StorageBackend) -> PubSub:
+        repo = self.repository(backend)
+        if not isinstance(repo, PubSub):
+            raise ValueError(f'The {backend} backend has no publish/subscribe support')
+        return repo
 
     def setup_handlers(self) -> 'TelegramBot':
-        self.dispatcher.add_handler(CommandHandler('help', self.command_handler.help))
-        self.dispatcher.add_handler(CommandHandler('hello', self.command_handler.hello))
-        self.dispatcher.add_handler(CommandHandler('add', self.command_handler.add))
-        self.dispatcher.add_handler(CommandHandler('register', self.command_handler.register))
-        self.dispatcher.add_handler(CommandHandler('events', self.command_handler.events))
-        self.dispatcher.add_handler(CommandHandler('more_events', self.command_handler.more_events))
+        self.dispatcher.add_handler(CommandHandler('help', self._dispatch(self.command_handler.help)))
+        self.dispatcher.add_handler(CommandHandler('hello', self._dispatch(self.command_handler.hello)))
+        self.dispatcher.add_handler(CommandHandler('add', self._dispatch(self.command_handler.add)))
+        self.dispatcher.add_handler(CommandHandler('register', self._dispatch(self.command_handler.register)))
+        self.dispatcher.add_handler(CommandHandler('events', self._dispatch(self.command_handler.events)))
+        self.dispatcher.add_handler(CommandHandler('more_events', self._dispatch(self.command_handler.more_events)))
+        self.dispatcher.add_handler(CommandHandler('stats', self._dispatch(self.command_handler.stats)))
         self.dispatcher.add_handler(
-            MessageHandler(Filters.text & (~Filters.command), self.command_handler.handle_message)
+            MessageHandler(Filters.text & (~Filters.command), self._dispatch(self.command_handler.handle_message))
         )
         return self
 
+    def _dispatch(
+        self, callback: Callable[[Update, CallbackContext[Any, Any, Any]], Any]
+    ) -> Callable[[Update, CallbackContext[Any, Any, Any]], Any]:
+        """Hand the update to the chat executor so slow chats do not block the dispatcher thread."""
+        executor = self.executor
+        if executor is None:
+            return callback
+
+        def submit(update: Update, context: CallbackContext[Any, Any, Any]) -> None:
+            # An update without a chat has no order to keep, so its own id spreads it over the workers.
+            chat_id = update.effective_chat.id if update.effective_chat is not None else update.update_id
+            if not executor.submit(chat_id, callback, update, context):
+                logging.warning(f'Update queue full, rejecting update {update.update_id}')
+                busy = 'The bot is busy right now. Please try again shortly.'
+                message = update.effective_message
+                if message is not None and (self.outbox is None or not self.outbox.send(message.chat_id, busy)):
+                    message.reply_text(busy)
+
+        return submit
+
+    def warm_up(self) -> float:
+        """Open storage, LLM and Telegram connections ahead of the first update; returns seconds taken."""
+        started = time.perf_counter()
+        tasks: dict[str, Callable[[], Any]] = {f'repository:{k}': r.warm_up for k, r in self.repositories.items()}
+        tasks['chatgpt'] = self.chatgpt_service.warm_up
+        tasks['telegram'] = self.updater.bot.get_me
+        if self.config.startup.parallel:
+            with ThreadPoolExecutor(max_workers=len(tasks), thread_name_prefix='warm-up') as pool:
+                futures = {name: pool.submit(task) for name, task in tasks.items()}
+            results = {name: future.exception() for name, future in futures.items()}
+        else:
+            results = {name: self._try(task) for name, task in tasks.items()}
+        for name, error in results.items():
+            if error is not None:
+                logging.warning(f'Warm-up of {name} failed, it will connect on first use: {error}')
+        elapsed = time.perf_counter() - started
+        logging.info(f'Warm-up finished in {elapsed:.3f}s')
+        return elapsed
+
+    @staticmethod
+    def _try(task: Callable[[], Any]) -> BaseException | None:
+        try:
+            task()
+        except Exception as e:
+            return e
+        return None
+
     def run(self) -> Self:
         logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
         self.setup_handlers()
-        self.updater.start_polling()
-        self.updater.idle()
+        self._start_workers()
+        try:
+            self.updater.start_polling()
+            self.ready.set()
+            self.updater.idle()
+        finally:
+            self._stop_workers()
+        return self
+
+    def run_webhook(self) -> Self:
+        """Receive updates over HTTP instead of long polling, so several replicas can share one token."""
+        logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+        self.setup_handlers()
+        self._start_workers()
+        webhook = self.config.webhook
+        server = WebhookServer.from_config(self._enqueue_update, webhook, ready=self.ready.is_set)
+        dispatcher_thread = threading.Thread(target=self.dispatcher.start, name='dispatcher', daemon=True)
+        try:
+            dispatcher_thread.start()
+            server.start()
+            if webhook.public_url:
+                self.updater.bot.set_webhook(
+                    url=f"{webhook.public_url.rstrip('/')}/{webhook.url_path.strip('/')}",
+                    max_connections=webhook.max_connections,
+                    api_kwargs={'secret_token': webhook.secret_token} if webhook.secret_token else None,
+                )
+            self.ready.set()
+            # Updater.idle() only stops a polling updater and hard-exits otherwise, skipping the cleanup below.
+            stop = threading.Event()
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(signum, lambda *_: stop.set())
+            stop.wait()
+            logging.info('Received a stop signal, shutting down')
+        finally:
+            server.stop()
+            self.dispatcher.stop()
+            self._stop_workers()
+        return self
+
+    def run_shard(self, updates: Any) -> Self:
+        """Handle the updates a supervisor routes to this process from ``updates`` until it sends None."""
+        logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+        self.setup_handlers()
+        self._start_workers()
+        dispatcher_thread = threading.Thread(target=self.dispatcher.start, name='dispatcher', daemon=True)
+        try:
+            dispatcher_thread.start()
+            self.ready.set()
+            while (data := updates.get()) is not None:
+                self._enqueue_update(data)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.dispatcher.stop()
+            self._stop_workers()
         return self
 
+    def _enqueue_update(self, data: dict[str, Any]) -> None:
+        self.dispatcher.update_queue.put(Update.de_json(data, self.updater.bot))
+
+    def _start_workers(self) -> None:
+        if self.config.startup.warm_up:
+            self.warm_up()
+        self.log_sink.start()
+        self.counter.start()
+        if self.outbox is not None:
+            self.outbox.start()
+        if self.precomputer is not None:
+            self.precomputer.start()
+        if self.conversations is not None:
+            self.conversations.start()
+        if self.metrics is not None:
+            self.metrics.start()
+        if self.executor is not None:
+            self.executor.start()
+
+    def _stop_workers(self) -> None:
+        self.ready.clear()
+        if self.metrics is not None:
+            self.metrics.stop()
+        if self.executor is not None:
+            self.executor.shutdown()
+            logging.info(f'Chat executor stopped: {self.executor.stats()}')
+        if self.outbox is not None:
+            self.outbox.close()
+            logging.info(f'Outbox stopped: {self.outbox.stats()}')
+        if self.precomputer is not None:
+            self.precomputer.close()
+            logging.info(f'Precomputer stopped: {self.precomputer.stats()}')
+        if self.conversations is not None:
+            self.conversations.close()
+            logging.info(f'Conversation memory stopped: {self.conversations.stats()}')
+        self.counter.close()
+        self.log_sink.close()
+        logging.info(f'Request log sink stopped: {self.log_sink.stats()}')
+
 
 def main():
     bot = TelegramBot()
     bot.run()
 
 
+def main_webhook():
+    bot = TelegramBot()
+    bot.run_webhook()
+
+
 if __name__ == '__main__':
-    main()
+    if sys.argv[1:] == ['webhook']:
+        main_webhook()
+    else:
+        main()
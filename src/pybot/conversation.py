@@ -0,0 +1,210 @@
+import json
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import Protocol
+
+from pybot.prompt import count_tokens
+from pybot.setting import ConversationConfig
+
+
+class SnapshotStore(Protocol):
+    def get(self, key: str) -> str | None: ...
+
+    def set(self, key: str, value: str, ttl: int | None = None) -> None: ...
+
+
+class Turn:
+    __slots__ = ('role', 'content', 'tokens', 'size')
+
+    def __init__(self, role: str, content: str):
+        self.role = role
+        self.content = content
+        self.tokens = count_tokens(content)
+        self.size = len(content.encode())  # UTF-8 bytes, what max_bytes is measured in
+
+
+class _Conversation:
+    __slots__ = ('turns', 'size', 'dirty')
+
+    def __init__(self, max_turns: int):
+        self.turns: deque[Turn] = deque(maxlen=max_turns)
+        self.size = 0
+        self.dirty = False
+
+
+class ConversationStore:
+    """Recent chat turns per chat, kept in memory and snapshotted to the repository in the background.
+
+    Each chat holds a ring of its last ``max_turns`` turns. Chats are evicted least recently used first
+    once there are more than ``max_chats`` or their UTF-8 text exceeds ``max_bytes``. Turns are written behind
+    every ``snapshot_interval`` seconds, so a chat only touches storage when it is first seen by this
+    process (to restore a snapshot) and never while a reply is being produced.
+    """
+
+    def __init__(
+        self,
+        store: SnapshotStore | None = None,
+        *,
+        max_turns: int = 20,
+        max_chats: int = 10000,
+        max_bytes: int = 32 << 20,
+        snapshot_interval: float = 5.0,
+        ttl: int = 7 * 86400,
+    ):
+        self.store = store
+        self.max_turns = max_turns
+        self.max_chats = max_chats
+        self.max_bytes = max_bytes
+        self.snapshot_interval = snapshot_interval
+        self.ttl = ttl
+        self.logger = logging.getLogger(__name__)
+        self._chats: OrderedDict[int, _Conversation] = OrderedDict()
+        self._evicted: dict[int, list[Turn]] = {}  # dirty chats pushed out before their snapshot
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.restored = 0
+        self.evictions = 0
+        self.snapshots = 0
+        self.failed = 0
+
+    @classmethod
+    def from_config(cls, store: SnapshotStore | None, config: ConversationConfig) -> 'ConversationStore':
+        return cls(
+            store,
+            max_turns=config.max_turns,
+            max_chats=config.max_chats,
+            max_bytes=config.max_bytes,
+            snapshot_interval=config.snapshot_interval,
+            ttl=config.ttl,
+        )
+
+    @staticmethod
+    def key(chat_id: int) -> str:
+        return f'conversation:{chat_id}'
+
+    def start(self) -> 'ConversationStore':
+        if self._thread is None and self.store is not None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='conversation-snapshot', daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.flush()
+
+    def window(self, chat_id: int, max_tokens: int) -> list[dict[str, str]]:
+        """The most recent turns that fit in ``max_tokens``, oldest first, as chat-completion messages."""
+        with self._lock:
+            conversation = self._chats.get(chat_id)
+            turns = list(conversation.turns) if conversation is not None else None
+            if conversation is not None:
+                self._chats.move_to_end(chat_id)
+        if turns is None:
+            turns = self._restore(chat_id)
+        selected: list[Turn] = []
+        used = 0
+        for turn in reversed(turns):
+            used += turn.tokens
+            if used > max_tokens:
+                break
+            selected.append(turn)
+        if selected and selected[-1].role == 'assistant':
+            # A reply without the message it answers only confuses the model.
+            selected.pop()
+        return [{'role': t.role, 'content': t.content} for t in reversed(selected)]
+
+    def append(self, chat_id: int, *turns: tuple[str, str]) -> None:
+        """Record ``(role, content)`` turns, e.g. a user message and the reply to it."""
+        with self._lock:
+            conversation = self._conversation(chat_id)
+            for role, content in turns:
+                if len(conversation.turns) == conversation.turns.maxlen:
+                    dropped = conversation.turns[0]
+                    conversation.size -= dropped.size
+                    self._bytes -= dropped.size
+                turn = Turn(role, content)
+                conversation.turns.append(turn)
+                conversation.size += turn.size
+                self._bytes += turn.size
+            conversation.dirty = True
+            self._chats.move_to_end(chat_id)
+            self._evict()
+
+    def flush(self) -> None:
+        """Write every chat changed since its last snapshot."""
+        if self.store is None:
+            return
+        with self._lock:
+            pending = self._evicted
+            self._evicted = {}
+            for chat_id, conversation in self._chats.items():
+                if conversation.dirty:
+                    pending[chat_id] = list(conversation.turns)
+                    conversation.dirty = False
+        for chat_id, turns in pending.items():
+            try:
+                data = json.dumps([[t.role, t.content] for t in turns])
+                self.store.set(self.key(chat_id), data, ttl=self.ttl)
+                self.snapshots += 1
+            except Exception as e:
+                self.logger.warning(f'Snapshot of conversation {chat_id} failed: {e}')
+                self.failed += 1
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                'chats': len(self._chats),
+                'bytes': self._bytes,
+                'restored': self.restored,
+                'evictions': self.evictions,
+                'snapshots': self.snapshots,
+                'failed': self.failed,
+            }
+
+    def _conversation(self, chat_id: int) -> _Conversation:
+        conversation = self._chats.get(chat_id)
+        if conversation is None:
+            conversation = self._chats[chat_id] = _Conversation(self.max_turns)
+        return conversation
+
+    def _evict(self) -> None:
+        while len(self._chats) > 1 and (len(self._chats) > self.max_chats or self._bytes > self.max_bytes):
+            chat_id, conversation = self._chats.popitem(last=False)
+            self._bytes -= conversation.size
+            self.evictions += 1
+            if conversation.dirty and self.store is not None:
+                self._evicted[chat_id] = list(conversation.turns)
+
+    def _restore(self, chat_id: int) -> list[Turn]:
+        if self.store is None:
+            return []
+        try:
+            raw = self.store.get(self.key(chat_id))
+        except Exception as e:
+            self.logger.warning(f'Restoring conversation {chat_id} failed: {e}')
+            raw = None
+        turns = [Turn(role, content) for role, content in json.loads(raw)] if raw else []
+        with self._lock:
+            if chat_id in self._chats:
+                # Another request for the chat got here first.
+                return list(self._chats[chat_id].turns)
+            conversation = self._conversation(chat_id)
+            for turn in turns[-self.max_turns :]:
+                conversation.turns.append(turn)
+                conversation.size += turn.size
+                self._bytes += turn.size
+            self.restored += bool(turns)
+            self._evict()
+        return turns[-self.max_turns :]
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.snapshot_interval):
+            self.flush()
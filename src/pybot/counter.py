@@ -0,0 +1,114 @@
+import logging
+import random
+import threading
+import time
+from typing import Callable, Protocol
+
+
+class ShardStore(Protocol):
+    def incr_shard(self, key: str, amount: int, shard: int) -> None: ...
+
+    def get_count(self, key: str) -> int: ...
+
+
+class ShardedCounter:
+    """Counter spread over ``shards`` documents so concurrent writers to one key do not serialize.
+
+    Writes go to a random shard and reads sum all shards. With ``flush_interval`` set, increments are
+    first merged in memory and written once per key per interval, so ``incr`` makes no remote call.
+    Otherwise every ``incr`` writes, but the shards are summed at most once per ``read_interval``; in
+    between, the value is the last sum plus this process's own increments. Either way the value
+    returned for a key never goes down within this process.
+    """
+
+    def __init__(
+        self,
+        store: ShardStore,
+        shards: int = 8,
+        flush_interval: float = 0.0,
+        *,
+        read_interval: float = 0.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.store = store
+        self.shards = shards
+        self.flush_interval = flush_interval
+        self.read_interval = read_interval
+        self.clock = clock
+        self.logger = logging.getLogger(__name__)
+        self._pending: dict[str, int] = {}
+        self._totals: dict[str, int] = {}
+        self._read_at: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def accumulating(self) -> bool:
+        return self.flush_interval > 0
+
+    def start(self) -> 'ShardedCounter':
+        if self.accumulating and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='counter-flush', daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        if not self.accumulating:
+            self.store.incr_shard(key, amount, random.randrange(self.shards))
+            if self._read_due(key):
+                return self._observe(key, self.store.get_count(key))
+            with self._lock:
+                self._totals[key] += amount
+                return self._totals[key]
+
+        if key not in self._totals:
+            self._observe(key, self.store.get_count(key))
+        with self._lock:
+            self._pending[key] = self._pending.get(key, 0) + amount
+            self._totals[key] += amount
+            return self._totals[key]
+
+    def get(self, key: str) -> int:
+        with self._lock:
+            pending = self._pending.get(key, 0)
+        return self._observe(key, self.store.get_count(key) + pending)
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for key, amount in pending.items():
+            try:
+                self.store.incr_shard(key, amount, random.randrange(self.shards))
+            except Exception as e:
+                self.logger.error(f'Failed to flush counter {key}: {e}')
+                with self._lock:
+                    self._pending[key] = self._pending.get(key, 0) + amount
+                continue
+            # Pick up increments made by other replicas since the last read.
+            self.get(key)
+
+    def _read_due(self, key: str) -> bool:
+        with self._lock:
+            now = self.clock()
+            if key in self._totals and now < self._read_at.get(key, now) + self.read_interval:
+                return False
+            self._read_at[key] = now
+            return True
+
+    def _observe(self, key: str, value: int) -> int:
+        with self._lock:
+            self._totals[key] = max(self._totals.get(key, 0), value)
+            return self._totals[key]
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
@@ -0,0 +1,27 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+_deadline: ContextVar[float | None] = ContextVar('deadline', default=None)
+
+
+@contextmanager
+def deadline(seconds: float | None) -> Iterator[None]:
+    """Bound the calls made inside the block to ``seconds`` from now; a nested deadline can only tighten it."""
+    if seconds is None or seconds <= 0:
+        yield
+        return
+    current = _deadline.get()
+    expires = time.monotonic() + seconds
+    token = _deadline.set(expires if current is None else min(current, expires))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> float | None:
+    """Seconds left before the current deadline, never negative; None when there is no deadline."""
+    expires = _deadline.get()
+    return None if expires is None else max(expires - time.monotonic(), 0.0)
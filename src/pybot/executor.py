@@ -0,0 +1,136 @@
+import heapq
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Hashable
+
+from pybot.setting import DispatchConfig
+
+
+class ChatExecutor:
+    """Bounded worker pool that runs different chats in parallel and each chat's updates in order.
+
+    Every chat owns a FIFO of pending tasks. A chat is handed to at most one worker at a time, and
+    after each task it goes to the back of the ready queue so busy chats cannot starve quiet ones.
+    """
+
+    def __init__(self, workers: int = 8, max_queue: int = 1000, top_chats: int = 5):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.top_chats = top_chats
+        self.logger = logging.getLogger(__name__)
+        self._pending: dict[Hashable, deque[tuple[float, Callable[..., Any], tuple[Any, ...]]]] = {}
+        self._ready: deque[Hashable] = deque()
+        self._cond = threading.Condition()
+        self._threads: list[threading.Thread] = []
+        self._queued = 0
+        self._busy = 0
+        self._running = False
+        self.completed = 0
+        self.rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._busy_time = 0.0
+        self._started_at = 0.0
+
+    @classmethod
+    def from_config(cls, config: DispatchConfig) -> 'ChatExecutor':
+        return cls(workers=config.workers, max_queue=config.max_queue, top_chats=config.top_chats)
+
+    def start(self) -> 'ChatExecutor':
+        with self._cond:
+            if self._running:
+                return self
+            self._running = True
+            self._started_at = time.monotonic()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'chat-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def submit(self, chat_id: Hashable, fn: Callable[..., Any], *args: Any) -> bool:
+        """Queue ``fn(*args)`` behind earlier work for ``chat_id``; False if the queue is full."""
+        with self._cond:
+            if not self._running or self._queued >= self.max_queue:
+                self.rejected += 1
+                return False
+            tasks = self._pending.get(chat_id)
+            if tasks is None:
+                tasks = self._pending[chat_id] = deque()
+                self._ready.append(chat_id)
+                self._cond.notify()
+            tasks.append((time.monotonic(), fn, args))
+            self._queued += 1
+        return True
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        self._threads.clear()
+
+    def backlog(self, top: int | None = None) -> list[tuple[Hashable, int, float]]:
+        """``(chat, queued updates, seconds its oldest has waited)`` for the ``top`` most backed-up chats."""
+        now = time.monotonic()
+        with self._cond:
+            chats = heapq.nlargest(top or self.top_chats, self._pending.items(), key=lambda item: len(item[1]))
+            return [(chat_id, len(tasks), now - tasks[0][0] if tasks else 0.0) for chat_id, tasks in chats]
+
+    def stats(self) -> dict[str, float]:
+        now = time.monotonic()
+        with self._cond:
+            elapsed = max(now - self._started_at, 1e-9) * self.workers
+            # A chat's oldest task is the head of its FIFO, so this is one look per waiting chat.
+            heads = [tasks[0][0] for tasks in self._pending.values() if tasks]
+            return {
+                'queue_depth': self._queued,
+                'pending_chats': len(self._pending),
+                'chat_depth_max': max((len(tasks) for tasks in self._pending.values()), default=0),
+                'oldest_wait': now - min(heads) if heads else 0.0,
+                'busy_workers': self._busy,
+                'utilisation': self._busy_time / elapsed if self._started_at else 0.0,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'wait_avg': self._wait_total / self.completed if self.completed else 0.0,
+                'wait_max': self._wait_max,
+            }
+
+    def _next(self) -> tuple[Hashable, float, Callable[..., Any], tuple[Any, ...]] | None:
+        with self._cond:
+            # Keep draining after shutdown so queued updates are not lost.
+            while not self._ready:
+                if not self._running:
+                    return None
+                self._cond.wait()
+            chat_id = self._ready.popleft()
+            enqueued, fn, args = self._pending[chat_id].popleft()
+            self._queued -= 1
+            self._busy += 1
+            return chat_id, enqueued, fn, args
+
+    def _work(self) -> None:
+        while (task := self._next()) is not None:
+            chat_id, enqueued, fn, args = task
+            started = time.monotonic()
+            try:
+                fn(*args)
+            except Exception as e:
+                self.logger.error(f'Error processing update for chat {chat_id}: {e}')
+            finished = time.monotonic()
+            with self._cond:
+                self._busy -= 1
+                self.completed += 1
+                wait = started - enqueued
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+                self._busy_time += finished - started
+                if self._pending[chat_id]:
+                    self._ready.append(chat_id)
+                    self._cond.notify()
+                else:
+                    del self._pending[chat_id]
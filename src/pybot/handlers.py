@@ -1,68 +1,70 @@
 import json
 import logging
 from functools import wraps
-from time import time
+from time import perf_counter, time
 from typing import Any, Callable
 
-from service import ChatGPTService, EventService, UserService
 from telegram import Update
 from telegram.ext import CallbackContext
 
-from pybot.repository import FirebaseRepository
+from pybot.conversation import ConversationStore
+from pybot.counter import ShardedCounter
+from pybot.deadline import deadline
+from pybot.limiter import RateLimiter, SlidingWindowLimiter
+from pybot.logsink import RequestLogSink
+from pybot.metrics import HANDLER_SECONDS, RATE_LIMITED
+from pybot.outbox import Outbox
+from pybot.precompute import EventPrecomputer
+from pybot.repository import Repository
+from pybot.rollup import LATENCY_BUCKETS, LogRollup
+from pybot.service import ChatGPTService, EventService, LLMError, UserService
+from pybot.streaming import StreamingReply
 
+# A handler method, before and after decoration: the decorators keep its signature.
+Handler = Callable[['TelegramCommandHandler', Update, CallbackContext[Any, Any, Any]], Any]
 
-def before_request(
-    handler: Callable[
-        [
-            'TelegramCommandHandler',
-            Update,
-            CallbackContext[Any, Any, Any],
-        ],
-        Any,
-    ],
-) -> Callable[[Update, CallbackContext[Any, Any, Any]], Any]:
+
+def before_request(handler: Handler) -> Handler:
 
     @wraps(handler)
-    def wrapper(self: TelegramCommandHandler, update: Update, context: CallbackContext[Any, Any, Any]) -> None:
+    def wrapper(self: 'TelegramCommandHandler', update: Update, context: CallbackContext[Any, Any, Any]) -> None:
         username = update.message.from_user.username or str(update.message.from_user.id)
         if not self._check_rate_limit(username):
-            update.message.reply_text('Rate limit exceeded. Try again in a minute.')
+            RATE_LIMITED.inc()
+            self._reply(update, 'Rate limit exceeded. Try again in a minute.')
             return
+        if self.precomputer is not None:
+            self.precomputer.touch(username)
         handler(self, update, context)
 
     return wrapper  # noqa
 
 
-def after_request(
-    command_name: str,
-) -> Callable[[Callable[[Update, CallbackContext[Any, Any, Any]], Any]], Any]:
+def after_request(command_name: str) -> Callable[[Handler], Handler]:
     """Decorator to handle post-request logging."""
 
-    def decorator(
-        handler: Callable[
-            [
-                'TelegramCommandHandler',
-                Update,
-                CallbackContext[Any, Any, Any],
-            ],
-            Any,
-        ]
-    ) -> Callable[[Update, CallbackContext[Any, Any, Any]], Any]:
+    def decorator(handler: Handler) -> Handler:
         @wraps(handler)
         def wrapper(
-            self: TelegramCommandHandler,
+            self: 'TelegramCommandHandler',
             update: Update,
             context: CallbackContext[Any, Any, Any],
             *args,
             **kwargs,
         ) -> None:
             username = update.message.from_user.username or str(update.message.from_user.id)
+            started = perf_counter()
             try:
-                handler(self, update, context)  # Call the original handler
-                self._log_request(username, command_name, True)  # Log success
+                with deadline(self.deadlines.get(command_name, self.deadlines.get('default'))):
+                    handler(self, update, context)  # Call the original handler
+                elapsed = perf_counter() - started
+                HANDLER_SECONDS.observe(elapsed, command_name, 'ok')
+                self._log_request(username, command_name, True, elapsed)  # Log success
             except Exception as e:
+                elapsed = perf_counter() - started
+                HANDLER_SECONDS.observe(elapsed, command_name, 'error')
                 self.logger.error(f'Error in {command_name}: {e}')
-                self._log_request(username, command_name, False)  # Log failure
+                self._log_request(username, command_name, False, elapsed)  # Log failure
                 raise  # Re-raise the exception if needed
 
         return wrapper  # noqa
@@ -73,57 +75,81 @@ def after_request(
 class TelegramCommandHandler:
     def __init__(
         self,
-        repo: FirebaseRepository,
+        repo: Repository,
         chatgpt_service: ChatGPTService,
         user_service: UserService,
         event_service: EventService,
+        *,
+        limiter: RateLimiter | None = None,
+        log_sink: RequestLogSink | None = None,
+        stream_replies: bool = False,
+        edit_interval: float = 1.0,
+        counter: ShardedCounter | None = None,
+        precomputer: EventPrecomputer | None = None,
+        outbox: Outbox | None = None,
+        deadlines: dict[str, float] | None = None,
+        conversations: ConversationStore | None = None,
+        history_tokens: int = 1500,
+        rollup: LogRollup | None = None,
     ):
         self.repo = repo
         self.chatgpt_service = chatgpt_service
         self.user_service = user_service
         self.event_service = event_service
+        self.limiter = limiter or SlidingWindowLimiter(limit=10, window=60)
+        self.log_sink = log_sink
+        self.stream_replies = stream_replies
+        self.edit_interval = edit_interval
+        self.counter = counter or ShardedCounter(repo)
+        self.precomputer = precomputer
+        self.outbox = outbox
+        # Seconds each command may spend, LLM retries included; 'default' covers the rest.
+        self.deadlines = deadlines or {}
+        self.conversations = conversations
+        self.history_tokens = history_tokens
+        self.rollup = rollup
         self.logger = logging.getLogger(__name__)
 
     def _check_rate_limit(self, username: str) -> bool:
-        """Check and enforce rate limit: 10 requests per minute."""
-        key = f'rate:{username}'
-        requests = self.repo.ref.child('rate_limits').child(key).get() or []
-        now = int(time())
-        minute_ago = now - 60
-
-        recent = [r for r in requests if isinstance(r, int) and r > minute_ago]
-        if len(recent) >= 10:
-            return False
-
-        self.repo.rpush(key, str(now))
-        return True
-
-    def _log_request(self, username: str, command: str, success: bool) -> None:
-        self.repo.rpush(
-            'logs',
-            json.dumps(
-                {
-                    'timestamp': int(time()),
-                    'username': username,
-                    'command': command,
-                    'success': success,
-                }
-            ),
+        """Check and enforce rate limit: 10 requests per minute by default."""
+        return self.limiter.allow(f'rate:{username}')
+
+    def _reply(self, update: Update, text: str) -> None:
+        """Send through the outbox when there is one, so handlers never block on Telegram's rate limits."""
+        if self.outbox is None:
+            update.message.reply_text(text)
+        elif not self.outbox.send(update.message.chat_id, text):
+            self.logger.warning(f'Outbox full, dropped reply to chat {update.message.chat_id}')
+
+    def _log_request(self, username: str, command: str, success: bool, latency: float = 0.0) -> None:
+        entry = json.dumps(
+            {
+                'timestamp': int(time()),
+                'username': username,
+                'command': command,
+                'success': success,
+                'latency': round(latency, 3),
+            }
         )
+        if self.log_sink is None:
+            self.repo.rpush('logs', entry)
+        elif not self.log_sink.submit(entry):
+            self.logger.warning(f'Request log queue full, dropped entry for {command}')
 
     @before_request
     @after_request('help')
     def help(self, update: Update, _: CallbackContext[Any, Any, Any]) -> None:
-        update.message.reply_text(
-            'Commands: /help, /hello, /add, /register, /events, /more_events\n'
-            "Example: /register gaming vr \"I enjoy fast-paced shooter games\""
+        self._reply(
+            update,
+            'Commands: /help, /hello, /add, /register, /events, /more_events, /stats\n'
+            "Example: /register gaming vr \"I enjoy fast-paced shooter games\"",
         )
 
     @before_request
     @after_request('hello')
     def hello(self, update: Update, context: CallbackContext[Any, Any, Any]) -> None:
         reply_message = ' '.join(context.args) if context.args else 'friend'
-        context.bot.send_message(chat_id=update.effective_chat.id, text=f'Good day, {reply_message}!')
+        self._reply(update, f'Good day, {reply_message}!')
 
     @before_request
     @after_request('add')
@@ -131,21 +157,22 @@ class TelegramCommandHandler:
         try:
             msg = context.args[0]
             self.logger.info(f'Incrementing count for: {msg}')
-            count = self.repo.incr(msg)
-            update.message.reply_text(f'You have said {msg} for {count} times')
+            count = self.counter.incr(msg)
+            self._reply(update, f'You have said {msg} for {count} times')
         except IndexError:
-            update.message.reply_text('Usage: /add <keyword>')
+            self._reply(update, 'Usage: /add <keyword>')
         except Exception as e:
             self.logger.error(f'Error in add command: {e}')
-            update.message.reply_text('An error occurred.')
+            self._reply(update, 'An error occurred.')
 
     @before_request
     @after_request('register')
     def register(self, update: Update, context: CallbackContext[Any, Any, Any]) -> None:
         username = update.message.from_user.username or str(update.message.from_user.id)
         if not context.args:
-            update.message.reply_text(
-                "Usage: /register <interests> [\"description\"] (e.g., /register gaming vr \"I enjoy FPS games\")"
+            self._reply(
+                update,
+                "Usage: /register <interests> [\"description\"] (e.g., /register gaming vr \"I enjoy FPS games\")",
             )
             return
 
@@ -164,7 +191,7 @@ class TelegramCommandHandler:
             interests.append(arg)
 
         if not interests:
-            update.message.reply_text('Please provide at least one interest.')
+            self._reply(update, 'Please provide at least one interest.')
             return
 
         self.user_service.register_user(username, interests, description)
@@ -178,7 +205,7 @@ class TelegramCommandHandler:
             response += f"Matched users: {', '.join(matches)}"
         else:
             response += 'No matches found yet. Invite friends to join!'
-        update.message.reply_text(response)
+        self._reply(update, response)
 
     @before_request
     @after_request('events')
@@ -187,42 +214,100 @@ class TelegramCommandHandler:
         user_profile = self.user_service.get_user(username)
 
         if not user_profile or not user_profile.interests:
-            update.message.reply_text('Please register your interests first with /register')
+            self._reply(update, 'Please register your interests first with /register')
             return
 
-        events = self.event_service.recommend_events(user_profile)
+        if self.precomputer is not None:
+            events = self.precomputer.recommend('events', user_profile)
+        else:
+            events = self.event_service.recommend_events(user_profile)
         if not events:
-            update.message.reply_text("Sorry, I couldn't generate event recommendations right now.")
+            self._reply(update, "Sorry, I couldn't generate event recommendations right now.")
             return
 
         response = 'Recommended Events:\n'
         for event in events:
             response += f"- {event['name']} on {event['date']} ({event['link']})\n"
-        update.message.reply_text(response)
+        self._reply(update, response)
 
     @before_request
     @after_request('more_events')
     def more_events(self, update: Update, context: CallbackContext[Any, Any, Any]) -> None:
         username = update.message.from_user.username or str(update.message.from_user.id)
-        user_profile = self.user_service.users.get(username)
+        user_profile = self.user_service.get_user(username)
 
         if not user_profile or not user_profile.interests:
-            update.message.reply_text('Please register your interests first with /register')
+            self._reply(update, 'Please register your interests first with /register')
             return
 
-        events = self.event_service.recommend_more_events(user_profile)
+        if self.precomputer is not None:
+            events = self.precomputer.recommend('more_events', user_profile)
+        else:
+            events = self.event_service.recommend_more_events(user_profile)
         if not events:
-            update.message.reply_text("Sorry, I couldn't generate more event recommendations right now.")
+            self._reply(update, "Sorry, I couldn't generate more event recommendations right now.")
             return
 
         response = 'More Recommended Events:\n'
         for event in events:
             response += f"- {event['name']} on {event['date']} ({event['link']})\n"
-        update.message.reply_text(response)
+        self._reply(update, response)
 
     @before_request
     @after_request('message')
     def handle_message(self, update: Update, context: CallbackContext[Any, Any, Any]) -> None:
-        reply = self.chatgpt_service.submit(update.message.text)
-        self.logger.info(f'ChatGPT response: {reply}')
-        context.bot.send_message(chat_id=update.effective_chat.id, text=reply)
+        unavailable = "Sorry, I can't answer right now. Please try again in a moment."
+        chat_id = update.message.chat_id
+        text = update.message.text
+        history = self.conversations.window(chat_id, self.history_tokens) if self.conversations else None
+        if self.stream_replies:
+            pace = self.outbox.acquire if self.outbox is not None else None
+            streaming = StreamingReply(context.bot, chat_id, self.edit_interval, pace=pace).start()
+            try:
+                for delta in self.chatgpt_service.stream(text, history=history):
+                    streaming.feed(delta)
+            except LLMError as e:
+                self.logger.warning(f'ChatGPT stream failed: {e}')
+                streaming.feed(f'\n\n{unavailable}')
+                history = None
+            reply = streaming.finish()
+            self.logger.info(f'ChatGPT response: {reply}')
+        else:
+            try:
+                reply = self.chatgpt_service.submit(text, history=history)
+            except LLMError as e:
+                self.logger.warning(f'ChatGPT unavailable: {e}')
+                reply = unavailable
+                history = None
+            self.logger.info(f'ChatGPT response: {reply}')
+            self._reply(update, reply)
+        # Failed turns are left out so an apology never becomes part of the context.
+        if self.conversations is not None and history is not None:
+            self.conversations.append(chat_id, ('user', text), ('assistant', reply))
+
+    @before_request
+    @after_request('stats')
+    def stats(self, update: Update, context: CallbackContext[Any, Any, Any]) -> None:
+        if self.rollup is None:
+            self._reply(update, 'Usage statistics are not enabled.')
+            return
+        username = update.message.from_user.username or str(update.message.from_user.id)
+        if context.args and context.args[0] == 'day':
+            label, commands, mine = 'the last 24 hours', *self.rollup.summarize('hour', 24, username)
+        else:
+            label, commands, mine = 'the last hour', *self.rollup.summarize('minute', 60, username)
+        if not commands:
+            self._reply(update, f'No requests in {label}.')
+            return
+
+        def ms(value: float) -> str:
+            return f'{value:.0f} ms' if value != float('inf') else f'over {LATENCY_BUCKETS[-1]} ms'
+
+        response = f'Requests in {label}:\n'
+        for command, summary in sorted(commands.items(), key=lambda item: -item[1].count):
+            response += (
+                f'- {command}: {summary.count}, {summary.success_ratio:.0%} ok, '
+                f'p50 up to {ms(summary.quantile(0.5))}, p95 up to {ms(summary.quantile(0.95))}\n'
+            )
+        response += f'You: {mine.count} requests'
+        self._reply(update, response)
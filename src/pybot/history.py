@@ -0,0 +1,34 @@
+from typing import Protocol
+
+
+class RingStore(Protocol):
+    def push_capped(self, key: str, values: list[str], cap: int) -> None: ...
+
+    def read_window(self, key: str, offset: int, limit: int) -> list[str]: ...
+
+
+class EventHistory:
+    """Per-user capped history of recommended events, read newest first in cursor pages."""
+
+    def __init__(self, store: RingStore, cap: int = 50):
+        if cap < 1:
+            # Backends trim to the last ``cap`` items, and for 0 that slice is the whole list.
+            raise ValueError(f'Event history cap must be at least 1, got {cap}')
+        self.store = store
+        self.cap = cap
+
+    @staticmethod
+    def key(username: str) -> str:
+        return f'events:{username}'
+
+    def append(self, username: str, names: list[str]) -> None:
+        if names:
+            self.store.push_capped(self.key(username), names, self.cap)
+
+    def page(self, username: str, cursor: str | None = None, limit: int = 20) -> tuple[list[str], str | None]:
+        """Return one page and the cursor for the next, or None when the history is exhausted."""
+        offset = int(cursor) if cursor else 0
+        limit = max(min(limit, self.cap - offset), 0)
+        items = self.store.read_window(self.key(username), offset, limit) if limit else []
+        next_offset = offset + len(items)
+        return items, str(next_offset) if len(items) == limit and next_offset < self.cap else None
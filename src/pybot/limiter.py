@@ -0,0 +1,64 @@
+import threading
+import time
+from typing import Callable, Protocol
+
+from pybot.repository import Repository
+from pybot.setting import RateLimitConfig
+
+
+class RateLimiter(Protocol):
+    def allow(self, key: str) -> bool: ...
+
+
+class SlidingWindowLimiter:
+    """In-process sliding-window counter, keeping two integers per key."""
+
+    def __init__(self, limit: int, window: int, clock: Callable[[], float] = time.monotonic):
+        self.limit = limit
+        self.window = window
+        self.clock = clock
+        self._windows: dict[str, tuple[int, int, int]] = {}  # key -> (window index, previous, current)
+        self._lock = threading.Lock()
+        self._last_sweep = 0
+
+    def allow(self, key: str) -> bool:
+        now = self.clock()
+        index = int(now // self.window)
+        weight = 1 - (now - index * self.window) / self.window
+
+        with self._lock:
+            if index != self._last_sweep:
+                self._sweep(index)
+            start, previous, current = self._windows.get(key, (index, 0, 0))
+            if start != index:
+                previous, current = (current if start == index - 1 else 0), 0
+            if previous * weight + current >= self.limit:
+                self._windows[key] = (index, previous, current)
+                return False
+            self._windows[key] = (index, previous, current + 1)
+            return True
+
+    def _sweep(self, index: int) -> None:
+        # Entries older than the previous window can no longer affect a decision.
+        self._windows = {k: v for k, v in self._windows.items() if v[0] >= index - 1}
+        self._last_sweep = index
+
+
+class SharedRateLimiter:
+    """Limiter state kept in the repository for multi-replica deployments; one atomic round-trip per check."""
+
+    def __init__(self, repo: Repository, limit: int, window: int):
+        self.repo = repo
+        self.limit = limit
+        self.window = window
+
+    def allow(self, key: str) -> bool:
+        return self.repo.rate_limit(key, self.limit, self.window)
+
+
+def create_limiter(config: RateLimitConfig, repo: Repository | None = None) -> RateLimiter:
+    if config.backend == 'memory':
+        return SlidingWindowLimiter(config.limit, config.window)
+    if repo is None:
+        raise ValueError(f'{config.backend} rate limiter requires a repository')
+    return SharedRateLimiter(repo, config.limit, config.window)
@@ -0,0 +1,187 @@
+import json
+import logging
+import queue
+import threading
+import time
+from typing import Protocol
+
+from pybot.rollup import LogRollup
+from pybot.setting import RequestLogConfig
+
+
+class BatchWriter(Protocol):
+    def rpush_many(self, key: str, values: list[str]) -> None: ...
+
+    def delete(self, key: str) -> None: ...
+
+
+class RequestLogSink:
+    """Write-behind sink that batches log entries off the request path.
+
+    With a ``retention`` (seconds), entries go to one list per hour, ``<key>:<hour>``, and lists older
+    than the retention are deleted as time moves on. A ``rollup`` is fed every written entry, so
+    aggregates outlive the raw entries.
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        writer: BatchWriter,
+        key: str = 'logs',
+        *,
+        max_queue: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        block_timeout: float = 0.0,
+        retention: int = 0,
+        rollup: LogRollup | None = None,
+    ):
+        self.writer = writer
+        self.key = key
+        self.retention = retention
+        self.rollup = rollup
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+        self.logger = logging.getLogger(__name__)
+        self._expired_until: int | None = None  # hour partitions below this one are gone
+        self._queue: queue.Queue[object] = queue.Queue(maxsize=max_queue)
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.expired = 0
+
+    @classmethod
+    def from_config(
+        cls, writer: BatchWriter, config: RequestLogConfig, *, rollup: LogRollup | None = None
+    ) -> 'RequestLogSink':
+        return cls(
+            writer,
+            max_queue=config.max_queue,
+            batch_size=config.batch_size,
+            flush_interval=config.flush_interval,
+            block_timeout=config.block_timeout,
+            retention=config.retention,
+            rollup=rollup,
+        )
+
+    def start(self) -> 'RequestLogSink':
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='request-log-sink', daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(self, entry: str) -> bool:
+        """Enqueue an entry; returns False when the queue is full and the entry is dropped."""
+        try:
+            if self.block_timeout > 0:
+                self._queue.put(entry, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(entry)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.submitted += 1
+        return True
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Give queued entries up to ``timeout`` seconds to be written; whatever is left then is dropped."""
+        if self._thread is None:
+            return
+        deadline = time.monotonic() + timeout
+        try:
+            self._queue.put(self._STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(max(deadline - time.monotonic(), 0))
+        if self._thread.is_alive():
+            # The writer is stuck on the store; it is a daemon thread, so it will not hold up exit.
+            lost = self._queue.qsize()
+            with self._lock:
+                self.dropped += lost
+            self.logger.error(f'Request log writer did not stop within {timeout}s, dropped {lost} queued entries')
+        self._thread = None
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                'queued': self._queue.qsize(),
+                'submitted': self.submitted,
+                'dropped': self.dropped,
+                'written': self.written,
+                'failed': self.failed,
+                'batches': self.batches,
+                'expired': self.expired,
+            }
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch: list[str] = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stopping = True
+                    break
+                batch.append(item)  # type: ignore
+            if stopping:
+                batch.extend(self._drain())
+            self._flush(batch)
+            if self.rollup is not None:
+                self.rollup.flush()
+            if self.retention > 0:
+                self._expire()
+
+    def _drain(self) -> list[str]:
+        items: list[str] = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return items
+            if isinstance(item, str):
+                items.append(item)
+
+    def _flush(self, batch: list[str]) -> None:
+        if not batch:
+            return
+        if self.rollup is not None:
+            for entry in batch:
+                self.rollup.add(json.loads(entry))
+        key = f'{self.key}:{int(time.time()) // 3600}' if self.retention > 0 else self.key
+        try:
+            self.writer.rpush_many(key, batch)
+        except Exception as e:
+            self.logger.error(f'Failed to flush {len(batch)} request logs: {e}')
+            with self._lock:
+                self.failed += len(batch)
+            return
+        with self._lock:
+            self.written += len(batch)
+            self.batches += 1
+
+    def _expire(self) -> None:
+        oldest = (int(time.time()) - self.retention) // 3600
+        if self._expired_until is None:
+            # Nothing is known about earlier runs, so look back one more day for partitions they left.
+            self._expired_until = oldest - 24
+        for hour in range(self._expired_until, oldest):
+            try:
+                self.writer.delete(f'{self.key}:{hour}')
+            except Exception as e:
+                self.logger.error(f'Failed to expire request logs for hour {hour}: {e}')
+                return
+            self._expired_until = hour + 1
+            with self._lock:
+                self.expired += 1
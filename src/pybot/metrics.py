@@ -0,0 +1,280 @@
+import bisect
+import functools
+import logging
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable
+
+from pybot.setting import MetricsConfig
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+Labels = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    # Label values may hold user input such as usernames; the exposition format needs these escaped.
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Labels, values: Labels, extra: str = '') -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)] + ([extra] if extra else [])
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Labels = ()):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self._values: dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = dict(self._values)
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        lines += [f'{self.name}{_format_labels(self.label_names, k)} {v}' for k, v in sorted(values.items())]
+        return lines
+
+    def snapshot(self) -> dict[str, float]:
+        with self._lock:
+            return {','.join(k) or 'total': v for k, v in self._values.items()}
+
+
+class Histogram:
+    """Cumulative-bucket histogram; observing is a bisect and a few additions under a lock."""
+
+    def __init__(self, name: str, help: str, labels: Labels = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self.buckets = buckets
+        self._series: dict[Labels, list[float]] = {}  # bucket counts..., +Inf count, sum
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0.0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def time(self, *labels: str) -> '_Timer':
+        return _Timer(self, labels)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for labels, values in sorted(series.items()):
+            cumulative = 0.0
+            for bound, count in zip((*self.buckets, '+Inf'), values[:-1]):
+                cumulative += count
+                le = _format_labels(self.label_names, labels, f'le="{bound}"')
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.label_names, labels)} {values[-1]}')
+            lines.append(f'{self.name}_count{_format_labels(self.label_names, labels)} {cumulative}')
+        return lines
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        result = {}
+        for labels, values in series.items():
+            count = sum(values[:-1])
+            result[','.join(labels) or 'total'] = {
+                'count': count,
+                'mean': values[-1] / count if count else 0.0,
+                'p50': self._quantile(values, count, 0.5),
+                'p99': self._quantile(values, count, 0.99),
+            }
+        return result
+
+    def _quantile(self, values: list[float], count: float, q: float) -> float:
+        # Upper bound of the bucket holding the quantile; good enough for dashboards and logs.
+        seen = 0.0
+        for bound, bucket in zip(self.buckets, values):
+            seen += bucket
+            if seen >= q * count:
+                return bound
+        return float('inf')
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram: Histogram, labels: Labels):
+        self.histogram = histogram
+        self.labels = labels
+        self.started = 0.0
+
+    def __enter__(self) -> '_Timer':
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class Gauge:
+    """Value read from a callback at export time, e.g. a queue depth.
+
+    With ``labels`` the callback returns a value per label tuple instead, e.g. the depth of a few chats.
+    """
+
+    def __init__(self, name: str, help: str, fn: Callable[[], Any], labels: Labels = ()):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.label_names = labels
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge']
+        if not self.label_names:
+            return lines + [f'{self.name} {self.fn()}']
+        values = self.fn()
+        return lines + [f'{self.name}{_format_labels(self.label_names, k)} {v}' for k, v in sorted(values.items())]
+
+    def snapshot(self) -> float | dict[str, float]:
+        if not self.label_names:
+            return self.fn()
+        return {','.join(k): v for k, v in self.fn().items()}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: dict[str, Counter | Histogram | Gauge] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str, labels: Labels = ()) -> Counter:
+        return self._register(Counter(name, help, labels))  # type: ignore
+
+    def histogram(
+        self, name: str, help: str, labels: Labels = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))  # type: ignore
+
+    def gauge(self, name: str, help: str, fn: Callable[[], Any], labels: Labels = ()) -> Gauge:
+        with self._lock:
+            # Gauges are re-bound when a new owner (e.g. a fresh executor) takes over the name.
+            gauge = self._metrics[name] = Gauge(name, help, fn, labels)
+        return gauge
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(line for metric in metrics for line in metric.render()) + '\n'
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            metrics = dict(self._metrics)
+        return {name: metric.snapshot() for name, metric in metrics.items()}
+
+    def _register(self, metric: Counter | Histogram) -> Counter | Histogram | Gauge:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+
+REGISTRY = MetricsRegistry()
+
+HANDLER_SECONDS = REGISTRY.histogram('pybot_handler_seconds', 'Command handler latency', ('command', 'status'))
+RATE_LIMITED = REGISTRY.counter('pybot_rate_limited_total', 'Commands rejected by the rate limiter')
+LLM_SECONDS = REGISTRY.histogram('pybot_llm_seconds', 'LLM call latency including retries', ('outcome',))
+LLM_TOKENS = REGISTRY.counter('pybot_llm_tokens_total', 'Tokens reported by the LLM', ('kind',))
+STORAGE_SECONDS = REGISTRY.histogram(
+    'pybot_storage_seconds',
+    'Repository operation latency',
+    ('backend', 'operation'),
+    (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+
+
+class InstrumentedRepository:
+    """Proxy that times every repository method call; generators are timed up to their creation."""
+
+    def __init__(self, repo: Any, backend: str):
+        self._repo = repo
+        self._backend = backend
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._repo, name)
+        if not callable(attr) or name.startswith('_'):
+            return attr
+
+        @functools.wraps(attr)
+        def timed(*args: Any, **kwargs: Any) -> Any:
+            with STORAGE_SECONDS.time(self._backend, name):
+                return attr(*args, **kwargs)
+
+        setattr(self, name, timed)
+        return timed
+
+
+class MetricsExporter:
+    """Serves the registry as Prometheus text on ``/metrics`` and/or logs periodic snapshots."""
+
+    def __init__(
+        self, registry: MetricsRegistry, listen: str = '127.0.0.1', port: int = 0, snapshot_interval: float = 0
+    ):
+        self.registry = registry
+        self.listen = listen
+        self.port = port
+        self.snapshot_interval = snapshot_interval
+        self.logger = logging.getLogger(__name__)
+        self._server: ThreadingHTTPServer | None = None
+        self._stop = threading.Event()
+
+    @classmethod
+    def from_config(cls, config: MetricsConfig, registry: MetricsRegistry = REGISTRY) -> 'MetricsExporter':
+        return cls(registry, config.listen, config.port, config.snapshot_interval)
+
+    def start(self) -> 'MetricsExporter':
+        if self.port:
+            self._server = ThreadingHTTPServer((self.listen, self.port), self._handler_class())
+            self._server.daemon_threads = True
+            threading.Thread(target=self._server.serve_forever, name='metrics', daemon=True).start()
+        if self.snapshot_interval > 0:
+            self._stop.clear()
+            threading.Thread(target=self._log_snapshots, name='metrics-snapshot', daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def _log_snapshots(self) -> None:
+        while not self._stop.wait(self.snapshot_interval):
+            self.logger.info(f'Metrics snapshot: {self.registry.snapshot()}')
+
+    def _handler_class(self) -> type[BaseHTTPRequestHandler]:
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:  # noqa: N802
+                if self.path != '/metrics':
+                    self.send_response(HTTPStatus.NOT_FOUND)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body = registry.render().encode()
+                self.send_response(HTTPStatus.OK)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        return Handler
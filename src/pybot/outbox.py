@@ -0,0 +1,257 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Protocol
+
+from telegram.error import BadRequest, NetworkError, RetryAfter, Unauthorized
+
+from pybot.metrics import REGISTRY
+from pybot.setting import OutboxConfig
+from pybot.streaming import split_message
+
+OUTBOX_SECONDS = REGISTRY.histogram('pybot_outbox_seconds', 'Time outgoing messages wait before being sent')
+
+
+class MessageSender(Protocol):
+    def send_message(self, chat_id: int, text: str, **kwargs: Any) -> Any: ...
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available (0 if one is available now)."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self.delay(now)
+        self.tokens -= 1
+
+
+class _Outgoing:
+    __slots__ = ('text', 'kwargs', 'enqueued', 'attempts')
+
+    def __init__(self, text: str, kwargs: dict[str, Any]):
+        self.text = text
+        self.kwargs = kwargs
+        self.enqueued = time.monotonic()
+        self.attempts = 0
+
+
+class Outbox:
+    """Central outgoing-message queue that paces sends to Telegram's global and per-chat limits.
+
+    ``send`` only enqueues. Sender threads take the chat whose bucket frees up first, so messages of one
+    chat go out in order and at most one at a time, while the global bucket caps the total rate.
+    ``RetryAfter`` pauses just the affected chat for the time Telegram asks; network errors are retried a
+    few times with backoff. Texts over 4096 characters are split into several messages.
+    """
+
+    def __init__(
+        self,
+        sender: MessageSender,
+        *,
+        global_rate: float = 30.0,
+        chat_rate: float = 1.0,
+        chat_burst: float = 3.0,
+        senders: int = 4,
+        max_queue: int = 10000,
+        max_retries: int = 3,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.sender = sender
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.senders = senders
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.clock = clock
+        self.logger = logging.getLogger(__name__)
+        self._global = TokenBucket(global_rate, global_rate, clock())
+        self._buckets: dict[int, TokenBucket] = {}
+        self._chats: dict[int, deque[_Outgoing]] = {}
+        self._ready: list[tuple[float, int, int]] = []  # (not before, tie-breaker, chat id)
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        self._threads: list[threading.Thread] = []
+        self._running = False
+        self._queued = 0
+        self._in_flight = 0
+        self.sent = 0
+        self.retried = 0
+        self.dropped = 0
+        self.failed = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @classmethod
+    def from_config(cls, sender: MessageSender, config: OutboxConfig) -> 'Outbox':
+        return cls(
+            sender,
+            global_rate=config.global_rate,
+            chat_rate=config.chat_rate,
+            chat_burst=config.chat_burst,
+            senders=config.senders,
+            max_queue=config.max_queue,
+            max_retries=config.max_retries,
+        )
+
+    def start(self) -> 'Outbox':
+        with self._cond:
+            if self._running:
+                return self
+            self._running = True
+        for i in range(self.senders):
+            thread = threading.Thread(target=self._work, name=f'outbox-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Give queued messages up to ``timeout`` seconds to go out, then stop the senders."""
+        deadline = self.clock() + timeout
+        with self._cond:
+            while (self._queued or self._in_flight) and self._threads and (left := deadline - self.clock()) > 0:
+                self._cond.wait(min(left, 0.1))
+            self._running = False
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
+
+    def send(self, chat_id: int, text: str, **kwargs: Any) -> bool:
+        """Queue ``text`` for ``chat_id`` without blocking; False if the queue is full."""
+        parts = split_message(text)
+        with self._cond:
+            if self._queued + len(parts) > self.max_queue:
+                self.dropped += len(parts)
+                return False
+            messages = self._chats.get(chat_id)
+            if messages is None:
+                messages = self._chats[chat_id] = deque()
+                self._schedule(chat_id)
+            messages.extend(_Outgoing(part, kwargs) for part in parts)
+            self._queued += len(parts)
+            self._cond.notify()
+        return True
+
+    def acquire(self) -> None:
+        """Block until the global bucket has a token and take it, for calls made outside the queue."""
+        with self._cond:
+            while (wait := self._global.delay(self.clock())) > 0:
+                self._cond.wait(wait)
+            self._global.take(self.clock())
+
+    def stats(self) -> dict[str, float]:
+        with self._cond:
+            return {
+                'queue_depth': self._queued,
+                'pending_chats': len(self._chats),
+                'in_flight': self._in_flight,
+                'sent': self.sent,
+                'retried': self.retried,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'wait_avg': self._wait_total / self.sent if self.sent else 0.0,
+                'wait_max': self._wait_max,
+            }
+
+    def _schedule(self, chat_id: int, not_before: float = 0.0) -> None:
+        now = self.clock()
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst, now)
+        heapq.heappush(self._ready, (max(now + bucket.delay(now), not_before), next(self._order), chat_id))
+
+    def _next(self) -> tuple[int, _Outgoing] | None:
+        with self._cond:
+            while self._running:
+                now = self.clock()
+                wait: float | None
+                if self._ready and self._ready[0][0] <= now:
+                    wait = self._global.delay(now)
+                    if wait <= 0:
+                        _, _, chat_id = heapq.heappop(self._ready)
+                        self._global.take(now)
+                        self._buckets[chat_id].take(now)
+                        self._queued -= 1
+                        self._in_flight += 1
+                        return chat_id, self._chats[chat_id].popleft()
+                else:
+                    wait = self._ready[0][0] - now if self._ready else None
+                self._cond.wait(wait)
+            return None
+
+    def _work(self) -> None:
+        while (item := self._next()) is not None:
+            chat_id, message = item
+            retry_at = self._deliver(chat_id, message)
+            with self._cond:
+                self._in_flight -= 1
+                messages = self._chats[chat_id]
+                if retry_at is not None:
+                    messages.appendleft(message)
+                    self._queued += 1
+                if messages:
+                    self._schedule(chat_id, retry_at or 0.0)
+                else:
+                    del self._chats[chat_id]
+                    self._sweep_buckets()
+                self._cond.notify_all()
+
+    def _deliver(self, chat_id: int, message: _Outgoing) -> float | None:
+        """Send one message; returns when to retry it, or None once it is sent or given up."""
+        message.attempts += 1
+        try:
+            self.sender.send_message(chat_id=chat_id, text=message.text, **message.kwargs)
+        except RetryAfter as e:
+            return self._retry(chat_id, message, float(e.retry_after), e)
+        except (BadRequest, Unauthorized) as e:
+            # Permanent for this message, e.g. the user blocked the bot.
+            self._fail(chat_id, e)
+            return None
+        except NetworkError as e:
+            return self._retry(chat_id, message, min(2 ** (message.attempts - 1), 30), e)
+        except Exception as e:
+            self._fail(chat_id, e)
+            return None
+        waited = time.monotonic() - message.enqueued
+        OUTBOX_SECONDS.observe(waited)
+        with self._cond:
+            self.sent += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return None
+
+    def _retry(self, chat_id: int, message: _Outgoing, delay: float, error: Exception) -> float | None:
+        if message.attempts > self.max_retries:
+            self._fail(chat_id, error)
+            return None
+        with self._cond:
+            self.retried += 1
+        return self.clock() + delay
+
+    def _fail(self, chat_id: int, error: Exception) -> None:
+        self.logger.warning(f'Dropping outgoing message to {chat_id}: {error}')
+        with self._cond:
+            self.failed += 1
+
+    def _sweep_buckets(self) -> None:
+        # Buckets of idle chats that have refilled carry no state worth keeping.
+        if len(self._buckets) <= 4 * max(len(self._chats), 256):
+            return
+        now = self.clock()
+        for chat_id, bucket in list(self._buckets.items()):
+            if chat_id not in self._chats and bucket.delay(now) == 0 and bucket.tokens >= bucket.capacity:
+                del self._buckets[chat_id]
@@ -0,0 +1,247 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Protocol
+
+from pybot.limiter import SlidingWindowLimiter
+from pybot.service.event import EventService
+from pybot.service.user import UserProfile, UserService
+from pybot.setting import PrecomputeConfig
+
+KINDS = ('events', 'more_events')
+# A "more" set is new only once; after serving it the next request needs a different one.
+SINGLE_USE = frozenset({'more_events'})
+
+
+class KeyValueStore(Protocol):
+    def get(self, key: str) -> str | None: ...
+
+    def set(self, key: str, value: str, ttl: int | None = None) -> None: ...
+
+
+class EventPrecomputer:
+    """Keeps the next recommendation set ready for recently active users and refills it in the background.
+
+    ``/events`` and ``/more_events`` read the stored set and schedule a refill (stale-while-revalidate), so
+    the interactive path is a storage read. A periodic scan fills missing or stale sets for users active
+    within ``active_window``. Background generation only runs while ``idle()`` holds and at most ``budget``
+    generations start per ``budget_window`` seconds.
+    """
+
+    def __init__(
+        self,
+        event_service: EventService,
+        user_service: UserService,
+        store: KeyValueStore,
+        *,
+        concurrency: int = 2,
+        ttl: int = 900,
+        max_stale: int = 86400,
+        budget: int = 120,
+        budget_window: int = 3600,
+        active_window: int = 3600,
+        interval: float = 30.0,
+        idle: Callable[[], bool] | None = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.event_service = event_service
+        self.user_service = user_service
+        self.store = store
+        self.concurrency = concurrency
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.active_window = active_window
+        self.interval = interval
+        self.idle = idle or (lambda: True)
+        # Wall-clock time, since generation times are stored and read by every replica.
+        self.clock = clock
+        self.budget = SlidingWindowLimiter(budget, budget_window, clock)
+        self.logger = logging.getLogger(__name__)
+        self._active: OrderedDict[str, float] = OrderedDict()
+        self._pending: set[str] = set()
+        self._lock = threading.Lock()
+        self._pool: ThreadPoolExecutor | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refills = 0
+        self.failed = 0
+        self.skipped_busy = 0
+        self.skipped_budget = 0
+
+    @classmethod
+    def from_config(
+        cls,
+        event_service: EventService,
+        user_service: UserService,
+        store: KeyValueStore,
+        config: PrecomputeConfig,
+        *,
+        idle: Callable[[], bool] | None = None,
+    ) -> 'EventPrecomputer':
+        return cls(
+            event_service,
+            user_service,
+            store,
+            concurrency=config.concurrency,
+            ttl=config.ttl,
+            max_stale=config.max_stale,
+            budget=config.budget,
+            budget_window=config.budget_window,
+            active_window=config.active_window,
+            interval=config.interval,
+            idle=idle,
+        )
+
+    @staticmethod
+    def key(kind: str, profile: UserProfile) -> str:
+        # The profile fingerprint retires sets generated for interests the user has since changed.
+        fingerprint = hashlib.sha1(f'{sorted(profile.interests)}|{profile.description}'.encode()).hexdigest()[:12]
+        return f'precomputed:{kind}:{profile.username}:{fingerprint}'
+
+    def start(self) -> 'EventPrecomputer':
+        if self._thread is None:
+            self._stop.clear()
+            self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='precompute')
+            self._thread = threading.Thread(target=self._run, name='precompute-scan', daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self._pool.shutdown(wait=False, cancel_futures=True)  # type: ignore
+        self._pool = None
+
+    def touch(self, username: str) -> None:
+        with self._lock:
+            self._active[username] = self.clock()
+            self._active.move_to_end(username)
+
+    def recommend(self, kind: str, profile: UserProfile) -> list[dict[str, str]]:
+        """Serve the stored set for ``kind`` if there is one, generating inline only on a miss."""
+        self.touch(profile.username)
+        events = self.serve(kind, profile)
+        if events is None:
+            events = self._generate(kind, profile)
+        self.event_service.store_events(profile.username, events)
+        # The served set is used up either way; have the next one ready for the following request.
+        self.refill(kind, profile)
+        return events
+
+    def serve(self, kind: str, profile: UserProfile) -> list[dict[str, str]] | None:
+        key = self.key(kind, profile)
+        try:
+            raw = self.store.get(key)
+            entry = json.loads(raw) if raw else None
+            if entry and entry['events'] and kind in SINGLE_USE:
+                self.store.set(key, json.dumps({**entry, 'events': []}), ttl=self.max_stale)
+        except Exception as e:
+            self.logger.warning(f'Reading precomputed {kind} for {profile.username} failed: {e}')
+            entry = None
+        with self._lock:
+            if not entry or not entry['events']:
+                self.misses += 1
+                return None
+            if self.clock() - entry['generated'] > self.ttl:
+                self.stale_hits += 1
+            else:
+                self.hits += 1
+        return entry['events']
+
+    def refill(self, kind: str, profile: UserProfile) -> bool:
+        """Schedule a background generation; False when busy, over budget or stopped."""
+        key = self.key(kind, profile)
+        pool = self._pool
+        if pool is None:
+            return False
+        if not self.idle():
+            with self._lock:
+                self.skipped_busy += 1
+            return False
+        with self._lock:
+            if key in self._pending:
+                return True
+            if not self.budget.allow('precompute'):
+                self.skipped_budget += 1
+                return False
+            self._pending.add(key)
+        try:
+            pool.submit(self._refill, key, kind, profile)
+        except RuntimeError:
+            with self._lock:
+                self._pending.discard(key)
+            return False
+        return True
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                'active_users': len(self._active),
+                'pending': len(self._pending),
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'refills': self.refills,
+                'failed': self.failed,
+                'skipped_busy': self.skipped_busy,
+                'skipped_budget': self.skipped_budget,
+            }
+
+    def _generate(self, kind: str, profile: UserProfile) -> list[dict[str, str]]:
+        if kind == 'events':
+            return self.event_service.generate_events(profile)
+        return self.event_service.generate_more_events(profile)
+
+    def _refill(self, key: str, kind: str, profile: UserProfile) -> None:
+        try:
+            events = self._generate(kind, profile)
+            if events:
+                self.store.set(key, json.dumps({'generated': self.clock(), 'events': events}), ttl=self.max_stale)
+            with self._lock:
+                self.refills += 1
+        except Exception as e:
+            self.logger.warning(f'Precomputing {kind} for {profile.username} failed: {e}')
+            with self._lock:
+                self.failed += 1
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self._scan()
+            except Exception as e:
+                self.logger.error(f'Precompute scan failed: {e}')
+
+    def _scan(self) -> None:
+        cutoff = self.clock() - self.active_window
+        with self._lock:
+            while self._active and next(iter(self._active.values())) < cutoff:
+                self._active.popitem(last=False)
+            # Most recently active first, so a tight budget goes to the users most likely to return.
+            usernames = list(reversed(self._active))
+        for username in usernames:
+            profile = self.user_service.get_user(username)
+            if not profile.interests:
+                continue
+            for kind in KINDS:
+                raw = self.store.get(self.key(kind, profile))
+                entry = json.loads(raw) if raw else None
+                if entry and entry['events'] and self.clock() - entry['generated'] <= self.ttl:
+                    continue
+                with self._lock:
+                    saturated = len(self._pending) >= self.concurrency
+                # Leave the rest for the next scan once workers are busy or the budget is spent.
+                if saturated or not self.refill(kind, profile):
+                    return
@@ -0,0 +1,173 @@
+import logging
+import re
+from typing import Any
+
+from pybot.metrics import REGISTRY
+
+_TOKEN_RE = re.compile(r'\w+|[^\w\s]')
+
+PROMPT_TOKENS = REGISTRY.histogram(
+    'pybot_prompt_tokens', 'Estimated prompt size after budgeting', ('prompt',), (64, 128, 256, 512, 1024, 2048, 4096)
+)
+PROMPT_TRIMMED = REGISTRY.counter('pybot_prompt_trimmed_tokens_total', 'Tokens cut to fit the budget', ('prompt',))
+
+
+def count_tokens(text: str) -> int:
+    """Local BPE-style estimate: one token per punctuation mark and per started four characters of a word."""
+    return sum((len(t) + 3) // 4 for t in _TOKEN_RE.findall(text))
+
+
+def truncate_tokens(text: str, max_tokens: int, marker: str = '…') -> str:
+    """Cut ``text`` after the last whole word that fits in ``max_tokens``."""
+    used = 0
+    end = 0
+    for match in _TOKEN_RE.finditer(text):
+        used += (len(match.group()) + 3) // 4
+        if used > max_tokens:
+            return text[:end].rstrip() + marker
+        end = match.end()
+    return text
+
+
+class _Section:
+    __slots__ = ('parts', 'tokens', 'priority', 'joiner', 'drop_from', 'min_items', 'min_tokens', 'omitted', 'empty')
+
+    def __init__(
+        self,
+        parts: list[str],
+        priority: int | None,
+        *,
+        joiner: str = '',
+        drop_from: str = 'end',
+        min_items: int = 0,
+        min_tokens: int = 0,
+        omitted: str | None = None,
+        empty: str = '',
+    ):
+        self.parts = parts
+        self.tokens = [count_tokens(p) for p in parts]
+        self.priority = priority
+        self.joiner = joiner
+        self.drop_from = drop_from
+        self.min_items = min_items
+        self.min_tokens = min_tokens
+        self.omitted = omitted
+        self.empty = empty
+
+
+class PromptBuilder:
+    """Assembles a prompt from prioritised sections and cuts it down to a token budget.
+
+    Sections added without a priority are always kept whole. While the estimate is over budget the
+    lowest-priority section shrinks first: its longest part is truncated down to ``min_tokens``, then
+    whole parts are dropped from ``drop_from`` until ``min_items`` remain. The outcome depends only on
+    the input, so identical requests still produce identical prompts (and cache keys).
+    """
+
+    def __init__(self, budget: int, name: str = 'prompt'):
+        self.budget = budget
+        self.name = name
+        self._sections: list[_Section] = []
+        self.report: dict[str, Any] = {}
+
+    def add(self, text: str, priority: int | None = None, min_tokens: int = 0) -> 'PromptBuilder':
+        self._sections.append(_Section([text], priority, min_items=1, min_tokens=min_tokens))
+        return self
+
+    def add_items(
+        self,
+        items: list[str],
+        priority: int,
+        *,
+        joiner: str = '',
+        drop_from: str = 'end',
+        min_items: int = 0,
+        min_tokens: int = 0,
+        omitted: str | None = None,
+        empty: str = '',
+    ) -> 'PromptBuilder':
+        """Add a list whose items can be dropped; ``omitted`` is a ``{n}`` template noting how many were cut."""
+        section = _Section(
+            list(items),
+            priority,
+            joiner=joiner,
+            drop_from=drop_from,
+            min_items=min_items,
+            min_tokens=min_tokens,
+            omitted=omitted,
+            empty=empty,
+        )
+        self._sections.append(section)
+        return self
+
+    def build(self) -> str:
+        joiner_tokens = {s.joiner: count_tokens(s.joiner) for s in self._sections}
+        total = sum(self._section_tokens(s, joiner_tokens[s.joiner]) for s in self._sections)
+        original = total
+        dropped = truncated = 0
+        dropped_by_section = [0] * len(self._sections)
+        # Later sections win ties, so trailing context is cut before what the prompt opens with.
+        order = sorted(
+            (i for i, s in enumerate(self._sections) if s.priority is not None),
+            key=lambda i: (self._sections[i].priority, -i),
+        )
+        for i in order:
+            section = self._sections[i]
+            while total > self.budget and section.parts:
+                longest = max(range(len(section.tokens)), key=section.tokens.__getitem__)
+                excess = total - self.budget
+                if section.tokens[longest] > section.min_tokens:
+                    limit = max(section.min_tokens, section.tokens[longest] - excess)
+                    section.parts[longest] = truncate_tokens(section.parts[longest], limit)
+                    cut = section.tokens[longest] - count_tokens(section.parts[longest])
+                    if cut <= 0:
+                        section.min_tokens = section.tokens[longest]
+                        continue
+                    section.tokens[longest] -= cut
+                    truncated += cut
+                    total -= cut
+                elif len(section.parts) > section.min_items:
+                    index = 0 if section.drop_from == 'start' else -1
+                    section.parts.pop(index)
+                    total -= section.tokens.pop(index) + (joiner_tokens[section.joiner] if section.parts else 0)
+                    if not section.parts:
+                        total += count_tokens(section.empty)
+                    if section.omitted and not dropped_by_section[i]:
+                        total += count_tokens(section.omitted.format(n=len(section.parts) + 1))
+                    dropped += 1
+                    dropped_by_section[i] += 1
+                else:
+                    break
+            if total <= self.budget:
+                break
+
+        prompt = self._render(dropped_by_section)
+        tokens = count_tokens(prompt)
+        self.report = {
+            'tokens': tokens,
+            'budget': self.budget,
+            'original_tokens': original,
+            'dropped_items': dropped,
+            'truncated_tokens': truncated,
+            'over_budget': tokens > self.budget,
+        }
+        PROMPT_TOKENS.observe(tokens, self.name)
+        if original > tokens:
+            PROMPT_TRIMMED.inc(self.name, amount=original - tokens)
+            logging.info(f'Trimmed {self.name} prompt to fit the budget: {self.report}')
+        return prompt
+
+    def _render(self, dropped_by_section: list[int]) -> str:
+        rendered = []
+        for section, count in zip(self._sections, dropped_by_section):
+            parts = section.parts
+            if count and section.omitted:
+                parts = [*parts, section.omitted.format(n=count)]
+            rendered.append(section.joiner.join(parts) if parts else section.empty)
+        return ''.join(rendered)
+
+    @staticmethod
+    def _section_tokens(section: _Section, joiner_tokens: int) -> int:
+        if not section.parts:
+            return count_tokens(section.empty)
+        return sum(section.tokens) + joiner_tokens * (len(section.parts) - 1)
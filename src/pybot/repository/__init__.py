@@ -0,0 +1,18 @@
+from pybot.repository.base import PubSub, Repository
+from pybot.repository.memory import MemoryRepository
+from pybot.setting import AppConfig, StorageBackend
+
+
+def create_repository(backend: StorageBackend, config: AppConfig) -> Repository:
+    """Build a backend by name; Redis and Firestore are imported only when selected."""
+    if backend == 'memory':
+        return MemoryRepository()
+    if backend == 'redis':
+        from pybot.repository.redis import RedisRepository
+
+        return RedisRepository(config.redis)
+    if backend == 'firebase':
+        from pybot.repository.firebase import FirebaseRepository
+
+        return FirebaseRepository()
+    raise ValueError(f'Unknown storage backend: {backend}')
@@ -0,0 +1,75 @@
+from typing import Callable, Iterator, Protocol, runtime_checkable
+
+
+class Repository(Protocol):
+    """Storage surface shared by every backend: users, counters, key/value, lists and rate limits."""
+
+    def warm_up(self) -> None:
+        """Open connections ahead of the first request; backends otherwise connect on first use."""
+        ...
+
+    # Users
+    def save_user(self, user: dict) -> None: ...
+
+    def get_user(self, name: str) -> dict | None: ...
+
+    def get_users(self, names: list[str]) -> dict[str, dict]: ...
+
+    def list_users(self) -> Iterator[dict]: ...
+
+    # Counters
+    def incr(self, key: str) -> int: ...
+
+    def incr_shard(self, key: str, amount: int, shard: int) -> None: ...
+
+    def incr_many(self, amounts: dict[str, int]) -> None: ...
+
+    def get_count(self, key: str) -> int: ...
+
+    def incr_fields(self, amounts: dict[str, dict[str, int]], ttl: int | None = None) -> None:
+        """Add to named integer fields of several records at once; ``ttl`` restarts each record's expiry."""
+        ...
+
+    def get_fields(self, keys: list[str]) -> list[dict[str, int]]:
+        """The fields of each record in one round trip; missing or expired records are empty."""
+        ...
+
+    # Key/value
+    def get(self, key: str) -> str | None: ...
+
+    def set(self, key: str, value: str, ttl: int | None = None) -> None: ...
+
+    def delete(self, key: str) -> None:
+        """Remove the value, list or ring stored under ``key``; a missing key is not an error."""
+        ...
+
+    # Lists
+    def rpush(self, key: str, value: str) -> None: ...
+
+    def rpush_many(self, key: str, values: list[str]) -> None: ...
+
+    def lrange(self, key: str, start: int, end: int) -> list[str]: ...
+
+    def push_capped(self, key: str, values: list[str], cap: int) -> None: ...
+
+    def read_window(self, key: str, offset: int, limit: int) -> list[str]:
+        """Up to ``limit`` items, newest first, skipping the ``offset`` newest."""
+        ...
+
+    # Rate limits
+    def rate_limit(self, key: str, limit: int, window: int) -> bool:
+        """Sliding-window check-and-increment; True when the call is allowed."""
+        ...
+
+
+@runtime_checkable
+class PubSub(Protocol):
+    def publish(self, channel: str, message: str) -> None: ...
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]) -> object: ...
+
+
+def window_weight(now: float, window: int) -> tuple[int, float]:
+    """Current window index and how much of the previous window still overlaps the sliding window."""
+    index = int(now // window)
+    return index, 1 - (now - index * window) / window
@@ -0,0 +1,226 @@
+import threading
+import time
+from typing import Any, Iterator
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+from pybot.repository.base import window_weight
+
+_db: Any = None
+_db_lock = threading.Lock()
+
+# Firestore caps a batch at 500 writes.
+BATCH_SIZE = 500
+
+
+def get_db(credentials_path: str = 'secret/serviceAccountKey.json') -> Any:
+    """Initialise the Firebase app and Firestore client on first use."""
+    global _db
+    if _db is None:
+        with _db_lock:
+            if _db is None:
+                firebase_admin.initialize_app(credentials.Certificate(credentials_path))
+                _db = firestore.client()
+    return _db
+
+
+class FirebaseRepository:
+    def __init__(self, credentials_path: str = 'secret/serviceAccountKey.json'):
+        self.credentials_path = credentials_path
+
+    @property
+    def db(self) -> Any:
+        return get_db(self.credentials_path)
+
+    @property
+    def collection(self) -> Any:
+        return self.db.collection('users')
+
+    @property
+    def counters(self) -> Any:
+        return self.db.collection('counters')
+
+    @property
+    def lists(self) -> Any:
+        return self.db.collection('lists')
+
+    @property
+    def rings(self) -> Any:
+        return self.db.collection('rings')
+
+    @property
+    def fields(self) -> Any:
+        return self.db.collection('fields')
+
+    @property
+    def kv(self) -> Any:
+        return self.db.collection('kv')
+
+    @property
+    def rate_limits(self) -> Any:
+        return self.db.collection('rate_limits')
+
+    def warm_up(self) -> None:
+        get_db(self.credentials_path)
+
+    def save_user(self, user: dict) -> None:
+        name = user['name']
+        self.collection.document(name).set(user)
+
+    def get_user(self, name: str) -> dict | None:
+        doc = self.collection.document(name).get()
+        return doc.to_dict() if doc.exists else None
+
+    def get_users(self, names: list[str]) -> dict[str, dict]:
+        refs = [self.collection.document(name) for name in names]
+        return {doc.id: doc.to_dict() for doc in self.db.get_all(refs) if doc.exists}
+
+    def list_users(self) -> Iterator[dict]:
+        for doc in self.collection.stream():
+            yield doc.to_dict()
+
+    def rate_limit(self, key: str, limit: int, window: int) -> bool:
+        index, weight = window_weight(time.time(), window)
+        limit_ref = self.rate_limits.document(key)
+
+        @firestore.transactional
+        def check(transaction):
+            snapshot = limit_ref.get(transaction=transaction)
+            state = (snapshot.to_dict() or {}) if snapshot.exists else {}
+            previous, current = state.get('previous', 0), state.get('current', 0)
+            if state.get('index') != index:
+                previous, current = (current if state.get('index') == index - 1 else 0), 0
+            allowed = previous * weight + current < limit
+            transaction.set(limit_ref, {'index': index, 'previous': previous, 'current': current + allowed})
+            return allowed
+
+        return check(self.db.transaction())
+
+    def incr(self, key: str) -> int:
+        self.incr_shard(key, 1, 0)
+        return self.get_count(key)
+
+    def incr_shard(self, key: str, amount: int, shard: int) -> None:
+        # Increment is a server-side transform, so writers to different shards never contend.
+        shard_ref = self.counters.document(key).collection('shards').document(str(shard))
+        shard_ref.set({'value': firestore.Increment(amount)}, merge=True)
+
+    def incr_many(self, amounts: dict[str, int]) -> None:
+        items = list(amounts.items())
+        for i in range(0, len(items), BATCH_SIZE):
+            batch = self.db.batch()
+            for key, amount in items[i : i + BATCH_SIZE]:
+                shard_ref = self.counters.document(key).collection('shards').document('0')
+                batch.set(shard_ref, {'value': firestore.Increment(amount)}, merge=True)
+            batch.commit()
+
+    def get_count(self, key: str) -> int:
+        counter_ref = self.counters.document(key)
+        base = counter_ref.get()
+        total = (base.to_dict() or {}).get('value', 0) if base.exists else 0
+        # Summed server side: one round trip instead of streaming every shard document.
+        result = counter_ref.collection('shards').sum('value', alias='total').get()
+        return int(total + (result[0][0].value or 0))
+
+    def incr_fields(self, amounts: dict[str, dict[str, int]], ttl: int | None = None) -> None:
+        # Increments are merged server side, so any number of writers can add to the same record.
+        items = list(amounts.items())
+        for i in range(0, len(items), BATCH_SIZE):
+            batch = self.db.batch()
+            for key, fields in items[i : i + BATCH_SIZE]:
+                data: dict[str, Any] = {'counts': {f: firestore.Increment(n) for f, n in fields.items()}}
+                data['expires'] = time.time() + ttl if ttl else None
+                batch.set(self.fields.document(key), data, merge=True)
+            batch.commit()
+
+    def get_fields(self, keys: list[str]) -> list[dict[str, int]]:
+        refs = [self.fields.document(key) for key in keys]
+        docs = {doc.id: doc.to_dict() or {} for doc in self.db.get_all(refs) if doc.exists}
+        now = time.time()
+        results = []
+        for key in keys:
+            data = docs.get(key, {})
+            expires = data.get('expires')
+            results.append({} if expires is not None and expires <= now else dict(data.get('counts', {})))
+        return results
+
+    def get(self, key: str) -> str | None:
+        doc = self.kv.document(key).get()
+        if not doc.exists:
+            return None
+        data = doc.to_dict() or {}
+        expires = data.get('expires')
+        return None if expires is not None and expires <= time.time() else data.get('value')
+
+    def set(self, key: str, value: str, ttl: int | None = None) -> None:
+        self.kv.document(key).set({'value': value, 'expires': time.time() + ttl if ttl else None})
+
+    def delete(self, key: str) -> None:
+        self.kv.document(key).delete()
+        self.fields.document(key).delete()
+        self.rings.document(key).delete()
+        # A document's subcollection outlives it, so list items are deleted batch by batch.
+        list_ref = self.lists.document(key).collection('items')
+        while docs := list_ref.limit(BATCH_SIZE).get():
+            batch = self.db.batch()
+            for doc in docs:
+                batch.delete(doc.reference)
+            batch.commit()
+
+    def rpush(self, key: str, value: str) -> None:
+        list_ref = self.lists.document(key).collection('items')
+        list_ref.add({'value': value, 'timestamp': firestore.SERVER_TIMESTAMP})
+
+    def rpush_many(self, key: str, values: list[str]) -> None:
+        list_ref = self.lists.document(key).collection('items')
+        for i in range(0, len(values), BATCH_SIZE):
+            batch = self.db.batch()
+            for value in values[i : i + BATCH_SIZE]:
+                batch.set(list_ref.document(), {'value': value, 'timestamp': firestore.SERVER_TIMESTAMP})
+            batch.commit()
+
+    def lrange(self, key: str, start: int, end: int) -> list[str]:
+        list_ref = self.lists.document(key).collection('items')
+        query = list_ref.order_by('timestamp').limit(end + 1)
+        docs = query.get()
+
+        values = [doc.to_dict()['value'] for doc in docs]
+        return values[start : end + 1] if values else []
+
+    def push_capped(self, key: str, values: list[str], cap: int) -> None:
+        ring_ref = self.rings.document(key)
+
+        @firestore.transactional
+        def append(transaction):
+            snapshot = ring_ref.get(transaction=transaction)
+            items = (snapshot.to_dict() or {}).get('items', []) if snapshot.exists else []
+            transaction.set(ring_ref, {'items': (items + values)[-cap:]})
+
+        append(self.db.transaction())
+
+    def read_window(self, key: str, offset: int, limit: int) -> list[str]:
+        snapshot = self.rings.document(key).get()
+        items = (snapshot.to_dict() or {}).get('items', []) if snapshot.exists else []
+        end = len(items) - offset
+        return list(reversed(items[max(end - limit, 0) : max(end, 0)]))
+
+
+if __name__ == '__main__':
+    repo = FirebaseRepository()
+
+    # 测试用户存储和获取
+    user = {'name': 'Alice', 'age': 20}
+    repo.save_user(user)
+    print('User:', repo.get_user('Alice'))
+
+    # 测试计数器
+    print('Counter after incr:', repo.incr('visits'))  # 1
+    print('Counter after incr:', repo.incr('visits'))  # 2
+
+    # 测试列表操作
+    repo.rpush('events', 'login')
+    repo.rpush('events', 'logout')
+    repo.rpush('events', 'purchase')
+    print('Events range [0:1]:', repo.lrange('events', 0, 1))  # ['login', 'logout']
+    print('Events range [1:2]:', repo.lrange('events', 1, 2))  # ['logout', 'purchase']
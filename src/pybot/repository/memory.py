@@ -0,0 +1,143 @@
+import copy
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Iterator
+
+from pybot.repository.base import window_weight
+
+
+class MemoryRepository:
+    """In-process backend for tests, benchmarks and single-replica deployments."""
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        self._users: dict[str, dict] = {}
+        self._counters: defaultdict[str, int] = defaultdict(int)
+        self._values: dict[str, tuple[str, float | None]] = {}
+        self._fields: dict[str, tuple[defaultdict[str, int], float | None]] = {}
+        self._lists: defaultdict[str, list[str]] = defaultdict(list)
+        self._rate_limits: dict[str, tuple[int, int, int]] = {}
+        self._subscribers: defaultdict[str, list[Callable[[str], None]]] = defaultdict(list)
+        self._lock = threading.RLock()
+
+    def warm_up(self) -> None:
+        pass
+
+    def save_user(self, user: dict) -> None:
+        with self._lock:
+            self._users[user['name']] = copy.deepcopy(user)
+
+    def get_user(self, name: str) -> dict | None:
+        with self._lock:
+            user = self._users.get(name)
+            return copy.deepcopy(user) if user is not None else None
+
+    def get_users(self, names: list[str]) -> dict[str, dict]:
+        with self._lock:
+            return {name: copy.deepcopy(self._users[name]) for name in names if name in self._users}
+
+    def list_users(self) -> Iterator[dict]:
+        with self._lock:
+            users = copy.deepcopy(list(self._users.values()))
+        yield from users
+
+    def rate_limit(self, key: str, limit: int, window: int) -> bool:
+        index, weight = window_weight(self.clock(), window)
+        with self._lock:
+            start, previous, current = self._rate_limits.get(key, (index, 0, 0))
+            if start != index:
+                previous, current = (current if start == index - 1 else 0), 0
+            allowed = previous * weight + current < limit
+            self._rate_limits[key] = (index, previous, current + allowed)
+            return allowed
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] += 1
+            return self._counters[key]
+
+    def incr_shard(self, key: str, amount: int, shard: int) -> None:
+        with self._lock:
+            self._counters[key] += amount
+
+    def incr_many(self, amounts: dict[str, int]) -> None:
+        with self._lock:
+            for key, amount in amounts.items():
+                self._counters[key] += amount
+
+    def get_count(self, key: str) -> int:
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr_fields(self, amounts: dict[str, dict[str, int]], ttl: int | None = None) -> None:
+        with self._lock:
+            now = self.clock()
+            for key, fields in amounts.items():
+                item = self._fields.get(key)
+                counts = item[0] if item is not None and (item[1] is None or item[1] > now) else defaultdict(int)
+                for field, amount in fields.items():
+                    counts[field] += amount
+                self._fields[key] = (counts, now + ttl if ttl else None)
+
+    def get_fields(self, keys: list[str]) -> list[dict[str, int]]:
+        with self._lock:
+            now = self.clock()
+            items = (self._fields.get(key) for key in keys)
+            return [dict(i[0]) if i is not None and (i[1] is None or i[1] > now) else {} for i in items]
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            item = self._values.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires is not None and expires <= self.clock():
+                del self._values[key]
+                return None
+            return value
+
+    def set(self, key: str, value: str, ttl: int | None = None) -> None:
+        with self._lock:
+            self._values[key] = (value, self.clock() + ttl if ttl else None)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._values.pop(key, None)
+            self._fields.pop(key, None)
+            self._lists.pop(key, None)
+
+    def rpush(self, key: str, value: str) -> None:
+        with self._lock:
+            self._lists[key].append(value)
+
+    def rpush_many(self, key: str, values: list[str]) -> None:
+        with self._lock:
+            self._lists[key].extend(values)
+
+    def lrange(self, key: str, start: int, end: int) -> list[str]:
+        with self._lock:
+            items = self._lists.get(key, [])
+            return items[start : (end + 1) or None]
+
+    def push_capped(self, key: str, values: list[str], cap: int) -> None:
+        with self._lock:
+            items = self._lists[key]
+            items.extend(values)
+            del items[:-cap]
+
+    def read_window(self, key: str, offset: int, limit: int) -> list[str]:
+        with self._lock:
+            items = self._lists.get(key, [])
+            end = len(items) - offset
+            return list(reversed(items[max(end - limit, 0) : max(end, 0)]))
+
+    def publish(self, channel: str, message: str) -> None:
+        with self._lock:
+            callbacks = list(self._subscribers[channel])
+        for callback in callbacks:
+            callback(message)
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]) -> None:
+        with self._lock:
+            self._subscribers[channel].append(callback)
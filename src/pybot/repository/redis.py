@@ -0,0 +1,131 @@
+import json
+import threading
+import time
+from typing import Callable, Iterator, cast
+
+import redis
+
+from pybot.repository.base import window_weight
+from pybot.setting import RedisConfig
+
+# Sliding-window counter: weight the previous window by its remaining overlap, then check and bump
+# the current window in the same script so replicas never race between the read and the write.
+RATE_LIMIT_SCRIPT = """
+local previous = tonumber(redis.call('GET', KEYS[1]) or '0')
+local current = tonumber(redis.call('GET', KEYS[2]) or '0')
+if previous * tonumber(ARGV[3]) + current >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], tonumber(ARGV[2]) * 2)
+return 1
+"""
+
+USERS_KEY = 'users'
+
+
+class RedisRepository:
+    def __init__(self, redis_config: RedisConfig):
+        self.client = redis.Redis(**redis_config.model_dump())
+        self._rate_limit = self.client.register_script(RATE_LIMIT_SCRIPT)
+
+    def warm_up(self) -> None:
+        # redis-py connects lazily; a ping opens the first pooled connection.
+        self.client.ping()
+
+    def save_user(self, user: dict) -> None:
+        name = user['name']
+        pipe = self.client.pipeline()
+        pipe.set(f'user:{name}', json.dumps(user, default=list))
+        pipe.sadd(USERS_KEY, name)
+        pipe.execute()
+
+    def get_user(self, name: str) -> dict | None:
+        value = self.client.get(f'user:{name}')
+        return json.loads(value) if value else None
+
+    def get_users(self, names: list[str]) -> dict[str, dict]:
+        if not names:
+            return {}
+        values = self.client.mget([f'user:{name}' for name in names])
+        return {name: json.loads(value) for name, value in zip(names, values) if value}
+
+    def list_users(self) -> Iterator[dict]:
+        names = sorted(self.client.smembers(USERS_KEY))
+        for i in range(0, len(names), 500):
+            yield from self.get_users(names[i : i + 500]).values()
+
+    def rate_limit(self, key: str, limit: int, window: int) -> bool:
+        index, weight = window_weight(time.time(), window)
+        keys = [f'{key}:{index - 1}', f'{key}:{index}']
+        return bool(self._rate_limit(keys=keys, args=[limit, window, weight]))
+
+    def incr(self, key: str) -> int:
+        return int(self.client.incr(key))
+
+    def incr_shard(self, key: str, amount: int, shard: int) -> None:
+        # A single Redis key already takes increments atomically without contention.
+        self.client.incrby(key, amount)
+
+    def incr_many(self, amounts: dict[str, int]) -> None:
+        pipe = self.client.pipeline(transaction=False)
+        for key, amount in amounts.items():
+            pipe.incrby(key, amount)
+        pipe.execute()
+
+    def get_count(self, key: str) -> int:
+        return int(self.client.get(key) or 0)
+
+    def incr_fields(self, amounts: dict[str, dict[str, int]], ttl: int | None = None) -> None:
+        pipe = self.client.pipeline(transaction=False)
+        for key, fields in amounts.items():
+            for field, amount in fields.items():
+                pipe.hincrby(key, field, amount)
+            if ttl:
+                pipe.expire(key, ttl)
+        pipe.execute()
+
+    def get_fields(self, keys: list[str]) -> list[dict[str, int]]:
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            pipe.hgetall(key)
+        return [{field: int(value) for field, value in fields.items()} for fields in pipe.execute()]
+
+    def get(self, key: str) -> str | None:
+        # The client decodes responses (RedisConfig.decode_responses), so values are str.
+        value = cast(str | None, self.client.get(key))
+        return value if value else None
+
+    def set(self, key: str, value: str, ttl: int | None = None) -> None:
+        self.client.set(key, value, ex=ttl)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(key)
+
+    def rpush(self, key: str, value: str) -> None:
+        self.client.rpush(key, value)
+
+    def rpush_many(self, key: str, values: list[str]) -> None:
+        if values:
+            self.client.rpush(key, *values)
+
+    def lrange(self, key: str, start: int, end: int) -> list[str]:
+        return cast(list[str], self.client.lrange(key, start, end))
+
+    def push_capped(self, key: str, values: list[str], cap: int) -> None:
+        pipe = self.client.pipeline()
+        pipe.rpush(key, *values)
+        pipe.ltrim(key, -cap, -1)
+        pipe.execute()
+
+    def read_window(self, key: str, offset: int, limit: int) -> list[str]:
+        items = self.client.lrange(key, -(offset + limit), -(offset + 1))
+        return list(reversed(items))
+
+    def publish(self, channel: str, message: str) -> None:
+        self.client.publish(channel, message)
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]) -> threading.Thread:
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{channel: lambda message: callback(message['data'])})
+        return pubsub.run_in_thread(sleep_time=1.0, daemon=True)
@@ -0,0 +1,172 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Protocol
+
+from pybot.setting import RollupConfig
+
+# Upper bounds of the latency buckets in milliseconds; the last bucket takes everything slower.
+LATENCY_BUCKETS = (100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Seconds covered by one aggregate at each resolution.
+RESOLUTIONS = {'minute': 60, 'hour': 3600}
+
+# Positions in an aggregate row: request count, successful count, then one per latency bucket.
+ROW_SIZE = len(LATENCY_BUCKETS) + 3
+
+
+class FieldStore(Protocol):
+    def incr_fields(self, amounts: dict[str, dict[str, int]], ttl: int | None = None) -> None: ...
+
+    def get_fields(self, keys: list[str]) -> list[dict[str, int]]: ...
+
+
+def bucket_of(latency_ms: float) -> int:
+    for i, bound in enumerate(LATENCY_BUCKETS):
+        if latency_ms <= bound:
+            return i
+    return len(LATENCY_BUCKETS)
+
+
+class Summary:
+    """Merged counts for one command, or one user, over a span of aggregates."""
+
+    __slots__ = ('count', 'ok', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.ok = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def add(self, row: list[int]) -> None:
+        self.count += row[0]
+        self.ok += row[1]
+        for i, n in enumerate(row[2:]):
+            self.buckets[i] += n
+
+    @property
+    def success_ratio(self) -> float:
+        return self.ok / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Upper bound in ms of the bucket holding the ``q`` quantile; inf when it is the open-ended one."""
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= q * self.count:
+                break
+        return LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else float('inf')
+
+
+class LogRollup:
+    """Folds request log events into per-minute and per-hour aggregates per command and user.
+
+    Each aggregate row holds the request count, the successful count and a latency histogram. Every
+    period is its own record: ``rollups:minute:<start>`` has a row per command and
+    ``rollups:minute:<start>:<user>`` one row for that user. ``flush`` adds the counts gathered since
+    the last flush as increments, so any number of processes merge into the same records, and records
+    expire once they are older than their resolution's retention. A query reads one record per period
+    asked for, whatever the traffic or the number of writers.
+    """
+
+    def __init__(
+        self,
+        store: FieldStore,
+        minute_retention: int = 4 * 3600,
+        hour_retention: int = 14 * 86400,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.store = store
+        self.retention = {'minute': minute_retention, 'hour': hour_retention}
+        self.clock = clock
+        self.logger = logging.getLogger(__name__)
+        # resolution -> period start -> command, or '@' and a username -> row
+        self._pending: dict[str, dict[int, dict[str, list[int]]]] = {r: {} for r in RESOLUTIONS}
+        self._lock = threading.Lock()
+        self.events = 0
+        self.written = 0
+        self.failed = 0
+
+    @classmethod
+    def from_config(cls, store: FieldStore, config: RollupConfig) -> 'LogRollup':
+        return cls(store, minute_retention=config.minute_retention, hour_retention=config.hour_retention)
+
+    @staticmethod
+    def key(resolution: str, start: int, username: str | None = None) -> str:
+        return f'rollups:{resolution}:{start}' if username is None else f'rollups:{resolution}:{start}:{username}'
+
+    def add(self, event: dict[str, Any]) -> None:
+        """Count one request log event (``timestamp``, ``username``, ``command``, ``success``, ``latency``)."""
+        bucket = bucket_of(event.get('latency', 0.0) * 1000)
+        with self._lock:
+            for resolution, seconds in RESOLUTIONS.items():
+                start = int(event['timestamp'] // seconds * seconds)
+                rows = self._pending[resolution].setdefault(start, {})
+                # The user's own row needs no per-command split: /stats only shows their total.
+                for group in (event['command'], f'@{event["username"]}'):
+                    row = rows.get(group)
+                    if row is None:
+                        row = rows[group] = [0] * ROW_SIZE
+                    row[0] += 1
+                    row[1] += bool(event['success'])
+                    row[2 + bucket] += 1
+            self.events += 1
+
+    def flush(self) -> None:
+        """Add everything counted since the last flush to the stored aggregates."""
+        with self._lock:
+            pending = self._pending
+            self._pending = {r: {} for r in RESOLUTIONS}
+        for resolution, periods in pending.items():
+            if not periods:
+                continue
+            amounts: defaultdict[str, dict[str, int]] = defaultdict(dict)
+            for start, rows in periods.items():
+                for group, row in rows.items():
+                    if group.startswith('@'):
+                        amounts[self.key(resolution, start, group[1:])] = {str(i): n for i, n in enumerate(row) if n}
+                    else:
+                        amounts[self.key(resolution, start)].update({f'{group}:{i}': n for i, n in enumerate(row) if n})
+            try:
+                self.store.incr_fields(dict(amounts), ttl=self.retention[resolution])
+            except Exception as e:
+                self.logger.error(f'Failed to write {len(amounts)} {resolution} rollups: {e}')
+                with self._lock:
+                    self.failed += len(amounts)
+                continue
+            with self._lock:
+                self.written += len(amounts)
+
+    def summarize(
+        self, resolution: str, periods: int, username: str | None = None
+    ) -> tuple[dict[str, Summary], Summary]:
+        """Per-command summaries of the last ``periods`` periods, the current one included, and the user's."""
+        seconds = RESOLUTIONS[resolution]
+        current = int(self.clock()) // seconds * seconds
+        starts = [current - i * seconds for i in range(min(periods, self.retention[resolution] // seconds))]
+        keys = [self.key(resolution, start) for start in starts]
+        if username is not None:
+            keys += [self.key(resolution, start, username) for start in starts]
+        records = self.store.get_fields(keys)
+        commands: defaultdict[str, Summary] = defaultdict(Summary)
+        rows: defaultdict[str, list[int]] = defaultdict(lambda: [0] * ROW_SIZE)
+        for fields in records[: len(starts)]:
+            for name, n in fields.items():
+                command, _, i = name.rpartition(':')
+                rows[command][int(i)] += n
+        for command, row in rows.items():
+            commands[command].add(row)
+        user = Summary()
+        for fields in records[len(starts) :]:
+            user.add([fields.get(str(i), 0) for i in range(ROW_SIZE)])
+        return dict(commands), user
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                'pending_periods': sum(len(periods) for periods in self._pending.values()),
+                'events': self.events,
+                'written': self.written,
+                'failed': self.failed,
+            }
@@ -1,3 +1,3 @@
-from .chatgpt import ChatGPTService
+from .chatgpt import ChatGPTService, LLMBusy, LLMError, LLMTimeout, LLMUnavailable, LLMUpstreamError
 from .event import EventService
 from .user import UserService
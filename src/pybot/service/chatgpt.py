@@ -1,20 +1,313 @@
+import asyncio
+import contextvars
+import json
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Iterator
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from pybot.breaker import CircuitBreaker
+from pybot.cache import CompletionCache, TTLCache, prompt_key
+from pybot.deadline import remaining
+from pybot.metrics import LLM_SECONDS, LLM_TOKENS
 from pybot.setting import ChatGPTConfig
+from pybot.singleflight import SingleFlight
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class LLMError(Exception):
+    """An LLM call that produced no answer."""
+
+
+class LLMTimeout(LLMError):
+    """The call could not finish before the caller's deadline."""
+
+
+class LLMBusy(LLMTimeout):
+    """No request was sent: every slot stayed taken until the deadline, or the deadline had already passed."""
+
+
+class LLMUnavailable(LLMError):
+    """The circuit breaker is open, so the call was not attempted."""
+
+
+class LLMUpstreamError(LLMError):
+    """The endpoint kept failing or answered with something unusable."""
 
 
 class ChatGPTService:
-    def __init__(self, config: ChatGPTConfig):
+    def __init__(self, config: ChatGPTConfig, cache: CompletionCache | None = None):
         self.config = config
+        self.cache = cache
         self.url = f'{config.basicurl}/deployments/{config.modelname}/chat/completions/?api-version={config.apiversion}'
         self.headers = {'Content-Type': 'application/json', 'api-key': config.access_token}
+        self.timeout = (config.connect_timeout, config.read_timeout)
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config.pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # Shared by the sync and async paths so the total number of in-flight calls stays capped.
+        self._semaphore = threading.BoundedSemaphore(config.max_concurrency)
+        # Identical prompts in flight at the same time share one upstream call and its outcome.
+        self.inflight: SingleFlight[str] = SingleFlight()
+        self.breaker = CircuitBreaker(
+            window=config.breaker_window,
+            min_calls=config.breaker_min_calls,
+            error_rate=config.breaker_error_rate,
+            slow_call=config.breaker_slow_call,
+            open_seconds=config.breaker_open_seconds,
+        )
+        self._hedge_pool = None
+        if config.hedge_after > 0:
+            self._hedge_pool = ThreadPoolExecutor(max_workers=2 * config.max_concurrency, thread_name_prefix='llm')
+        # Answers to serve when the upstream fails, kept however old they are.
+        self.last_good: TTLCache[str, str] | None = None
+        if config.fallback_size > 0:
+            self.last_good = TTLCache(config.fallback_size, ttl=float('inf'))
+        self._lock = threading.Lock()
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.fallbacks = 0
+
+    def submit(self, message: str, use_cache: bool = False, history: list[dict[str, str]] | None = None) -> str:
+        """Complete ``message`` after the ``history`` messages, if any.
+
+        Raises ``LLMError`` unless an earlier answer can stand in for a failed call; answers that depend on a
+        history are neither cached nor served from the cache.
+        """
+        messages = [*(history or ()), {'role': 'user', 'content': message}]
+        if history:
+            return self._shared(prompt_key(json.dumps(messages)), messages)
+        cache = self.cache if use_cache else None
+        if cache is not None and (cached := cache.get(message)) is not None:
+            return cached
+        key = prompt_key(message)
+        try:
+            content = self._shared(key, messages)
+        except LLMError:
+            # The last good answer for this prompt beats an error while the upstream is degraded. The
+            # completion cache expires, so the last-good store, which only evicts, covers long outages.
+            cached = self.cache.get(message) if self.cache is not None else None
+            if cached is None and self.last_good is not None:
+                cached = self.last_good.get(key)
+            if cached is not None:
+                with self._lock:
+                    self.fallbacks += 1
+                return cached
+            raise
+        if cache is not None:
+            cache.set(message, content)
+        if self.last_good is not None:
+            self.last_good.set(key, content)
+        return content
+
+    async def asubmit(self, message: str, use_cache: bool = False) -> str:
+        return await asyncio.to_thread(self.submit, message, use_cache)
+
+    def stream(self, message: str, history: list[dict[str, str]] | None = None) -> Iterator[str]:
+        """Yield content deltas from the chat-completions SSE stream as they arrive; raises ``LLMError``."""
+        if not self.breaker.allow():
+            raise LLMUnavailable('LLM circuit breaker is open')
+        started = time.monotonic()
+        ok: bool | None = False
+        try:
+            messages = [*(history or ()), {'role': 'user', 'content': message}]
+            response = self._request({'messages': messages, 'stream': True}, stream=True)
+            try:
+                yield from self._deltas(response)
+            finally:
+                response.close()
+                self._semaphore.release()
+            ok = True
+        except (LLMBusy, GeneratorExit):
+            # Local overload, or a consumer that stopped reading, says nothing about the endpoint.
+            ok = None
+            raise
+        finally:
+            self._record(ok, started)
+
+    @staticmethod
+    def _deltas(response: requests.Response) -> Iterator[str]:
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                data = line[len('data:') :].strip()
+                if data == '[DONE]':
+                    return
+                choices = json.loads(data).get('choices') or []
+                delta = choices[0].get('delta', {}).get('content') if choices else None
+                if delta:
+                    yield delta
+        except requests.Timeout as e:
+            raise LLMTimeout(f'LLM stream stalled: {e}') from e
+        except (requests.RequestException, ValueError) as e:
+            raise LLMUpstreamError(f'LLM stream failed: {e}') from e
+
+    def stats(self) -> dict[str, float]:
+        with self._lock:
+            hedging = {'hedges': self.hedges, 'hedge_wins': self.hedge_wins, 'fallbacks': self.fallbacks}
+        return {**self.breaker.stats(), **hedging}
+
+    def close(self) -> None:
+        self.session.close()
+        if self._hedge_pool is not None:
+            self._hedge_pool.shutdown(wait=False)
+
+    def warm_up(self) -> None:
+        # Any response will do: the point is to leave a TLS connection to the endpoint in the pool.
+        self.session.head(self.config.basicurl, timeout=self.timeout)
+
+    def _shared(self, key: str, messages: list[dict[str, str]]) -> str:
+        try:
+            return self.inflight.do(key, lambda: self._guarded(messages))
+        except TimeoutError as e:
+            raise LLMTimeout(str(e)) from e
+
+    def _guarded(self, messages: list[dict[str, str]]) -> str:
+        if not self.breaker.allow():
+            raise LLMUnavailable('LLM circuit breaker is open')
+        started = time.monotonic()
+        ok: bool | None = False
+        try:
+            content = self._complete(messages) if self._hedge_pool is None else self._hedged(messages)
+            ok = True
+            return content
+        except LLMBusy:
+            ok = None
+            raise
+        finally:
+            self._record(ok, started)
+
+    def _record(self, ok: bool | None, started: float) -> None:
+        """Feed an upstream outcome to the breaker; ``None`` means the call never told us anything about it."""
+        if ok is None:
+            self.breaker.cancel()
+        else:
+            self.breaker.record(ok, time.monotonic() - started)
+
+    def _hedged(self, messages: list[dict[str, str]]) -> str:
+        """Send a duplicate request when the first is slower than ``hedge_after`` and take whichever wins."""
+        pool = self._hedge_pool
+        first = pool.submit(contextvars.copy_context().run, self._complete, messages)  # type: ignore
+        pending: set[Future[str]] = {first}
+        left = remaining()
+        done, _ = wait(pending, timeout=self.config.hedge_after if left is None else min(self.config.hedge_after, left))
+        if not done and self._has_spare_slot():
+            with self._lock:
+                self.hedges += 1
+            pending.add(pool.submit(contextvars.copy_context().run, self._complete, messages))  # type: ignore
+        error: BaseException | None = None
+        while pending:
+            done, pending = wait(pending, timeout=remaining(), return_when=FIRST_COMPLETED)
+            if not done:
+                raise LLMTimeout('LLM call did not finish before the deadline')
+            for future in done:
+                if future.exception() is None:
+                    if future is not first:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return future.result()
+                error = future.exception()
+        raise error  # type: ignore
 
-    def submit(self, message: str) -> str:
+    def _has_spare_slot(self) -> bool:
+        # Only hedge into spare capacity, so duplicates never queue ahead of first attempts.
+        if not self._semaphore.acquire(blocking=False):
+            return False
+        self._semaphore.release()
+        return True
+
+    def _complete(self, messages: list[dict[str, str]]) -> str:
+        with LLM_SECONDS.time('error') as timer:
+            data = self._post({'messages': messages})
+            try:
+                content = data['choices'][0]['message']['content']
+            except (KeyError, IndexError, TypeError) as e:
+                raise LLMUpstreamError(f'Malformed LLM response: {e}') from e
+            timer.labels = ('ok',)
+        for kind, count in (data.get('usage') or {}).items():
+            if kind in ('prompt_tokens', 'completion_tokens'):
+                LLM_TOKENS.inc(kind.removesuffix('_tokens'), amount=count)
+        return content
+
+    def _post(self, payload: dict[str, Any]) -> dict[str, Any]:
+        response = self._request(payload)
+        try:
+            return response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise LLMUpstreamError(f'Unreadable LLM response: {e}') from e
+        finally:
+            self._semaphore.release()
+
+    def _request(self, payload: dict[str, Any], stream: bool = False) -> requests.Response:
+        """POST with retries inside the deadline; on success the slot is still held and the caller must release it."""
+        attempt = 0
+        while True:
+            outcome = self._attempt(payload, stream, attempt)
+            if isinstance(outcome, requests.Response):
+                return outcome
+            left = remaining()
+            if left is not None and outcome >= left:
+                raise LLMTimeout('No time left before the deadline for another attempt')
+            # Sleep outside the semaphore so waiting retries do not hold a slot.
+            time.sleep(outcome)
+            attempt += 1
+
+    def _attempt(self, payload: dict[str, Any], stream: bool, attempt: int) -> requests.Response | float:
+        """One POST; returns the response, or the delay before the next attempt when this one can be retried."""
+        left = self._acquire_slot()
+        timeout = self.timeout if left is None else (min(self.timeout[0], left), min(self.timeout[1], left))
+        last = attempt >= self.config.max_retries
+        try:
+            response = self.session.post(self.url, json=payload, timeout=timeout, stream=stream)
+        except requests.Timeout as e:
+            self._semaphore.release()
+            if last or remaining() == 0:
+                raise LLMTimeout(f'LLM request timed out: {e}') from e
+            return self._backoff(attempt)
+        except requests.ConnectionError as e:
+            self._semaphore.release()
+            if last:
+                raise LLMUpstreamError(f'LLM endpoint unreachable: {e}') from e
+            return self._backoff(attempt)
+        if response.status_code in RETRY_STATUSES and not last:
+            response.close()
+            self._semaphore.release()
+            retry_after = self._retry_after(response)
+            return retry_after if retry_after is not None else self._backoff(attempt)
         try:
-            response = requests.post(
-                self.url, json={'messages': [{'role': 'user', 'content': message}]}, headers=self.headers, timeout=120
-            )
             response.raise_for_status()
-            data = response.json()
-            return data['choices'][0]['message']['content']
-        except requests.RequestException as e:
-            return f'Error: {str(e)}'
+        except requests.HTTPError as e:
+            response.close()
+            self._semaphore.release()
+            raise LLMUpstreamError(f'LLM endpoint returned {response.status_code}') from e
+        return response
+
+    def _acquire_slot(self) -> float | None:
+        """Take a concurrency slot within the deadline and return the time left after waiting for it."""
+        if not self._semaphore.acquire(timeout=remaining()):
+            raise LLMBusy('No LLM slot became free before the deadline')
+        left = remaining()
+        if left == 0:
+            self._semaphore.release()
+            raise LLMBusy('Deadline passed while waiting for an LLM slot')
+        return left
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.config.backoff_max, self.config.backoff_base * 2**attempt))
+
+    def _retry_after(self, response: requests.Response) -> float | None:
+        value = response.headers.get('Retry-After')
+        if value is None:
+            return None
+        try:
+            return min(max(float(value), 0.0), self.config.backoff_max)
+        except ValueError:
+            return None
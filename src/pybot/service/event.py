@@ -1,21 +1,92 @@
 import logging
+import re
+from typing import Sequence
 
-from pybot.repository import FirebaseRepository
-from pybot.service.chatgpt import ChatGPTService
+from pybot.batcher import MicroBatcher
+from pybot.history import EventHistory
+from pybot.prompt import PromptBuilder
+from pybot.repository import Repository
+from pybot.service.chatgpt import ChatGPTService, LLMError
 from pybot.service.user import UserProfile
 
+PROFILE_HEADER = re.compile(r'^\W*Profile\s+(\d+)\W*$', re.IGNORECASE)
+
 
 class EventService:
-    def __init__(self, chatgpt_service: ChatGPTService, repo: FirebaseRepository):
+    def __init__(
+        self,
+        chatgpt_service: ChatGPTService,
+        repo: Repository,
+        *,
+        history: EventHistory | None = None,
+        prompt_window: int = 20,
+        prompt_budget: int = 1500,
+        batch_size: int = 1,
+        batch_wait: float = 0.1,
+    ):
         self.chatgpt_service = chatgpt_service
         self.repo = repo
+        self.history = history or EventHistory(repo)
+        self.prompt_window = prompt_window
+        self.prompt_budget = prompt_budget
+        # Concurrent /events calls within one window share a single multi-profile LLM call. On this path
+        # generate_events reads the completion cache and the batch functions write it.
+        self.batcher: MicroBatcher[UserProfile, list[dict[str, str]]] | None = None
+        if batch_size > 1:
+            self.batcher = MicroBatcher(self._generate_batch, self._generate_single, batch_size, batch_wait)
 
     def recommend_events(self, user_profile: UserProfile) -> list[dict[str, str]]:
+        events = self.generate_events(user_profile)
+        self.store_events(user_profile.username, events)
+        return events
+
+    def recommend_more_events(self, user_profile: UserProfile) -> list[dict[str, str]]:
+        events = self.generate_more_events(user_profile)
+        self.store_events(user_profile.username, events)
+        return events
+
+    def generate_events(self, user_profile: UserProfile) -> list[dict[str, str]]:
+        """Produce a recommendation set without recording it in the user's history."""
         if not user_profile.interests:
             return []
 
-        interests_str = ', '.join(user_profile.interests)
-        prompt = (
+        cache = self.chatgpt_service.cache
+        if self.batcher is None:
+            return self._generate(user_profile)
+        if cache is not None and (cached := cache.get(self._events_prompt(user_profile))) is not None:
+            return self._parse_events(cached)
+        try:
+            return self.batcher.submit(user_profile)
+        except TimeoutError as e:
+            logging.warning(f'Event generation unavailable: {e}')
+            return []
+
+    def _generate(self, user_profile: UserProfile) -> list[dict[str, str]]:
+        try:
+            return self._parse_events(self.chatgpt_service.submit(self._events_prompt(user_profile), use_cache=True))
+        except LLMError as e:
+            logging.warning(f'Event generation unavailable: {e}')
+            return []
+
+    def _generate_single(self, user_profile: UserProfile) -> list[dict[str, str]]:
+        """Batch fallback for one profile: the cache was checked before batching, so it is only written here."""
+        try:
+            events = self._parse_events(self.chatgpt_service.submit(self._events_prompt(user_profile)))
+        except LLMError as e:
+            logging.warning(f'Event generation unavailable: {e}')
+            return []
+        self._cache_events(user_profile, events)
+        return events
+
+    def _cache_events(self, user_profile: UserProfile, events: list[dict[str, str]]) -> None:
+        # Later calls for the same profile hit the cache as if they had been made alone.
+        if events and self.chatgpt_service.cache is not None:
+            text = '\n'.join(f"{n}. {e['name']} - {e['date']} - {e['link']}" for n, e in enumerate(events, 1))
+            self.chatgpt_service.cache.set(self._events_prompt(user_profile), text)
+
+    def _events_prompt(self, user_profile: UserProfile) -> str:
+        interests_str = ', '.join(sorted(user_profile.interests))
+        return (
             'You are an event planner. Generate a list of 3 fictional online events tailored to a user with the following profile:\n'
             f'Interests: {interests_str}\n'
             f"Description: {user_profile.description or 'No additional context provided.'}\n\n"
@@ -26,42 +97,90 @@ class EventService:
             '3. Event Name - Date - URL'
         )
 
-        events = self._parse_events(self.chatgpt_service.submit(prompt))
-        if events:
-            self._store_events(user_profile.username, events)
-        return events
+    def _generate_batch(self, profiles: Sequence[UserProfile]) -> list[list[dict[str, str]] | None]:
+        """One LLM call for several profiles; profiles missing from the answer get None and are retried alone."""
+        blocks = [
+            f'Profile {i}:\n'
+            f"Interests: {', '.join(sorted(profile.interests))}\n"
+            f"Description: {profile.description or 'No additional context provided.'}"
+            for i, profile in enumerate(profiles, 1)
+        ]
+        prompt = (
+            PromptBuilder(self.prompt_budget, 'events_batch')
+            .add(
+                'You are an event planner. For each of the following user profiles, generate a list of 3 fictional online events tailored to that profile.\n\n'
+            )
+            .add_items(blocks, priority=1, joiner='\n\n', min_items=1, min_tokens=32)
+            .add(
+                "\n\nFor each event, include the event name, date (in 2025), and a fake URL. Ensure the events align with each user's specific preferences. "
+                'Answer every profile in order, starting each with its header line, like this:\n'
+                'Profile 1:\n'
+                '1. Event Name - Date - URL\n'
+                '2. Event Name - Date - URL\n'
+                '3. Event Name - Date - URL\n'
+                'Profile 2:\n'
+                '1. Event Name - Date - URL'
+            )
+            .build()
+        )
+        try:
+            response = self.chatgpt_service.submit(prompt)
+        except LLMError as e:
+            logging.warning(f'Batched event generation unavailable: {e}')
+            return [None] * len(profiles)
 
-    def recommend_more_events(self, user_profile: UserProfile) -> list[dict[str, str]]:
+        sections: dict[int, list[str]] = {}
+        current = None
+        for line in response.strip().split('\n'):
+            if header := PROFILE_HEADER.match(line.strip()):
+                current = sections.setdefault(int(header.group(1)), [])
+            elif current is not None:
+                current.append(line)
+
+        results: list[list[dict[str, str]] | None] = []
+        for i, profile in enumerate(profiles, 1):
+            events = self._parse_events('\n'.join(sections.get(i, [])))
+            results.append(events or None)
+            self._cache_events(profile, events)
+        return results
+
+    def generate_more_events(self, user_profile: UserProfile) -> list[dict[str, str]]:
         if not user_profile.interests:
             return []
 
-        past_events_key = f'events:{user_profile.username}'
-        past_events = self.repo.client.lrange(past_events_key, 0, -1) or []
-        past_events_str = ', '.join([event for event in past_events]) if past_events else 'none'
-
-        logging.error(f'Past events: {past_events_str}')
-        interests_str = ', '.join(user_profile.interests)
+        # Only the most recent window goes into the prompt, so its size stays flat over time.
+        past_events, _ = self.history.page(user_profile.username, limit=self.prompt_window)
+        interests_str = ', '.join(sorted(user_profile.interests))
+        # Past events come newest first, so the oldest are dropped first when over budget.
         prompt = (
-            'You are an event planner. Generate a list of 3 new fictional online events tailored to a user with the following profile:\n'
-            f'Interests: {interests_str}\n'
-            f"Description: {user_profile.description or 'No additional context provided.'}\n\n"
-            "For each event, include the event name, date (in 2025), and a fake URL. Ensure the events align with the user's specific preferences "
-            f'and are different from these previously suggested events: {past_events_str}. '
-            'Format your response as a numbered list like this:\n'
-            '1. Event Name - Date - URL\n'
-            '2. Event Name - Date - URL\n'
-            '3. Event Name - Date - URL'
+            PromptBuilder(self.prompt_budget, 'more_events')
+            .add(
+                'You are an event planner. Generate a list of 3 new fictional online events tailored to a user with the following profile:\n'
+                f'Interests: {interests_str}\n'
+                'Description: '
+            )
+            .add(user_profile.description or 'No additional context provided.', priority=2, min_tokens=32)
+            .add(
+                "\n\nFor each event, include the event name, date (in 2025), and a fake URL. Ensure the events align with the user's specific preferences "
+                'and are different from these previously suggested events: '
+            )
+            .add_items(past_events, priority=1, joiner=', ', min_tokens=16, omitted='{n} older events', empty='none')
+            .add(
+                '. Format your response as a numbered list like this:\n'
+                '1. Event Name - Date - URL\n'
+                '2. Event Name - Date - URL\n'
+                '3. Event Name - Date - URL'
+            )
+            .build()
         )
 
-        events = self._parse_events(self.chatgpt_service.submit(prompt))
-        if events:
-            self._store_events(user_profile.username, events)
-        return events
-
-    def _parse_events(self, response: str) -> list[dict[str, str]]:
-        if 'Error' in response:
+        try:
+            return self._parse_events(self.chatgpt_service.submit(prompt))
+        except LLMError as e:
+            logging.warning(f'Event generation unavailable: {e}')
             return []
 
+    def _parse_events(self, response: str) -> list[dict[str, str]]:
         events = []
         try:
             for line in response.strip().split('\n'):
@@ -76,7 +195,5 @@ class EventService:
 
         return events
 
-    def _store_events(self, username: str, events: list[dict[str, str]]) -> None:
-        key = f'events:{username}'
-        for event in events:
-            self.repo.rpush(key, event['name'])
+    def store_events(self, username: str, events: list[dict[str, str]]) -> None:
+        self.history.append(username, [event['name'] for event in events])
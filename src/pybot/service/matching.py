@@ -0,0 +1,98 @@
+import math
+import re
+import threading
+from collections import defaultdict
+from typing import AbstractSet, Generic, Protocol, TypeVar
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+STOPWORDS = frozenset(
+    'a an and are as at be but by for from i in into is it like love me my of on or so that the this to with'.split()
+)
+INTEREST_WEIGHT = 2.0
+
+
+class Profile(Protocol):
+    @property
+    def username(self) -> str: ...
+
+    @property
+    def interests(self) -> AbstractSet[str]: ...
+
+    @property
+    def description(self) -> str: ...
+
+
+P = TypeVar('P', bound=Profile)
+
+
+def profile_terms(profile: Profile) -> dict[str, float]:
+    """Index terms for a profile with their weights; interests count more than description words."""
+    terms = {f'd:{t}': 1.0 for t in TOKEN_RE.findall(profile.description.lower()) if t not in STOPWORDS}
+    terms.update({f'i:{i.strip().lower()}': INTEREST_WEIGHT for i in profile.interests if i.strip()})
+    return terms
+
+
+class MatchIndex(Generic[P]):
+    """Inverted index from interest and description terms to users, ranked by IDF-weighted Jaccard.
+
+    Only users sharing at least one term with the query are scored, so a lookup costs the size of the
+    touched posting lists rather than the whole user base.
+    """
+
+    def __init__(self):
+        self._profiles: dict[str, P] = {}
+        self._terms: dict[str, dict[str, float]] = {}
+        self._postings: defaultdict[str, set[str]] = defaultdict(set)
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._profiles)
+
+    def __contains__(self, username: str) -> bool:
+        return username in self._profiles
+
+    def get(self, username: str) -> P | None:
+        return self._profiles.get(username)
+
+    def update(self, profile: P) -> None:
+        with self._lock:
+            self.remove(profile.username)
+            terms = profile_terms(profile)
+            self._profiles[profile.username] = profile
+            self._terms[profile.username] = terms
+            for term in terms:
+                self._postings[term].add(profile.username)
+
+    def remove(self, username: str) -> None:
+        with self._lock:
+            self._profiles.pop(username, None)
+            for term in self._terms.pop(username, {}):
+                users = self._postings[term]
+                users.discard(username)
+                if not users:
+                    del self._postings[term]
+
+    def top_k(self, username: str, k: int) -> list[P]:
+        with self._lock:
+            terms = self._terms.get(username)
+            if not terms:
+                return []
+            total = len(self._profiles)
+            query_mass = sum(w * self._idf(t, total) for t, w in terms.items())
+
+            shared: defaultdict[str, float] = defaultdict(float)
+            for term, weight in terms.items():
+                idf = self._idf(term, total)
+                for other in self._postings[term]:
+                    if other != username:
+                        shared[other] += min(weight, self._terms[other][term]) * idf
+
+            scores = []
+            for other, overlap in shared.items():
+                other_mass = sum(w * self._idf(t, total) for t, w in self._terms[other].items())
+                scores.append((overlap / (query_mass + other_mass - overlap), other))
+            scores.sort(key=lambda s: (-s[0], s[1]))
+            return [self._profiles[other] for _, other in scores[:k]]
+
+    def _idf(self, term: str, total: int) -> float:
+        return math.log(1 + total / len(self._postings[term]))
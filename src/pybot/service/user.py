@@ -1,10 +1,15 @@
 import logging
-from typing import Dict, Set, list
+import threading
+import uuid
+from typing import Set
 
 from pydantic import BaseModel
 
-from pybot.repository import FirebaseRepository
-from pybot.service.chatgpt import ChatGPTService
+from pybot.cache import TTLCache
+from pybot.prompt import PromptBuilder
+from pybot.repository import PubSub, Repository
+from pybot.service.chatgpt import ChatGPTService, LLMError
+from pybot.service.matching import MatchIndex
 
 
 class UserProfile(BaseModel):
@@ -14,58 +19,97 @@ class UserProfile(BaseModel):
 
 
 class UserService:
-    def __init__(self, chatgpt_service: ChatGPTService, firebase_repo: FirebaseRepository):
+    INVALIDATION_CHANNEL = 'profile-invalidate'
+
+    def __init__(
+        self,
+        chatgpt_service: ChatGPTService,
+        repo: Repository,
+        *,
+        match_top_k: int = 10,
+        profile_cache: TTLCache[str, UserProfile] | None = None,
+        invalidation: PubSub | None = None,
+        prompt_budget: int = 1500,
+    ):
         self.chatgpt_service = chatgpt_service
-        self.firebase_repo = firebase_repo
-        self.users_ref = self.firebase_repo.ref.child('users')
+        self.repo = repo
+        self.match_top_k = match_top_k
+        self.index: MatchIndex[UserProfile] = MatchIndex()
+        self._index_loaded = False
+        self._index_lock = threading.Lock()
+        self.profiles = profile_cache or TTLCache(max_size=10000, ttl=300)
+        self.invalidation = invalidation
+        self.prompt_budget = prompt_budget
+        self._instance_id = uuid.uuid4().hex
+        if invalidation is not None:
+            invalidation.subscribe(self.INVALIDATION_CHANNEL, self._on_invalidate)
 
     def register_user(self, username: str, interests: list[str], description: str = '') -> None:
-        user_data = UserProfile(
+        profile = UserProfile(
             username=username,
             interests=set(interests),
             description=description.strip(),
-        ).model_dump()
-        self.users_ref.child(username).set(user_data)
+        )
+        # Stored as a sorted list: Firestore cannot encode sets.
+        self.repo.save_user({**profile.model_dump(), 'interests': sorted(profile.interests), 'name': username})
+        self.profiles.set(username, profile)
+        self.index.update(profile)
+        if self.invalidation is not None:
+            self.invalidation.publish(self.INVALIDATION_CHANNEL, f'{self._instance_id}:{username}')
 
     def get_user(self, username: str) -> UserProfile:
-        user_data = self.users_ref.child(username).get()
-        if user_data:
-            return UserProfile(**user_data)
-        return UserProfile(username=username, interests=set())
+        profile = self.profiles.get(username)
+        if profile is None:
+            profile = self._fetch_user(username)
+            self.profiles.set(username, profile)
+        return profile
+
+    def cache_stats(self) -> dict[str, float]:
+        return self.profiles.stats()
 
     def find_matches(self, username: str) -> list[str]:
-        users_data = self.users_ref.get() or {}
-        if username not in users_data:
+        self._load_index()
+        current_user = self.index.get(username)
+        if current_user is None:
             return []
 
-        current_user = UserProfile(**users_data[username])
-        other_users = [UserProfile(**data) for u, data in users_data.items() if u != username]
+        # Only the best local candidates go to the LLM, so the prompt stays flat as users grow.
+        other_users = self.index.top_k(username, self.match_top_k)
         if not other_users:
             return []
 
+        # Lower-ranked candidates and long descriptions are cut first when the prompt exceeds its budget.
+        candidates = [
+            f'User {i}:\n'
+            f"Interests: {', '.join(sorted(user.interests))}\n"
+            f"Description: {user.description or 'No additional context provided.'}"
+            for i, user in enumerate(other_users, 1)
+        ]
         prompt = (
-            'You are a matchmaking assistant. I have a user with the following profile:\n'
-            f"Interests: {', '.join(current_user.interests)}\n"
-            f"Description: {current_user.description or 'No additional context provided.'}\n\n"
-            'Here are other user profiles:\n'
-        )
-        for i, user in enumerate(other_users, 1):
-            prompt += (
-                f'User {i}:\n'
-                f"Interests: {', '.join(user.interests)}\n"
-                f"Description: {user.description or 'No additional context provided.'}\n"
+            PromptBuilder(self.prompt_budget, 'matches')
+            .add(
+                'You are a matchmaking assistant. I have a user with the following profile:\n'
+                f"Interests: {', '.join(sorted(current_user.interests))}\n"
+                'Description: '
+            )
+            .add(current_user.description or 'No additional context provided.', priority=2, min_tokens=32)
+            .add('\n\nHere are other user profiles:\n')
+            .add_items(candidates, priority=1, joiner='\n', min_items=1, min_tokens=24)
+            .add(
+                '\n\nBased on the interests and descriptions, suggest up to 3 users who are the best matches '
+                'for the first user. Provide their user numbers (e.g., User 1, User 2) and a brief reason '
+                'for each match. Format your response as:\n'
+                '- User X: [reason]\n'
+                '- User Y: [reason]\n'
+                '- User Z: [reason]'
             )
-        prompt += (
-            '\nBased on the interests and descriptions, suggest up to 3 users who are the best matches '
-            'for the first user. Provide their user numbers (e.g., User 1, User 2) and a brief reason '
-            'for each match. Format your response as:\n'
-            '- User X: [reason]\n'
-            '- User Y: [reason]\n'
-            '- User Z: [reason]'
+            .build()
         )
 
-        response = self.chatgpt_service.submit(prompt)
-        if 'Error' in response:
+        try:
+            response = self.chatgpt_service.submit(prompt)
+        except LLMError as e:
+            logging.warning(f'Matchmaking unavailable: {e}')
             return []
 
         matches = []
@@ -80,3 +124,34 @@ class UserService:
             return []
 
         return matches
+
+    def _fetch_user(self, username: str) -> UserProfile:
+        user_data = self.repo.get_user(username)
+        if user_data:
+            return UserProfile(**user_data)
+        return UserProfile(username=username, interests=set())
+
+    def _on_invalidate(self, message: str) -> None:
+        """Drop a profile another replica re-registered and refresh its match index entry."""
+        instance_id, _, username = message.partition(':')
+        if instance_id == self._instance_id:
+            return
+        self.profiles.delete(username)
+        if self._index_loaded:
+            profile = self._fetch_user(username)
+            if profile.interests:
+                self.index.update(profile)
+            else:
+                self.index.remove(username)
+
+    def _load_index(self) -> None:
+        """Build the match index from storage once; later registrations update it incrementally."""
+        if self._index_loaded:
+            return
+        with self._index_lock:
+            if self._index_loaded:
+                return
+            for user_data in self.repo.list_users():
+                if 'username' in user_data and user_data['username'] not in self.index:
+                    self.index.update(UserProfile(**user_data))
+            self._index_loaded = True
@@ -1,11 +1,19 @@
 import configparser
+import functools
 import os
+from typing import Literal
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field
+
+StorageBackend = Literal['memory', 'redis', 'firebase']
+# Profile invalidation needs pub/sub, which Firestore does not offer.
+InvalidationBackend = Literal['none', 'memory', 'redis']
 
 
 class TelegramConfig(BaseModel):
     access_token: str
+    stream_replies: bool = False
+    edit_interval: float = 1.0
 
 
 class ChatGPTConfig(BaseModel):
@@ -13,6 +21,21 @@ class ChatGPTConfig(BaseModel):
     modelname: str
     apiversion: str
     access_token: str
+    connect_timeout: float = 5.0
+    read_timeout: float = 60.0
+    max_concurrency: int = 8
+    pool_size: int = 16
+    max_retries: int = 3
+    backoff_base: float = 0.5
+    backoff_max: float = 20.0
+    breaker_window: int = 20
+    breaker_min_calls: int = 10
+    breaker_error_rate: float = 0.5
+    breaker_slow_call: float = 20.0
+    breaker_open_seconds: float = 30.0
+    hedge_after: float = 0.0
+    # Last good answers served while the upstream fails; unlike the completion cache they never expire.
+    fallback_size: int = 1024
 
 
 class RedisConfig(BaseModel):
@@ -24,10 +47,173 @@ class RedisConfig(BaseModel):
     decode_responses: bool = True
 
 
+class RateLimitConfig(BaseModel):
+    backend: StorageBackend = 'memory'
+    limit: int = 10
+    window: int = 60
+
+
+class RequestLogConfig(BaseModel):
+    backend: StorageBackend = 'firebase'
+    max_queue: int = 10000
+    batch_size: int = 500
+    flush_interval: float = 1.0
+    block_timeout: float = 0.0
+    retention: int = 259200
+
+
+class RollupConfig(BaseModel):
+    enabled: bool = True
+    minute_retention: int = 14400
+    hour_retention: int = 1209600
+
+
+class DispatchConfig(BaseModel):
+    concurrent: bool = True
+    workers: int = 8
+    max_queue: int = 1000
+    top_chats: int = 5
+
+
+class CacheConfig(BaseModel):
+    enabled: bool = True
+    backend: StorageBackend = 'memory'
+    max_size: int = 1024
+    ttl: int = 3600
+
+
+class MatchingConfig(BaseModel):
+    top_k: int = 10
+
+
+class ProfileCacheConfig(BaseModel):
+    max_size: int = 10000
+    ttl: int = 300
+    invalidation: InvalidationBackend = 'none'
+
+
+class WebhookConfig(BaseModel):
+    listen: str = '0.0.0.0'
+    port: int = 8080
+    url_path: str = 'telegram'
+    public_url: str | None = None
+    secret_token: str | None = None
+    max_connections: int = 40
+
+
+class CounterConfig(BaseModel):
+    shards: int = 8
+    flush_interval: float = 0.0
+    read_interval: float = 1.0
+
+
+class HistoryConfig(BaseModel):
+    backend: StorageBackend = 'firebase'
+    cap: int = Field(default=50, ge=1)
+    prompt_window: int = 20
+
+
+class EventBatchConfig(BaseModel):
+    enabled: bool = False
+    max_size: int = 8
+    max_wait: float = 0.1
+
+
+class PrecomputeConfig(BaseModel):
+    enabled: bool = False
+    backend: StorageBackend = 'firebase'
+    concurrency: int = 2
+    ttl: int = 900
+    max_stale: int = 86400
+    budget: int = 120
+    budget_window: int = 3600
+    active_window: int = 3600
+    interval: float = 30.0
+
+
+class OutboxConfig(BaseModel):
+    enabled: bool = True
+    global_rate: float = 30.0
+    chat_rate: float = 1.0
+    chat_burst: float = 3.0
+    senders: int = 4
+    max_queue: int = 10000
+    max_retries: int = 3
+
+
+class DeadlineConfig(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    default: float = 30.0
+    # BaseModel already has a ``register`` attribute; the alias keeps the INI key and command name.
+    register_: float = Field(default=20.0, alias='register')
+    events: float = 20.0
+    more_events: float = 20.0
+    message: float = 45.0
+
+
+class ConversationConfig(BaseModel):
+    enabled: bool = True
+    backend: StorageBackend = 'firebase'
+    max_turns: int = 20
+    max_chats: int = 10000
+    max_bytes: int = 33554432
+    window_tokens: int = 1500
+    snapshot_interval: float = 5.0
+    ttl: int = 604800
+
+
+class ShardingConfig(BaseModel):
+    workers: int = 0
+    queue_size: int = 10000
+    restart_backoff: float = 1.0
+    max_restart_backoff: float = 30.0
+
+
+class PromptConfig(BaseModel):
+    max_tokens: int = 1500
+
+
+class StorageConfig(BaseModel):
+    backend: StorageBackend = 'firebase'
+
+
+class StartupConfig(BaseModel):
+    warm_up: bool = True
+    parallel: bool = True
+
+
+class MetricsConfig(BaseModel):
+    enabled: bool = True
+    listen: str = '127.0.0.1'
+    port: int = 9100
+    snapshot_interval: float = 0.0
+
+
 class AppConfig(BaseModel):
     telegram: TelegramConfig
     chatgpt: ChatGPTConfig
     redis: RedisConfig
+    storage: StorageConfig = StorageConfig()
+    ratelimit: RateLimitConfig = RateLimitConfig()
+    requestlog: RequestLogConfig = RequestLogConfig()
+    rollup: RollupConfig = RollupConfig()
+    dispatch: DispatchConfig = DispatchConfig()
+    cache: CacheConfig = CacheConfig()
+    matching: MatchingConfig = MatchingConfig()
+    profilecache: ProfileCacheConfig = ProfileCacheConfig()
+    webhook: WebhookConfig = WebhookConfig()
+    counter: CounterConfig = CounterConfig()
+    history: HistoryConfig = HistoryConfig()
+    startup: StartupConfig = StartupConfig()
+    metrics: MetricsConfig = MetricsConfig()
+    prompt: PromptConfig = PromptConfig()
+    eventbatch: EventBatchConfig = EventBatchConfig()
+    precompute: PrecomputeConfig = PrecomputeConfig()
+    outbox: OutboxConfig = OutboxConfig()
+    deadline: DeadlineConfig = DeadlineConfig()
+    conversation: ConversationConfig = ConversationConfig()
+    sharding: ShardingConfig = ShardingConfig()
 
     @classmethod
     def from_ini(cls, file: str = '.ini') -> 'AppConfig':
@@ -35,11 +221,21 @@ class AppConfig(BaseModel):
         parser.read(file)
         data = {s.lower(): dict(parser.items(s)) for s in parser.sections()}
 
-        for key in ['TELEGRAM_ACCESS_TOKEN', 'CHATGPT_ACCESS_TOKEN', 'REDIS_PASSWORD']:
+        for key in ['TELEGRAM_ACCESS_TOKEN', 'CHATGPT_ACCESS_TOKEN', 'REDIS_PASSWORD', 'WEBHOOK_SECRET_TOKEN']:
             pre, post = key.lower().split('_', 1)
             data.setdefault(pre, {})[post] = os.environ.get(key, data.get(pre, {}).get(post))  # type: ignore
 
         return cls(**data)
 
 
-config = AppConfig.from_ini()
+@functools.cache
+def get_config() -> AppConfig:
+    """Parse the INI on first use; PYBOT_CONFIG points at an alternative file."""
+    return AppConfig.from_ini(os.environ.get('PYBOT_CONFIG', '.ini'))
+
+
+def __getattr__(name: str) -> AppConfig:
+    # Keeps `from pybot.setting import config` working without parsing the INI at import time.
+    if name == 'config':
+        return get_config()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,62 @@
+import threading
+from typing import Callable, Generic, TypeVar
+
+from pybot.deadline import remaining
+
+V = TypeVar('V')
+
+
+class _Call(Generic[V]):
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: V | None = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight(Generic[V]):
+    """Coalesces concurrent calls with the same key into one execution shared by every caller."""
+
+    def __init__(self):
+        self._calls: dict[str, _Call[V]] = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.deduplicated = 0
+
+    def do(self, key: str, fn: Callable[[], V]) -> V:
+        """Run ``fn`` or join the call already running for ``key``.
+
+        A joining caller waits no longer than its own deadline and then raises ``TimeoutError``, since the
+        running call may belong to a caller with a longer deadline or none at all.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.deduplicated += 1
+
+        if not leader:
+            if not call.done.wait(remaining()):
+                raise TimeoutError(f'Shared call for {key} did not finish before the deadline')
+            if call.error is not None:
+                raise call.error
+            return call.result  # type: ignore
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {'in_flight': len(self._calls), 'executed': self.executed, 'deduplicated': self.deduplicated}
@@ -0,0 +1,107 @@
+import logging
+import time
+from typing import Callable
+
+from telegram import Bot, Message
+from telegram.error import BadRequest, RetryAfter
+
+MAX_MESSAGE_LENGTH = 4096
+
+
+def split_point(text: str, limit: int = MAX_MESSAGE_LENGTH) -> int:
+    # Prefer breaking on a line boundary as long as it keeps at least half a message.
+    newline = text.rfind('\n', 0, limit)
+    return newline if newline > limit // 2 else limit
+
+
+def split_message(text: str, limit: int = MAX_MESSAGE_LENGTH) -> list[str]:
+    """Cut ``text`` into parts Telegram accepts, breaking on newlines where possible."""
+    parts = []
+    while len(text) > limit:
+        cut = split_point(text, limit)
+        parts.append(text[:cut])
+        text = text[cut:].lstrip('\n')
+    return [*parts, text] if text or not parts else parts
+
+
+class StreamingReply:
+    """Shows an LLM reply while it is generated by editing a placeholder message.
+
+    Edits are throttled to one per ``min_interval`` seconds per message, back off on ``RetryAfter`` and
+    roll over into a new message whenever the text would pass Telegram's 4096-character cap. ``pace``
+    is called before every send and edit, so they count against the bot-wide rate limit as well.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        chat_id: int,
+        min_interval: float = 1.0,
+        placeholder: str = '…',
+        *,
+        pace: Callable[[], None] | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.min_interval = min_interval
+        self.placeholder = placeholder
+        self.pace = pace
+        self.clock = clock
+        self.logger = logging.getLogger(__name__)
+        self._message: Message | None = None
+        self._text = ''
+        self._shown = ''
+        self._parts: list[str] = []
+        self._next_edit = 0.0
+
+    def start(self) -> 'StreamingReply':
+        self._send()
+        return self
+
+    def feed(self, delta: str) -> None:
+        self._text += delta
+        while len(self._text) > MAX_MESSAGE_LENGTH:
+            cut = split_point(self._text)
+            head, self._text = self._text[:cut], self._text[cut:].lstrip('\n')
+            self._edit(head, force=True)
+            self._parts.append(head)
+            self._send()
+            self._shown = ''
+        if self.clock() >= self._next_edit:
+            self._edit(self._text)
+
+    def finish(self, empty_text: str = 'Sorry, I have nothing to say right now.') -> str:
+        if not self._parts and not self._text.strip():
+            self._text = empty_text
+        self._edit(self._text, force=True)
+        return ''.join(self._parts) + self._text
+
+    def _send(self) -> None:
+        if self.pace is not None:
+            self.pace()
+        self._message = self.bot.send_message(chat_id=self.chat_id, text=self.placeholder)
+
+    def _edit(self, text: str, force: bool = False) -> None:
+        if self._message is None or not text.strip() or text == self._shown:
+            return
+        if force and self.clock() < self._next_edit:
+            time.sleep(self._next_edit - self.clock())
+        if self.pace is not None:
+            self.pace()
+        try:
+            self._message.edit_text(text)
+        except RetryAfter as e:
+            self._next_edit = self.clock() + float(e.retry_after)
+            if force:
+                time.sleep(float(e.retry_after))
+                if self.pace is not None:
+                    self.pace()
+                self._message.edit_text(text)
+                self._shown = text
+            return
+        except BadRequest as e:
+            if 'not modified' not in str(e).lower():
+                raise
+        self._shown = text
+        self._next_edit = self.clock() + self.min_interval
@@ -0,0 +1,291 @@
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+from multiprocessing.process import BaseProcess
+from typing import Any, Callable
+
+from telegram import Bot
+
+from pybot.chatbot import TelegramBot
+from pybot.setting import AppConfig, ShardingConfig, get_config
+from pybot.webhook import WebhookServer
+
+# Update fields that carry a message-like object with its chat.
+CHAT_KEYS = ('message', 'edited_message', 'channel_post', 'edited_channel_post', 'my_chat_member', 'chat_member')
+
+
+def chat_id_of(update: dict[str, Any]) -> int:
+    """The chat an update belongs to, so all updates of a chat land on the same shard."""
+    for key in CHAT_KEYS:
+        if key in update:
+            return update[key]['chat']['id']
+    query = update.get('callback_query')
+    if query is not None:
+        return query['message']['chat']['id'] if 'message' in query else query['from']['id']
+    for value in update.values():
+        if isinstance(value, dict) and 'from' in value:
+            return value['from']['id']  # type: ignore
+    return update.get('update_id', 0)
+
+
+def shard_config(config: AppConfig, index: int, shards: int) -> AppConfig:
+    """Per-shard copy of ``config``; limits that apply to the bot as a whole are split between the shards."""
+    return config.model_copy(
+        update={
+            'chatgpt': config.chatgpt.model_copy(
+                update={'max_concurrency': max(config.chatgpt.max_concurrency // shards, 1)}
+            ),
+            'outbox': config.outbox.model_copy(update={'global_rate': config.outbox.global_rate / shards}),
+            'precompute': config.precompute.model_copy(update={'budget': max(config.precompute.budget // shards, 1)}),
+            'metrics': config.metrics.model_copy(update={'port': config.metrics.port + index}),
+        }
+    )
+
+
+def run_shard(config: AppConfig, index: int, updates: Any) -> None:
+    logging.getLogger(__name__).info(f'Shard {index} running as pid {os.getpid()}')
+    TelegramBot(config).run_shard(updates)
+
+
+class _Shard:
+    __slots__ = ('index', 'updates', 'process', 'started', 'crashes', 'restart_at')
+
+    def __init__(self, index: int, updates: Any):
+        self.index = index
+        self.updates = updates
+        self.process: BaseProcess | None = None
+        self.started = 0.0
+        self.crashes = 0
+        self.restart_at: float | None = None
+
+
+class ShardSupervisor:
+    """Runs the bot as ``workers`` processes and routes every update to the one that owns its chat.
+
+    The supervisor only receives updates, by long polling or webhook, and puts each on the queue of the
+    shard ``chat_id % workers``. A shard handles its chats exactly as a single-process bot would, so
+    their updates stay in order, and in-process state keyed by chat (conversation memory) needs no
+    sharing. State shared across chats (rate limits, counters, caches) is shared through the configured
+    repository backends. A shard that dies is restarted on a new queue after a backoff that grows with
+    consecutive crashes; updates still queued for the dead process are lost.
+    """
+
+    def __init__(
+        self,
+        config: AppConfig,
+        *,
+        workers: int = 0,
+        queue_size: int = 10000,
+        restart_backoff: float = 1.0,
+        max_restart_backoff: float = 30.0,
+        target: Callable[[AppConfig, int, Any], None] = run_shard,
+    ):
+        self.config = config
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.restart_backoff = restart_backoff
+        self.max_restart_backoff = max_restart_backoff
+        self.target = target
+        self.logger = logging.getLogger(__name__)
+        # Shards start from a fresh interpreter: forking a process that runs threads is not safe.
+        self._context = multiprocessing.get_context('spawn')
+        self._shards = [_Shard(i, self._context.Queue(queue_size)) for i in range(self.workers)]
+        self._stop = threading.Event()
+        self._watcher: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self.routed = 0
+        self.dropped = 0
+        self.restarts = 0
+
+    @classmethod
+    def from_config(cls, config: AppConfig, sharding: ShardingConfig | None = None) -> 'ShardSupervisor':
+        sharding = sharding or config.sharding
+        return cls(
+            config,
+            workers=sharding.workers,
+            queue_size=sharding.queue_size,
+            restart_backoff=sharding.restart_backoff,
+            max_restart_backoff=sharding.max_restart_backoff,
+        )
+
+    def start(self) -> 'ShardSupervisor':
+        if self.workers > 1:
+            self._check_backends()
+        for shard in self._shards:
+            self._spawn(shard)
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name='shard-watcher', daemon=True)
+        self._watcher.start()
+        return self
+
+    def close(self, timeout: float = 30.0) -> None:
+        """Let the shards finish what is queued, up to ``timeout`` seconds, then stop them."""
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+        for shard in self._shards:
+            with self._lock:
+                updates = shard.updates
+            updates.put(None)
+        deadline = time.monotonic() + timeout
+        for shard in self._shards:
+            if shard.process is None:
+                continue
+            shard.process.join(max(deadline - time.monotonic(), 0))
+            if shard.process.is_alive():
+                self.logger.warning(f'Shard {shard.index} did not stop in time, terminating it')
+                shard.process.terminate()
+                shard.process.join()
+
+    def route(self, update: dict[str, Any]) -> bool:
+        """Queue ``update`` for the shard owning its chat; False if that shard's queue is full."""
+        shard = self._shards[chat_id_of(update) % self.workers]
+        with self._lock:
+            updates = shard.updates
+        try:
+            updates.put_nowait(update)
+        except queue.Full:
+            self.logger.warning(f'Shard {shard.index} queue full, dropping update {update.get("update_id")}')
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.routed += 1
+        return True
+
+    def alive(self) -> bool:
+        return all(shard.process is not None and shard.process.is_alive() for shard in self._shards)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'alive': sum(shard.process is not None and shard.process.is_alive() for shard in self._shards),
+                'routed': self.routed,
+                'dropped': self.dropped,
+                'restarts': self.restarts,
+            }
+
+    def run(self) -> None:
+        """Long-poll Telegram and route the updates until interrupted."""
+        bot = Bot(self.config.telegram.access_token)
+        self.start()
+        offset = None
+        try:
+            while True:
+                try:
+                    updates = bot.get_updates(offset=offset, timeout=30)
+                except Exception as e:
+                    self.logger.warning(f'Polling for updates failed: {e}')
+                    time.sleep(1)
+                    continue
+                for update in updates:
+                    self.route(update.to_dict())
+                    offset = update.update_id + 1
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def run_webhook(self) -> None:
+        """Receive updates over HTTP and route them until interrupted."""
+        webhook = self.config.webhook
+        self.start()
+        server = WebhookServer.from_config(self.route, webhook, ready=self.alive).start()
+        try:
+            if webhook.public_url:
+                Bot(self.config.telegram.access_token).set_webhook(
+                    url=f"{webhook.public_url.rstrip('/')}/{webhook.url_path.strip('/')}",
+                    max_connections=webhook.max_connections,
+                    api_kwargs={'secret_token': webhook.secret_token} if webhook.secret_token else None,
+                )
+            self._stop.wait()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.stop()
+            self.close()
+
+    def _spawn(self, shard: _Shard) -> None:
+        if shard.process is not None:
+            # A process killed inside updates.get() dies holding the queue's read lock, and no later reader
+            # could ever take it, so a restarted shard always gets a queue of its own.
+            with self._lock:
+                stale, shard.updates = shard.updates, self._context.Queue(self.queue_size)
+            self._discard(shard.index, stale)
+        config = shard_config(self.config, shard.index, self.workers)
+        process = self._context.Process(
+            target=self.target, args=(config, shard.index, shard.updates), name=f'shard-{shard.index}', daemon=True
+        )
+        process.start()
+        shard.process = process
+        shard.started = time.monotonic()
+        shard.restart_at = None
+        self.logger.info(f'Shard {shard.index} started as pid {process.pid}')
+
+    def _watch(self) -> None:
+        while not self._stop.wait(0.5):
+            now = time.monotonic()
+            for shard in self._shards:
+                if shard.process is None or shard.process.is_alive():
+                    continue
+                if shard.restart_at is None:
+                    # A shard that stayed up for a while is not crash-looping, so its backoff starts over.
+                    shard.crashes = shard.crashes + 1 if now - shard.started < self.max_restart_backoff else 1
+                    delay = min(self.restart_backoff * 2 ** (shard.crashes - 1), self.max_restart_backoff)
+                    shard.restart_at = now + delay
+                    self.logger.error(
+                        f'Shard {shard.index} exited with code {shard.process.exitcode}, restarting in {delay:.1f}s'
+                    )
+                elif now >= shard.restart_at:
+                    self._spawn(shard)
+                    with self._lock:
+                        self.restarts += 1
+
+    def _discard(self, index: int, stale: Any) -> None:
+        try:
+            lost = stale.qsize()
+        except NotImplementedError:
+            lost = None
+        if lost:
+            self.logger.warning(f'Shard {index} died with {lost} updates queued, they are lost')
+        # Nothing reads the old queue any more; do not let its feeder thread hold up exit.
+        stale.cancel_join_thread()
+        stale.close()
+
+    def _check_backends(self) -> None:
+        config = self.config
+        shared = {'storage': config.storage.backend, 'ratelimit': config.ratelimit.backend}
+        if config.precompute.enabled:
+            shared['precompute'] = config.precompute.backend
+        for name, backend in shared.items():
+            if backend == 'memory':
+                self.logger.warning(f'{name} uses the memory backend, so each of the {self.workers} shards has its own')
+        if config.storage.backend != 'memory' and config.profilecache.invalidation in ('none', 'memory'):
+            # Each shard builds its match index once; without a shared invalidation channel, users who
+            # register on one shard would never become match candidates on the others.
+            raise ValueError(
+                f'{self.workers} shards share {config.storage.backend} storage, so they need a shared invalidation '
+                'channel: set INVALIDATION = redis in the [PROFILECACHE] section of the .ini'
+            )
+
+
+def main():
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    # Exit through the finally blocks on SIGTERM too, so the shards are stopped with the supervisor.
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    supervisor = ShardSupervisor.from_config(get_config())
+    if sys.argv[1:] == ['webhook']:
+        supervisor.run_webhook()
+    else:
+        supervisor.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+import hmac
+import json
+import logging
+import queue
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable
+
+from pybot.setting import WebhookConfig
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+MAX_BODY_SIZE = 1 << 20
+
+
+class WebhookServer:
+    """Local HTTP endpoint that receives Telegram updates and hands the decoded JSON to ``on_update``.
+
+    Telegram only needs a 200 to consider an update delivered, so the handler acknowledges as soon as the
+    update is queued. When ``on_update`` raises ``queue.Full`` the update is refused with a 503 and Telegram
+    delivers it again later. Any number of replicas can run this behind a load balancer.
+    """
+
+    def __init__(
+        self,
+        on_update: Callable[[dict[str, Any]], None],
+        *,
+        listen: str = '0.0.0.0',
+        port: int = 8080,
+        url_path: str = 'telegram',
+        secret_token: str | None = None,
+        max_connections: int = 40,
+        ready: Callable[[], bool] | None = None,
+    ):
+        self.on_update = on_update
+        self.ready = ready
+        self.url_path = '/' + url_path.strip('/')
+        self.secret_token = secret_token
+        self.logger = logging.getLogger(__name__)
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._server = ThreadingHTTPServer((listen, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self.received = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_config(
+        cls,
+        on_update: Callable[[dict[str, Any]], None],
+        config: WebhookConfig,
+        *,
+        ready: Callable[[], bool] | None = None,
+    ) -> 'WebhookServer':
+        return cls(
+            on_update,
+            listen=config.listen,
+            port=config.port,
+            url_path=config.url_path,
+            secret_token=config.secret_token,
+            max_connections=config.max_connections,
+            ready=ready,
+        )
+
+    @property
+    def address(self) -> tuple[str, int]:
+        host, port = self._server.server_address[:2]
+        return str(host), int(port)
+
+    def start(self) -> 'WebhookServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='webhook', daemon=True)
+        self._thread.start()
+        self.logger.info(f'Webhook listening on {self.address} at {self.url_path}')
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _handle(self, request: BaseHTTPRequestHandler) -> HTTPStatus:
+        if request.path != self.url_path:
+            return HTTPStatus.NOT_FOUND
+        if self.secret_token is not None:
+            received = request.headers.get(SECRET_HEADER, '')
+            if not hmac.compare_digest(received.encode(), self.secret_token.encode()):
+                return HTTPStatus.FORBIDDEN
+        length = int(request.headers.get('Content-Length') or 0)
+        if length <= 0 or length > MAX_BODY_SIZE:
+            return HTTPStatus.REQUEST_ENTITY_TOO_LARGE if length else HTTPStatus.BAD_REQUEST
+        try:
+            data = json.loads(request.rfile.read(length))
+        except ValueError:
+            return HTTPStatus.BAD_REQUEST
+        try:
+            self.on_update(data)
+        except queue.Full:
+            self._count_rejected()
+            return HTTPStatus.SERVICE_UNAVAILABLE
+        with self._lock:
+            self.received += 1
+        return HTTPStatus.OK
+
+    def _count_rejected(self) -> None:
+        with self._lock:
+            self.rejected += 1
+
+    def _handler_class(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:  # noqa: N802
+                # Readiness probe for load balancers: 200 once the bot can take updates.
+                if self.path != '/ready':
+                    status = HTTPStatus.NOT_FOUND
+                elif server.ready is None or server.ready():
+                    status = HTTPStatus.OK
+                else:
+                    status = HTTPStatus.SERVICE_UNAVAILABLE
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def do_POST(self) -> None:  # noqa: N802
+                if not server._slots.acquire(blocking=False):
+                    server._count_rejected()
+                    status = HTTPStatus.SERVICE_UNAVAILABLE
+                else:
+                    try:
+                        status = server._handle(self)
+                    except Exception as e:
+                        server.logger.error(f'Error handling webhook update: {e}')
+                        status = HTTPStatus.INTERNAL_SERVER_ERROR
+                    finally:
+                        server._slots.release()
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, format: str, *args: Any) -> None:
+                server.logger.debug(format % args)
+
+        return Handler
@@ -0,0 +1,59 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pybot.batcher import MicroBatcher
+from pybot.deadline import deadline
+
+
+def test_concurrent_submissions_share_one_batch():
+    batches: list[list[int]] = []
+
+    def batch_fn(items):
+        batches.append(list(items))
+        return [item * 10 for item in items]
+
+    batcher: MicroBatcher[int, int] = MicroBatcher(batch_fn, lambda item: -1, max_size=4, max_wait=1.0)
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(batcher.submit, range(4)))
+    assert results == [0, 10, 20, 30]
+    assert len(batches) == 1
+
+
+def test_items_without_a_batch_result_fall_back_to_single_calls():
+    batcher: MicroBatcher[int, str] = MicroBatcher(
+        lambda items: [None if item % 2 else f'batch {item}' for item in items],
+        lambda item: f'single {item}',
+        max_size=2,
+        max_wait=1.0,
+    )
+    with ThreadPoolExecutor(2) as pool:
+        assert list(pool.map(batcher.submit, [0, 1])) == ['batch 0', 'single 1']
+    assert batcher.stats()['fallbacks'] == 1
+
+
+def test_leader_runs_its_batch_under_a_deadline():
+    batcher: MicroBatcher[int, int] = MicroBatcher(lambda items: list(items), lambda item: item, max_wait=0.01)
+    with deadline(5.0):
+        assert batcher.submit(7) == 7
+
+
+def test_follower_gives_up_at_its_deadline():
+    release = threading.Event()
+
+    def slow_batch(items):
+        release.wait(5)
+        return list(items)
+
+    batcher: MicroBatcher[int, int] = MicroBatcher(slow_batch, lambda item: item, max_size=2, max_wait=1.0)
+    leader = threading.Thread(target=batcher.submit, args=(1,))
+    leader.start()
+    time.sleep(0.05)
+    started = time.monotonic()
+    with deadline(0.1), pytest.raises(TimeoutError):
+        batcher.submit(2)
+    assert time.monotonic() - started < 1.0
+    release.set()
+    leader.join()
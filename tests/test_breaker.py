@@ -0,0 +1,228 @@
+import io
+import threading
+import time
+
+import pytest
+import requests
+
+from pybot.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from pybot.cache import CompletionCache, TTLCache
+from pybot.deadline import deadline
+from pybot.service.chatgpt import ChatGPTService, LLMBusy, LLMUnavailable, LLMUpstreamError
+from pybot.setting import ChatGPTConfig
+
+
+def open_breaker(clock) -> CircuitBreaker:
+    breaker = CircuitBreaker(window=4, min_calls=4, error_rate=0.5, slow_call=1.0, open_seconds=30, clock=clock)
+    for success in (True, True, False, False):
+        assert breaker.allow()
+        breaker.record(success)
+    return breaker
+
+
+def test_opens_once_enough_recent_calls_are_bad(clock):
+    breaker = CircuitBreaker(window=4, min_calls=4, error_rate=0.5, slow_call=1.0, clock=clock)
+    breaker.record(False)
+    breaker.record(False)
+    breaker.record(True)
+    assert breaker.state == CLOSED  # too few calls to judge
+    breaker.record(True, latency=1.5)  # slow calls count as bad
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.stats()['rejected'] == 1
+
+
+def test_bad_calls_slide_out_of_the_window(clock):
+    breaker = CircuitBreaker(window=4, min_calls=4, error_rate=0.5, clock=clock)
+    breaker.record(False)
+    for _ in range(7):
+        breaker.record(True)
+    breaker.record(False)
+    assert breaker.state == CLOSED
+    assert breaker.stats()['bad_ratio'] == 0.25
+
+
+def test_single_probe_after_the_open_period_decides_the_state(clock):
+    breaker = open_breaker(clock)
+    clock.advance(29.9)
+    assert breaker.state == OPEN
+    clock.advance(0.1)
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # only one probe at a time
+    breaker.record(False)
+    assert breaker.state == OPEN
+    assert breaker.stats()['opened'] == 2
+
+    clock.advance(30)
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CLOSED
+    assert breaker.stats()['bad_ratio'] == 0.0
+
+
+def test_late_outcomes_do_not_close_an_open_circuit(clock):
+    breaker = open_breaker(clock)
+    breaker.record(True)
+    assert breaker.state == OPEN
+    clock.advance(30)
+    breaker.record(True)  # started before the circuit opened, not the probe
+    assert breaker.state == HALF_OPEN
+
+
+def test_cancelled_probe_lets_the_next_call_probe(clock):
+    breaker = open_breaker(clock)
+    clock.advance(30)
+    assert breaker.allow()
+    breaker.cancel()
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+
+
+def service(hedge_after: float = 0.0, **config) -> ChatGPTService:
+    return ChatGPTService(
+        ChatGPTConfig(
+            basicurl='http://llm.invalid',
+            modelname='test',
+            apiversion='1',
+            access_token='',
+            hedge_after=hedge_after,
+            **config,
+        )
+    )
+
+
+def test_open_breaker_fails_fast_without_calling_upstream(monkeypatch):
+    chatgpt = service(breaker_window=2, breaker_min_calls=2)
+    calls = []
+
+    def failing(messages):
+        calls.append(messages)
+        raise RuntimeError('upstream down')
+
+    monkeypatch.setattr(chatgpt, '_complete', failing)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            chatgpt.submit('hi')
+    with pytest.raises(LLMUnavailable):
+        chatgpt.submit('hi')
+    assert len(calls) == 2
+
+
+def test_slow_first_attempt_is_hedged_and_the_faster_one_wins(monkeypatch):
+    chatgpt = service(hedge_after=0.05)
+    release = threading.Event()
+    attempts = []
+
+    def complete(messages):
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            release.wait(5)
+            return 'first'
+        return 'hedge'
+
+    monkeypatch.setattr(chatgpt, '_complete', complete)
+    assert chatgpt.submit('hi') == 'hedge'
+    release.set()
+    stats = chatgpt.stats()
+    assert (stats['hedges'], stats['hedge_wins']) == (1, 1)
+    chatgpt.close()
+
+
+def test_fast_first_attempt_is_not_hedged(monkeypatch):
+    chatgpt = service(hedge_after=1.0)
+    monkeypatch.setattr(chatgpt, '_complete', lambda messages: 'first')
+    assert chatgpt.submit('hi') == 'first'
+    assert chatgpt.stats()['hedges'] == 0
+    chatgpt.close()
+
+
+def test_local_slot_timeouts_do_not_count_against_the_upstream():
+    chatgpt = service(max_concurrency=1, breaker_window=1, breaker_min_calls=1)
+    chatgpt._semaphore.acquire()  # every slot is taken by other calls
+    with deadline(0.05), pytest.raises(LLMBusy):
+        chatgpt.submit('hi')
+    assert chatgpt.breaker.state == CLOSED
+    assert chatgpt.breaker.stats()['bad_ratio'] == 0.0
+
+
+class SSEResponse:
+    def __init__(self, deltas: list[str]):
+        self.lines = [f'data: {{"choices": [{{"delta": {{"content": "{d}"}}}}]}}' for d in deltas] + ['data: [DONE]']
+        self.closed = False
+
+    def iter_lines(self, decode_unicode=False):
+        yield from self.lines
+
+    def close(self):
+        self.closed = True
+
+
+def test_stream_abandoned_by_its_reader_is_not_a_failure(monkeypatch):
+    chatgpt = service(max_concurrency=1, breaker_window=1, breaker_min_calls=1)
+    response = SSEResponse(['Hel', 'lo'])
+
+    def request(payload, stream=False):
+        chatgpt._semaphore.acquire()
+        return response
+
+    monkeypatch.setattr(chatgpt, '_request', request)
+    assert ''.join(chatgpt.stream('hi')) == 'Hello'
+    deltas = chatgpt.stream('hi')
+    assert next(deltas) == 'Hel'
+    deltas.close()
+    assert response.closed
+    assert chatgpt.breaker.state == CLOSED
+    assert chatgpt._semaphore.acquire(blocking=False)  # the slot was given back
+
+
+def test_last_good_answer_outlives_the_completion_cache(clock, monkeypatch):
+    chatgpt = service()
+    chatgpt.cache = CompletionCache(TTLCache(max_size=10, ttl=60, clock=clock))
+    answers = iter(['first answer'])
+
+    def complete(messages):
+        try:
+            return next(answers)
+        except StopIteration:
+            raise LLMUpstreamError('upstream down') from None
+
+    monkeypatch.setattr(chatgpt, '_complete', complete)
+    assert chatgpt.submit('hi', use_cache=True) == 'first answer'
+    clock.advance(3600)  # long past the cache TTL
+    assert chatgpt.submit('hi', use_cache=True) == 'first answer'
+    assert chatgpt.stats()['fallbacks'] == 1
+    with pytest.raises(LLMUpstreamError):
+        chatgpt.submit('never answered')
+
+
+def response(status: int, body: bytes = b'', **headers) -> requests.Response:
+    result = requests.Response()
+    result.status_code = status
+    result._content = body
+    result.raw = io.BytesIO(body)
+    result.headers.update(headers)
+    return result
+
+
+def test_retryable_statuses_are_retried_until_an_answer_arrives(monkeypatch):
+    chatgpt = service(max_concurrency=1, max_retries=2)
+    replies = iter([response(503, **{'Retry-After': '0'}), response(429, **{'Retry-After': '0'})])
+    answer = response(200, b'{"choices": [{"message": {"content": "hello"}}]}')
+    monkeypatch.setattr(chatgpt.session, 'post', lambda *args, **kwargs: next(replies, answer))
+    assert chatgpt.submit('hi') == 'hello'
+    assert chatgpt._semaphore.acquire(blocking=False)  # every attempt gave its slot back
+
+
+def test_retries_stop_at_max_retries(monkeypatch):
+    chatgpt = service(max_retries=1)
+    calls = []
+
+    def post(*args, **kwargs):
+        calls.append(args)
+        return response(503, **{'Retry-After': '0'})
+
+    monkeypatch.setattr(chatgpt.session, 'post', post)
+    with pytest.raises(LLMUpstreamError):
+        chatgpt.submit('hi')
+    assert len(calls) == 2
@@ -0,0 +1,52 @@
+from pybot.cache import CompletionCache, TTLCache, prompt_key
+from pybot.repository.memory import MemoryRepository
+
+
+def test_least_recently_used_entry_is_evicted_first(clock):
+    cache: TTLCache[str, int] = TTLCache(max_size=2, ttl=60, clock=clock)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert cache.stats()['evictions'] == 1
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache: TTLCache[str, int] = TTLCache(max_size=10, ttl=60, clock=clock)
+    cache.set('a', 1)
+    clock.advance(59.9)
+    assert cache.get('a') == 1
+    clock.advance(0.1)
+    assert cache.get('a') is None
+    assert len(cache) == 0
+    assert cache.stats()['expirations'] == 1
+
+
+def test_prompt_key_ignores_whitespace_only_differences():
+    assert prompt_key('plan  my\nweekend ') == prompt_key('plan my weekend')
+    assert prompt_key('plan my weekend') != prompt_key('plan my week')
+
+
+def test_shared_tier_fills_the_local_one(clock):
+    shared = MemoryRepository()
+    CompletionCache(TTLCache(clock=clock), shared).set('prompt', 'answer')
+    other = CompletionCache(TTLCache(clock=clock), shared)
+    assert other.get('prompt') == 'answer'
+    assert other.local.get(prompt_key('prompt')) == 'answer'
+    assert other.stats()['shared_hits'] == 1
+
+
+def test_shared_tier_failures_degrade_to_a_miss(clock):
+    class Down(MemoryRepository):
+        def get(self, key):
+            raise ConnectionError('down')
+
+        def set(self, key, value, ttl=None):
+            raise ConnectionError('down')
+
+    cache = CompletionCache(TTLCache(clock=clock), Down())
+    cache.set('prompt', 'answer')
+    assert cache.get('prompt') == 'answer'
+    assert cache.get('other') is None
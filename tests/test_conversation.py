@@ -0,0 +1,88 @@
+import json
+
+from pybot.conversation import ConversationStore
+from pybot.prompt import count_tokens
+from pybot.repository.memory import MemoryRepository
+
+
+def exchange(n: int) -> tuple[tuple[str, str], tuple[str, str]]:
+    return ('user', f'question number {n}'), ('assistant', f'answer number {n} with a few more words, café 🎉')
+
+
+def test_window_keeps_the_newest_turns_that_fit_the_budget():
+    store = ConversationStore()
+    for n in range(5):
+        store.append(1, *exchange(n))
+    question, answer = exchange(4)
+    budget = count_tokens(question[1]) + count_tokens(answer[1])
+    assert store.window(1, budget) == [{'role': r, 'content': c} for r, c in exchange(4)]
+    assert len(store.window(1, 10000)) == 10
+
+
+def test_window_never_starts_with_an_orphaned_reply():
+    store = ConversationStore()
+    store.append(1, *exchange(0), *exchange(1))
+    (_, question), (_, answer) = exchange(1)
+    assert store.window(1, count_tokens(answer)) == []
+    # Room for the previous answer too, but not for its question.
+    window = store.window(1, count_tokens(answer) + count_tokens(question) + count_tokens(exchange(0)[1][1]))
+    assert window == [{'role': r, 'content': c} for r, c in exchange(1)]
+
+
+def test_only_the_last_max_turns_are_kept():
+    store = ConversationStore(max_turns=4)
+    for n in range(5):
+        store.append(1, *exchange(n))
+    contents = [m['content'] for m in store.window(1, 10000)]
+    assert contents == [c for _, c in (*exchange(3), *exchange(4))]
+    assert store.stats()['bytes'] == sum(len(c.encode()) for c in contents)
+
+
+def test_least_recently_used_chat_is_evicted_and_snapshotted():
+    repo = MemoryRepository()
+    store = ConversationStore(repo, max_chats=2)
+    store.append(1, *exchange(1))
+    store.append(2, *exchange(2))
+    store.window(1, 100)  # chat 1 is now the most recent
+    store.append(3, *exchange(3))
+    assert store.stats()['evictions'] == 1
+    assert repo.get(store.key(2)) is None  # written behind, not on eviction
+    store.flush()
+    assert json.loads(repo.get(store.key(2))) == [list(turn) for turn in exchange(2)]
+    assert store.stats()['snapshots'] == 3
+
+
+def test_snapshot_is_restored_by_a_new_store():
+    repo = MemoryRepository()
+    first = ConversationStore(repo)
+    first.append(7, *exchange(1))
+    first.flush()
+    second = ConversationStore(repo, max_turns=1)
+    assert second.window(7, 10000) == []  # only the reply survives the smaller ring, and it is left out
+    assert second.stats()['restored'] == 1
+    assert ConversationStore(repo).window(7, 10000) == [{'role': r, 'content': c} for r, c in exchange(1)]
+
+
+def test_failed_snapshot_is_counted_and_the_next_one_writes_every_turn():
+    class FlakyStore:
+        def __init__(self):
+            self.data: dict[str, str] = {}
+            self.down = True
+
+        def get(self, key):
+            return self.data.get(key)
+
+        def set(self, key, value, ttl=None):
+            if self.down:
+                raise ConnectionError('store down')
+            self.data[key] = value
+
+    flaky = FlakyStore()
+    store = ConversationStore(flaky)
+    store.append(1, *exchange(1))
+    store.flush()
+    assert store.stats()['failed'] == 1
+    store.append(1, *exchange(2))
+    flaky.down = False
+    store.flush()
+    assert len(json.loads(flaky.data[store.key(1)])) == 4
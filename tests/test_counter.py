@@ -0,0 +1,67 @@
+import threading
+from collections import defaultdict
+
+from pybot.counter import ShardedCounter
+
+
+class ShardStore:
+    """Keeps every shard separately, as the document stores do."""
+
+    def __init__(self):
+        self.shards: defaultdict[tuple[str, int], int] = defaultdict(int)
+        self.reads = 0
+        self._lock = threading.Lock()
+
+    def incr_shard(self, key: str, amount: int, shard: int) -> None:
+        with self._lock:
+            self.shards[(key, shard)] += amount
+
+    def get_count(self, key: str) -> int:
+        with self._lock:
+            self.reads += 1
+            return sum(value for (k, _), value in self.shards.items() if k == key)
+
+
+def hammer(counter: ShardedCounter, threads: int = 8, per_thread: int = 500) -> list[list[int]]:
+    seen: list[list[int]] = [[] for _ in range(threads)]
+
+    def worker(i: int) -> None:
+        for _ in range(per_thread):
+            seen[i].append(counter.incr('hot'))
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return seen
+
+
+def test_concurrent_increments_across_shards_add_up_exactly():
+    store = ShardStore()
+    counter = ShardedCounter(store, shards=8)
+    seen = hammer(counter)
+    assert store.get_count('hot') == counter.get('hot') == 4000
+    assert len({shard for _, shard in store.shards}) == 8
+    assert all(values == sorted(set(values)) for values in seen)
+
+
+def test_accumulated_increments_add_up_after_close():
+    store = ShardStore()
+    counter = ShardedCounter(store, shards=8, flush_interval=0.01).start()
+    seen = hammer(counter)
+    counter.close()
+    assert store.get_count('hot') == 4000
+    assert max(max(values) for values in seen) == 4000
+
+
+def test_shards_are_summed_at_most_once_per_read_interval(clock):
+    store = ShardStore()
+    counter = ShardedCounter(store, shards=4, read_interval=1.0, clock=clock)
+    assert [counter.incr('hot') for _ in range(5)] == [1, 2, 3, 4, 5]
+    assert store.reads == 1
+    store.incr_shard('hot', 10, 0)  # another replica
+    assert counter.incr('hot') == 6
+    clock.advance(1.0)
+    assert counter.incr('hot') == 17
+    assert store.reads == 2
@@ -0,0 +1,33 @@
+from pybot.cache import CompletionCache, TTLCache
+from pybot.repository.memory import MemoryRepository
+from pybot.service.chatgpt import ChatGPTService
+from pybot.service.event import EventService
+from pybot.service.user import UserProfile
+from pybot.setting import ChatGPTConfig
+
+EVENTS = '1. VR Night - 2025-05-01 - https://example.com/vr\n2. LAN Party - 2025-05-02 - https://example.com/lan'
+
+
+def test_batch_fallback_reads_the_cache_once_and_fills_it(monkeypatch):
+    cache = CompletionCache(TTLCache(max_size=10, ttl=60), shared=MemoryRepository())
+    chatgpt = ChatGPTService(
+        ChatGPTConfig(basicurl='http://llm.invalid', modelname='m', apiversion='1', access_token=''), cache
+    )
+    prompts = []
+
+    def complete(messages):
+        prompts.append(messages[-1]['content'])
+        return EVENTS
+
+    monkeypatch.setattr(chatgpt, '_complete', complete)
+    service = EventService(chatgpt, MemoryRepository(), batch_size=2, batch_wait=0.01)
+    profile = UserProfile(username='ann', interests={'vr', 'gaming'})
+
+    # A lone request makes the batcher's single call.
+    events = service.generate_events(profile)
+    assert [event['name'] for event in events] == ['VR Night', 'LAN Party']
+    assert len(prompts) == 1
+    assert cache.stats()['shared_misses'] == 1  # only the check before batching
+
+    assert service.generate_events(profile) == events
+    assert len(prompts) == 1
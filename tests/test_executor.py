@@ -0,0 +1,62 @@
+import random
+import threading
+import time
+
+from pybot.executor import ChatExecutor
+
+
+def test_each_chat_runs_in_order_one_update_at_a_time():
+    executor = ChatExecutor(workers=8, max_queue=10000).start()
+    seen: dict[int, list[int]] = {chat: [] for chat in range(10)}
+    running: set[int] = set()
+    overlaps = []
+    lock = threading.Lock()
+
+    def handle(chat: int, n: int) -> None:
+        with lock:
+            overlaps.append(chat in running)
+            running.add(chat)
+        time.sleep(random.random() / 1000)
+        with lock:
+            running.discard(chat)
+            seen[chat].append(n)
+
+    for n in range(200):
+        for chat in seen:
+            assert executor.submit(chat, handle, chat, n)
+    executor.shutdown()
+    assert all(numbers == list(range(200)) for numbers in seen.values())
+    assert not any(overlaps)
+
+
+def test_backlog_reports_the_most_queued_chats_and_their_oldest_wait():
+    executor = ChatExecutor(workers=1, max_queue=100, top_chats=2).start()
+    release = threading.Event()
+    executor.submit('blocker', release.wait)
+    time.sleep(0.05)
+    for chat, count in (('a', 1), ('b', 3), ('c', 2)):
+        for _ in range(count):
+            executor.submit(chat, lambda: None)
+    time.sleep(0.05)
+
+    backlog = executor.backlog()
+    assert [(chat, depth) for chat, depth, _ in backlog] == [('b', 3), ('c', 2)]
+    assert all(wait >= 0.05 for _, _, wait in backlog)
+    stats = executor.stats()
+    assert stats['chat_depth_max'] == 3
+    assert stats['oldest_wait'] >= 0.05
+    release.set()
+    executor.shutdown()
+    assert executor.backlog() == []
+
+
+def test_full_queue_rejects_instead_of_blocking():
+    executor = ChatExecutor(workers=1, max_queue=1).start()
+    release = threading.Event()
+    executor.submit(1, release.wait)
+    time.sleep(0.05)
+    assert executor.submit(1, lambda: None)
+    assert not executor.submit(2, lambda: None)
+    assert executor.stats()['rejected'] == 1
+    release.set()
+    executor.shutdown()
@@ -0,0 +1,54 @@
+import pytest
+from pydantic import ValidationError
+
+from pybot.history import EventHistory
+from pybot.repository.memory import MemoryRepository
+from pybot.setting import HistoryConfig
+
+
+def read_all(history: EventHistory, username: str, limit: int) -> list[list[str]]:
+    pages = []
+    cursor = None
+    while True:
+        items, cursor = history.page(username, cursor, limit)
+        pages.append(items)
+        if cursor is None:
+            return pages
+
+
+def test_history_keeps_only_the_newest_cap_events():
+    repo = MemoryRepository()
+    history = EventHistory(repo, cap=5)
+    history.append('ann', [f'event {n}' for n in range(4)])
+    history.append('ann', [f'event {n}' for n in range(4, 8)])
+    history.append('ann', [])
+    assert repo.lrange(history.key('ann'), 0, -1) == [f'event {n}' for n in range(3, 8)]
+
+
+def test_pages_run_newest_first_without_gaps_or_repeats():
+    history = EventHistory(MemoryRepository(), cap=50)
+    history.append('ann', [f'event {n}' for n in range(7)])
+    assert read_all(history, 'ann', 3) == [
+        ['event 6', 'event 5', 'event 4'],
+        ['event 3', 'event 2', 'event 1'],
+        ['event 0'],
+    ]
+
+
+def test_pagination_stops_at_the_cap():
+    history = EventHistory(MemoryRepository(), cap=4)
+    history.append('ann', [f'event {n}' for n in range(10)])
+    pages = read_all(history, 'ann', 3)
+    assert pages == [['event 9', 'event 8', 'event 7'], ['event 6']]
+    assert history.page('ann', '4') == ([], None)
+
+
+def test_unknown_user_has_an_empty_history():
+    assert EventHistory(MemoryRepository()).page('nobody') == ([], None)
+
+
+def test_a_cap_below_one_is_rejected():
+    with pytest.raises(ValueError):
+        EventHistory(MemoryRepository(), cap=0)
+    with pytest.raises(ValidationError):
+        HistoryConfig(cap=0)
@@ -0,0 +1,37 @@
+from pybot.limiter import SlidingWindowLimiter
+
+
+def test_allows_up_to_the_limit_within_a_window(clock):
+    limiter = SlidingWindowLimiter(3, 60, clock=clock)
+    assert [limiter.allow('alice') for _ in range(4)] == [True, True, True, False]
+    assert limiter.allow('bob')
+
+
+def test_previous_window_counts_by_its_remaining_overlap(clock):
+    limiter = SlidingWindowLimiter(4, 60, clock=clock)
+    for _ in range(4):
+        assert limiter.allow('alice')
+    # A quarter into the next window, three quarters of the previous four calls still count.
+    clock.now = 75.0
+    assert limiter.allow('alice')
+    assert not limiter.allow('alice')
+    clock.now = 120.0
+    assert limiter.allow('alice')
+
+
+def test_rejected_calls_do_not_count(clock):
+    limiter = SlidingWindowLimiter(1, 60, clock=clock)
+    assert limiter.allow('alice')
+    for _ in range(10):
+        assert not limiter.allow('alice')
+    clock.now = 180.0
+    assert limiter.allow('alice')
+
+
+def test_idle_keys_are_swept(clock):
+    limiter = SlidingWindowLimiter(1, 60, clock=clock)
+    for user in range(100):
+        limiter.allow(f'user{user}')
+    clock.now = 180.0
+    limiter.allow('alice')
+    assert list(limiter._windows) == ['alice']
@@ -0,0 +1,81 @@
+import json
+import threading
+import time
+
+from pybot.logsink import RequestLogSink
+from pybot.repository.memory import MemoryRepository
+
+
+class SlowWriter(MemoryRepository):
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+        self.batch_sizes: list[int] = []
+
+    def rpush_many(self, key: str, values: list[str]) -> None:
+        self.release.wait(5)
+        self.batch_sizes.append(len(values))
+        super().rpush_many(key, values)
+
+
+def test_close_writes_every_accepted_entry_in_order():
+    repo = MemoryRepository()
+    sink = RequestLogSink(repo, max_queue=10000, batch_size=50, flush_interval=0.01).start()
+    for i in range(1000):
+        assert sink.submit(json.dumps({'n': i}))
+    sink.close()
+    assert [json.loads(entry)['n'] for entry in repo.lrange('logs', 0, -1)] == list(range(1000))
+    assert sink.stats()['written'] == 1000
+
+
+def test_batches_never_exceed_the_batch_size():
+    writer = SlowWriter()
+    sink = RequestLogSink(writer, batch_size=10, flush_interval=0.05).start()
+    for i in range(95):
+        sink.submit(str(i))
+    writer.release.set()
+    sink.close()
+    assert sum(writer.batch_sizes) == 95
+    assert max(writer.batch_sizes) <= 10
+
+
+def test_full_queue_drops_instead_of_blocking_the_caller():
+    writer = SlowWriter()
+    sink = RequestLogSink(writer, max_queue=5, batch_size=1, flush_interval=0.0).start()
+    accepted = [sink.submit(str(i)) for i in range(20)]
+    assert not all(accepted)
+    assert sink.stats()['dropped'] == accepted.count(False)
+    writer.release.set()
+    sink.close()
+    assert sink.stats()['written'] == accepted.count(True)
+
+
+def test_failed_writes_are_counted_and_the_sink_keeps_going():
+    class FlakyWriter(MemoryRepository):
+        calls = 0
+
+        def rpush_many(self, key: str, values: list[str]) -> None:
+            self.calls += 1
+            if self.calls == 1:
+                raise ConnectionError('down')
+            super().rpush_many(key, values)
+
+    writer = FlakyWriter()
+    sink = RequestLogSink(writer, batch_size=1, flush_interval=0.0).start()
+    sink.submit('lost')
+    sink.submit('kept')
+    sink.close()
+    assert writer.lrange('logs', 0, -1) == ['kept']
+    assert sink.stats()['failed'] == 1
+
+
+def test_close_gives_up_on_a_stuck_writer():
+    writer = SlowWriter()
+    sink = RequestLogSink(writer, max_queue=5, batch_size=1, flush_interval=0.0).start()
+    while sink.submit('entry'):
+        pass
+    started = time.monotonic()
+    sink.close(timeout=0.2)
+    assert time.monotonic() - started < 1.0
+    assert sink.stats()['dropped'] >= 6  # the rejected submit plus the queued entries
+    writer.release.set()
@@ -0,0 +1,66 @@
+from pybot.service.matching import MatchIndex
+from pybot.service.user import UserProfile
+
+
+def profile(username: str, *interests: str, description: str = '') -> UserProfile:
+    return UserProfile(username=username, interests=set(interests), description=description)
+
+
+def index_of(*profiles: UserProfile) -> MatchIndex[UserProfile]:
+    index: MatchIndex[UserProfile] = MatchIndex()
+    for p in profiles:
+        index.update(p)
+    return index
+
+
+def names(profiles: list[UserProfile]) -> list[str]:
+    return [p.username for p in profiles]
+
+
+def test_rare_shared_interests_outrank_common_ones():
+    index = index_of(
+        profile('ann', 'music', 'falconry'),
+        profile('bob', 'music'),
+        profile('cat', 'falconry'),
+        *(profile(f'fan{n}', 'music') for n in range(5)),
+    )
+    ranked = names(index.top_k('ann', 3))
+    assert ranked[0] == 'cat'
+    assert 'bob' in ranked
+
+
+def test_more_overlap_ranks_higher_and_strangers_are_not_scored():
+    index = index_of(
+        profile('ann', 'vr', 'gaming', 'chess'),
+        profile('bob', 'vr', 'gaming'),
+        profile('cat', 'vr'),
+        profile('dan', 'knitting', description='I like quiet evenings'),
+    )
+    assert names(index.top_k('ann', 10)) == ['bob', 'cat']
+
+
+def test_description_words_count_less_than_interests():
+    index = index_of(
+        profile('ann', 'vr', description='arcade'),
+        profile('bob', 'vr', description='sailing'),
+        profile('cat', 'chess', description='arcade'),
+    )
+    assert names(index.top_k('ann', 10)) == ['bob', 'cat']
+
+
+def test_top_k_cuts_off_with_a_stable_order():
+    index = index_of(profile('ann', 'vr'), *(profile(f'user{n}', 'vr') for n in range(10)))
+    assert names(index.top_k('ann', 3)) == ['user0', 'user1', 'user2']
+    assert index.top_k('ann', 0) == []
+    assert index.top_k('nobody', 3) == []
+
+
+def test_reregistration_replaces_the_old_terms():
+    index = index_of(profile('ann', 'vr'), profile('bob', 'vr'), profile('cat', 'chess'))
+    index.update(profile('bob', 'chess'))
+    assert names(index.top_k('ann', 10)) == []
+    assert names(index.top_k('cat', 10)) == ['bob']
+    assert len(index) == 3
+    index.remove('bob')
+    assert names(index.top_k('cat', 10)) == []
+    assert 'bob' not in index
@@ -0,0 +1,66 @@
+import pytest
+
+from pybot.metrics import STORAGE_SECONDS, InstrumentedRepository, MetricsRegistry
+from pybot.repository.memory import MemoryRepository
+
+
+def test_counter_renders_help_type_and_one_line_per_label_set():
+    registry = MetricsRegistry()
+    counter = registry.counter('pybot_test_total', 'Things counted', ('kind',))
+    counter.inc('b')
+    counter.inc('a', amount=2)
+    counter.inc('b')
+    assert registry.render().splitlines() == [
+        '# HELP pybot_test_total Things counted',
+        '# TYPE pybot_test_total counter',
+        'pybot_test_total{kind="a"} 2',
+        'pybot_test_total{kind="b"} 2',
+    ]
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.counter('pybot_test_total', 'Things counted', ('user',)).inc('a"b\\c\nd')
+    assert registry.render().splitlines()[-1] == 'pybot_test_total{user="a\\"b\\\\c\\nd"} 1'
+
+
+def test_histogram_buckets_are_cumulative_and_end_with_inf():
+    registry = MetricsRegistry()
+    histogram = registry.histogram('pybot_test_seconds', 'Latency', ('op',), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, 'get')
+    assert registry.render().splitlines() == [
+        '# HELP pybot_test_seconds Latency',
+        '# TYPE pybot_test_seconds histogram',
+        'pybot_test_seconds_bucket{op="get",le="0.1"} 2.0',
+        'pybot_test_seconds_bucket{op="get",le="1.0"} 3.0',
+        'pybot_test_seconds_bucket{op="get",le="+Inf"} 4.0',
+        'pybot_test_seconds_sum{op="get"} 3.65',
+        'pybot_test_seconds_count{op="get"} 4.0',
+    ]
+
+
+def test_gauges_read_their_callback_at_render_time():
+    registry = MetricsRegistry()
+    depth = {'value': 1}
+    registry.gauge('pybot_test_depth', 'Queue depth', lambda: depth['value'])
+    registry.gauge('pybot_test_chat_depth', 'Per-chat depth', lambda: {(42,): 3}, labels=('chat',))
+    depth['value'] = 5
+    lines = registry.render().splitlines()
+    assert 'pybot_test_depth 5' in lines
+    assert 'pybot_test_chat_depth{chat="42"} 3' in lines
+
+
+def test_instrumented_repository_times_calls_and_passes_results_through():
+    def count() -> float:
+        return STORAGE_SECONDS.snapshot().get('test-backend,get_user', {}).get('count', 0)
+
+    repo = InstrumentedRepository(MemoryRepository(), 'test-backend')
+    repo.save_user({'name': 'ann', 'username': 'ann'})
+    before = count()
+    assert repo.get_user('ann') == {'name': 'ann', 'username': 'ann'}
+    assert repo.get_user('bob') is None
+    assert count() == before + 2
+    assert repo.get_user is repo.get_user  # wrapped once, then cached on the proxy
+    with pytest.raises(AttributeError):
+        repo.no_such_method
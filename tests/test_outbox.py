@@ -0,0 +1,104 @@
+import threading
+import time
+
+from telegram.error import BadRequest, RetryAfter
+
+from pybot.outbox import Outbox
+
+
+class RecordingSender:
+    """Records every delivered message and fails the ones scripted in ``errors``."""
+
+    def __init__(self, errors: dict[str, list[Exception]] | None = None, delay: float = 0.0):
+        self.errors = errors or {}
+        self.delay = delay
+        self.sent: list[tuple[int, str, float]] = []
+        self.active: set[int] = set()
+        self.overlaps = 0
+        self._lock = threading.Lock()
+
+    def send_message(self, chat_id: int, text: str, **kwargs) -> None:
+        with self._lock:
+            self.overlaps += chat_id in self.active
+            self.active.add(chat_id)
+        try:
+            time.sleep(self.delay)
+            if self.errors.get(text):
+                raise self.errors[text].pop(0)
+            with self._lock:
+                self.sent.append((chat_id, text, time.monotonic()))
+        finally:
+            with self._lock:
+                self.active.discard(chat_id)
+
+    def texts(self, chat_id: int) -> list[str]:
+        return [text for chat, text, _ in self.sent if chat == chat_id]
+
+
+def test_each_chat_gets_its_messages_in_order_one_at_a_time():
+    sender = RecordingSender(delay=0.001)
+    outbox = Outbox(sender, global_rate=10000, chat_rate=10000, chat_burst=10000, senders=4).start()
+    for n in range(50):
+        for chat in range(3):
+            assert outbox.send(chat, f'{chat}:{n}')
+    outbox.close()
+    assert all(sender.texts(chat) == [f'{chat}:{n}' for n in range(50)] for chat in range(3))
+    assert sender.overlaps == 0
+    assert outbox.stats()['sent'] == 150
+
+
+def test_global_bucket_caps_the_total_rate():
+    sender = RecordingSender()
+    outbox = Outbox(sender, global_rate=20, chat_rate=100, chat_burst=100, senders=4).start()
+    started = time.monotonic()
+    for chat in range(30):
+        outbox.send(chat, 'hi')
+    outbox.close()
+    # A full bucket covers the first 20 at once, the other 10 trickle out at 20 per second.
+    assert len(sender.sent) == 30
+    assert time.monotonic() - started >= 0.45
+
+
+def test_retry_after_pauses_only_the_affected_chat():
+    sender = RecordingSender(errors={'a1': [RetryAfter(0.3)]})
+    outbox = Outbox(sender, chat_rate=100, chat_burst=100, senders=2).start()
+    started = time.monotonic()
+    outbox.send(1, 'a1')
+    outbox.send(1, 'a2')
+    outbox.send(2, 'b1')
+    outbox.close()
+    assert sender.texts(1) == ['a1', 'a2']
+    times = {text: at - started for _, text, at in sender.sent}
+    assert times['a1'] >= 0.3
+    assert times['b1'] < 0.2
+    assert outbox.stats()['retried'] == 1
+
+
+def test_permanent_errors_drop_only_that_message():
+    sender = RecordingSender(errors={'a1': [BadRequest('Chat not found')]})
+    outbox = Outbox(sender, chat_rate=100, chat_burst=100).start()
+    outbox.send(1, 'a1')
+    outbox.send(1, 'a2')
+    outbox.close()
+    assert sender.texts(1) == ['a2']
+    assert outbox.stats()['failed'] == 1
+
+
+def test_long_texts_are_split_and_a_full_queue_drops_instead_of_blocking():
+    sender = RecordingSender()
+    outbox = Outbox(sender, max_queue=3)
+    assert outbox.send(1, 'x' * 5000)
+    assert not outbox.send(1, 'x' * 5000)
+    assert (outbox.stats()['queue_depth'], outbox.stats()['dropped']) == (2, 2)
+    outbox.start().close()
+    assert [len(text) for text in sender.texts(1)] == [4096, 904]
+
+
+def test_acquire_takes_from_the_same_global_bucket():
+    outbox = Outbox(RecordingSender(), global_rate=10)
+    started = time.monotonic()
+    for _ in range(10):
+        outbox.acquire()
+    assert time.monotonic() - started < 0.05
+    outbox.acquire()
+    assert time.monotonic() - started >= 0.09
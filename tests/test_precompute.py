@@ -0,0 +1,75 @@
+import json
+import threading
+
+from pybot.precompute import EventPrecomputer
+from pybot.repository.memory import MemoryRepository
+from pybot.service.user import UserProfile
+
+
+def events(name: str) -> list[dict[str, str]]:
+    return [{'name': name, 'date': '2025-05-01', 'link': 'https://example.com'}]
+
+
+class FakeEventService:
+    def __init__(self):
+        self.release = threading.Event()
+        self.release.set()
+        self.generated: list[str] = []
+        self.done = threading.Semaphore(0)
+
+    def generate_events(self, profile: UserProfile) -> list[dict[str, str]]:
+        self.release.wait(5)
+        self.generated.append(profile.username)
+        self.done.release()
+        return events(f'fresh for {profile.username}')
+
+    generate_more_events = generate_events
+
+    def store_events(self, username: str, events: list[dict[str, str]]) -> None:
+        pass
+
+
+class FakeUserService:
+    def get_user(self, username: str) -> UserProfile:
+        return UserProfile(username=username, interests={'vr'})
+
+
+def precomputer(clock, **kwargs) -> tuple[EventPrecomputer, FakeEventService, MemoryRepository]:
+    service, store = FakeEventService(), MemoryRepository()
+    users = FakeUserService()
+    pre = EventPrecomputer(service, users, store, ttl=900, interval=3600, clock=clock, **kwargs)  # type: ignore
+    return pre.start(), service, store
+
+
+def test_stale_set_is_served_and_refreshed_exactly_once(clock):
+    clock.now = 10000.0
+    pre, service, store = precomputer(clock)
+    profile = FakeUserService().get_user('ann')
+    key = pre.key('events', profile)
+    store.set(key, json.dumps({'generated': clock.now - 1000, 'events': events('old')}))
+
+    service.release.clear()
+    assert pre.recommend('events', profile) == events('old')
+    assert pre.recommend('events', profile) == events('old')  # still stale, refresh already running
+    service.release.set()
+    assert service.done.acquire(timeout=5)
+    pre.close()
+
+    assert service.generated == ['ann']
+    assert json.loads(store.get(key))['events'] == events('fresh for ann')
+    stats = pre.stats()
+    assert (stats['stale_hits'], stats['misses'], stats['refills']) == (2, 0, 1)
+
+
+def test_scan_fills_sets_only_for_recently_active_users(clock):
+    pre, service, store = precomputer(clock, active_window=3600, concurrency=4)
+    pre.touch('ann')
+    clock.advance(3000)
+    pre.touch('bob')
+    clock.advance(1000)  # ann was last seen 4000s ago, bob 1000s ago
+    pre._scan()
+    for _ in range(2):
+        assert service.done.acquire(timeout=5)
+    pre.close()
+    assert service.generated == ['bob', 'bob']  # one set per kind
+    assert pre.stats()['active_users'] == 1
@@ -0,0 +1,50 @@
+from pybot.prompt import PromptBuilder, count_tokens, truncate_tokens
+
+EVENTS = [f'- Event {n}: an evening of board games and snacks downtown\n' for n in range(30)]
+
+
+def build(budget: int) -> tuple[str, dict]:
+    builder = PromptBuilder(budget)
+    builder.add('Recommend three events for the user.\n')
+    builder.add('Interests: gaming, vr. ' * 20 + '\n', priority=2, min_tokens=8)
+    # Events are short enough that dropping whole ones beats truncating them.
+    builder.add_items(EVENTS, priority=1, min_items=2, min_tokens=20, omitted='({n} more events omitted)\n')
+    return builder.build(), builder.report
+
+
+def test_truncation_cuts_at_a_word_boundary():
+    text = 'one two three four five'
+    assert truncate_tokens(text, 100) == text
+    cut = truncate_tokens(text, 4)
+    assert cut == 'one two three…'
+    assert count_tokens(cut[:-1]) <= 4
+
+
+def test_prompt_within_budget_is_left_alone():
+    prompt, report = build(10000)
+    assert all(event in prompt for event in EVENTS)
+    assert report['tokens'] == report['original_tokens']
+    assert report['dropped_items'] == report['truncated_tokens'] == 0
+
+
+def test_lowest_priority_items_are_dropped_first_and_noted():
+    prompt, report = build(300)
+    assert not report['over_budget']
+    assert report['tokens'] == count_tokens(prompt) <= 300
+    assert prompt.startswith('Recommend three events for the user.\n')
+    assert prompt.count('Interests: gaming, vr.') == 20  # the higher-priority section is untouched
+    kept = [event for event in EVENTS if event in prompt]
+    assert kept == EVENTS[: len(kept)]
+    assert f'({len(EVENTS) - len(kept)} more events omitted)' in prompt
+
+
+def test_higher_priority_section_shrinks_only_after_the_lower_one_is_at_its_minimum():
+    prompt, report = build(60)
+    assert sum(event in prompt for event in EVENTS) == 2
+    assert prompt.count('Interests: gaming, vr.') < 20
+    assert report['truncated_tokens'] > 0
+
+
+def test_identical_input_builds_identical_prompts():
+    assert len({build(budget)[0] for budget in (150, 150, 150)}) == 1
+    assert build(150)[0] != build(300)[0]
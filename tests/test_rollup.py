@@ -0,0 +1,63 @@
+from pybot.repository.memory import MemoryRepository
+from pybot.rollup import LogRollup
+
+
+def event(timestamp: float, command: str = 'events', username: str = 'alice', success: bool = True, latency=0.2):
+    return {'timestamp': timestamp, 'command': command, 'username': username, 'success': success, 'latency': latency}
+
+
+def test_writers_merge_into_one_record_per_period(clock):
+    clock.now = 7200.0
+    repo = MemoryRepository(clock)
+    writers = [LogRollup(repo, clock=clock) for _ in range(3)]
+    for i, rollup in enumerate(writers):
+        rollup.add(event(7200.0 + i, success=i != 0))
+        rollup.add(event(7210.0, command='add', username='bob'))
+        rollup.flush()
+
+    commands, alice = writers[0].summarize('minute', 60, 'alice')
+    assert commands['events'].count == 3
+    assert commands['events'].ok == 2
+    assert commands['events'].quantile(0.95) == 250
+    assert commands['add'].count == 3
+    assert alice.count == 3
+    # One record per command period and one per active user, at each resolution.
+    assert sum(rollup.stats()['written'] for rollup in writers) == 3 * 2 * 3
+
+
+def test_reads_are_bounded_by_the_periods_asked_for(clock):
+    repo = MemoryRepository(clock)
+    rollup = LogRollup(repo, clock=clock)
+    for minute in range(600):
+        clock.now = minute * 60.0
+        rollup.add(event(clock.now, username=f'user{minute}'))
+        rollup.flush()
+
+    keys: list[list[str]] = []
+    get_fields = repo.get_fields
+    repo.get_fields = lambda k: keys.append(k) or get_fields(k)  # type: ignore
+    commands, _ = rollup.summarize('minute', 60, 'user599')
+    assert commands['events'].count == 60
+    assert len(keys[0]) == 2 * 60
+
+
+def test_records_expire_after_the_retention(clock):
+    repo = MemoryRepository(clock)
+    rollup = LogRollup(repo, minute_retention=3600, clock=clock)
+    rollup.add(event(0.0))
+    rollup.flush()
+    clock.now = 3600.0
+    assert repo.get_fields([LogRollup.key('minute', 0)]) == [{}]
+    assert rollup.summarize('hour', 2)[0]['events'].count == 1
+
+
+def test_failed_writes_are_counted_not_retried(clock):
+    class Failing:
+        def incr_fields(self, amounts, ttl=None):
+            raise ConnectionError('down')
+
+    rollup = LogRollup(Failing(), clock=clock)  # type: ignore
+    rollup.add(event(0.0))
+    rollup.flush()
+    rollup.flush()
+    assert rollup.stats() == {'pending_periods': 0, 'events': 1, 'written': 0, 'failed': 4}
@@ -0,0 +1,65 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pybot.deadline import deadline
+from pybot.singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_execution():
+    flight: SingleFlight[int] = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fn() -> int:
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 42
+
+    with ThreadPoolExecutor(5) as pool:
+        leader = pool.submit(flight.do, 'k', fn)
+        started.wait(5)
+        followers = [pool.submit(flight.do, 'k', fn) for _ in range(4)]
+        time.sleep(0.05)
+        release.set()
+        assert [f.result() for f in (leader, *followers)] == [42] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {'in_flight': 0, 'executed': 1, 'deduplicated': 4}
+
+
+def test_errors_reach_every_caller_and_are_not_cached():
+    flight: SingleFlight[int] = SingleFlight()
+    release = threading.Event()
+
+    def fail() -> int:
+        release.wait(5)
+        raise ValueError('upstream')
+
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(flight.do, 'k', fail)
+        time.sleep(0.05)
+        follower = pool.submit(flight.do, 'k', fail)
+        time.sleep(0.05)
+        release.set()
+        for future in (leader, follower):
+            with pytest.raises(ValueError):
+                future.result()
+    assert flight.do('k', lambda: 1) == 1
+
+
+def test_follower_stops_waiting_at_its_own_deadline():
+    flight: SingleFlight[int] = SingleFlight()
+    release = threading.Event()
+    leader = threading.Thread(target=flight.do, args=('k', lambda: release.wait(5) and 1))
+    leader.start()
+    time.sleep(0.05)
+    started = time.monotonic()
+    with deadline(0.1), pytest.raises(TimeoutError):
+        flight.do('k', lambda: 2)
+    assert time.monotonic() - started < 1.0
+    release.set()
+    leader.join()
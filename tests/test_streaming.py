@@ -0,0 +1,80 @@
+import pytest
+from telegram.error import BadRequest
+
+from pybot.streaming import MAX_MESSAGE_LENGTH, StreamingReply, split_message
+
+
+class FakeMessage:
+    def __init__(self, bot: 'FakeBot', text: str):
+        self.bot = bot
+        self.edits: list[tuple[float, str]] = []
+        self.text = text
+
+    def edit_text(self, text: str) -> None:
+        if text == self.text:
+            raise BadRequest('Message is not modified: specified new message content is the same')
+        self.edits.append((self.bot.clock(), text))
+        self.text = text
+
+
+class FakeBot:
+    def __init__(self, clock):
+        self.clock = clock
+        self.messages: list[FakeMessage] = []
+
+    def send_message(self, chat_id: int, text: str) -> FakeMessage:
+        self.messages.append(FakeMessage(self, text))
+        return self.messages[-1]
+
+
+def test_edits_are_throttled_and_finish_shows_the_whole_reply(clock):
+    bot = FakeBot(clock)
+    reply = StreamingReply(bot, 1, min_interval=1.0, clock=clock).start()
+    for word in ['Hello', ' there', ',', ' how', ' are', ' you', '?']:
+        reply.feed(word)
+        clock.advance(0.4)
+    clock.advance(1.0)
+    assert reply.finish() == 'Hello there, how are you?'
+    (message,) = bot.messages
+    times = [at for at, _ in message.edits]
+    assert all(later - earlier >= 1.0 for earlier, later in zip(times, times[1:]))
+    assert len(message.edits) < 7
+    assert message.text == 'Hello there, how are you?'
+
+
+def test_long_replies_roll_over_into_new_messages(clock):
+    bot = FakeBot(clock)
+    reply = StreamingReply(bot, 1, min_interval=0, clock=clock).start()
+    line = 'x' * 99 + '\n'
+    for _ in range(100):
+        reply.feed(line)
+    text = reply.finish()
+    assert text.replace('\n', '') == ('x' * 99) * 100
+    assert [len(m.text) for m in bot.messages] == [len(part) for part in split_message(line * 100)]
+    assert all(len(m.text) <= MAX_MESSAGE_LENGTH for m in bot.messages)
+    assert len(bot.messages) == 3
+
+
+def test_not_modified_errors_are_ignored(clock):
+    bot = FakeBot(clock)
+    reply = StreamingReply(bot, 1, min_interval=0, placeholder='…', clock=clock).start()
+    bot.messages[0].text = 'Hi'  # e.g. an earlier edit went through but its answer was lost
+    reply.feed('Hi')
+    assert reply.finish() == 'Hi'
+
+
+def test_other_edit_errors_still_surface(clock):
+    def blocked(text: str) -> None:
+        raise BadRequest('Chat not found')
+
+    bot = FakeBot(clock)
+    reply = StreamingReply(bot, 1, min_interval=0, clock=clock).start()
+    bot.messages[0].edit_text = blocked  # type: ignore
+    with pytest.raises(BadRequest):
+        reply.feed('Hi')
+
+
+def test_empty_reply_is_replaced_with_a_notice(clock):
+    bot = FakeBot(clock)
+    assert StreamingReply(bot, 1, clock=clock).start().finish('Nothing yet.') == 'Nothing yet.'
+    assert bot.messages[0].text == 'Nothing yet.'
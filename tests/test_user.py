@@ -0,0 +1,33 @@
+import json
+
+import pytest
+from pydantic import ValidationError
+
+from pybot.repository.memory import MemoryRepository
+from pybot.service.chatgpt import ChatGPTService
+from pybot.service.user import UserProfile, UserService
+from pybot.setting import ChatGPTConfig, ProfileCacheConfig
+
+
+class JSONOnlyRepository(MemoryRepository):
+    """Stores users the way document stores do: only JSON types are accepted."""
+
+    def save_user(self, user: dict) -> None:
+        super().save_user(json.loads(json.dumps(user)))
+
+
+def test_registered_profile_round_trips_through_a_json_only_backend():
+    repo = JSONOnlyRepository()
+    chatgpt = ChatGPTService(
+        ChatGPTConfig(basicurl='http://llm.invalid', modelname='m', apiversion='1', access_token='')
+    )
+    UserService(chatgpt, repo).register_user('ann', ['vr', 'gaming', 'vr'], ' likes shooters ')
+    assert repo.get_user('ann')['interests'] == ['gaming', 'vr']
+    profile = UserService(chatgpt, repo).get_user('ann')
+    assert profile == UserProfile(username='ann', interests={'gaming', 'vr'}, description='likes shooters')
+
+
+def test_invalidation_backend_without_pub_sub_is_rejected_at_load():
+    assert ProfileCacheConfig(invalidation='redis').invalidation == 'redis'
+    with pytest.raises(ValidationError):
+        ProfileCacheConfig(invalidation='firebase')
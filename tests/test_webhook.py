@@ -0,0 +1,67 @@
+import queue
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+from fakes import FakeTelegram, update_payload
+
+from pybot.webhook import WebhookServer
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def serve(on_update, **kwargs) -> tuple[WebhookServer, FakeTelegram]:
+        server = WebhookServer(on_update, listen='127.0.0.1', port=0, **kwargs)
+        servers.append(server)
+        host, port = server.start().address
+        return server, FakeTelegram([f'http://{host}:{port}/telegram'], kwargs.get('secret_token'))
+
+    yield serve
+    for server in servers:
+        server.stop()
+
+
+def test_posted_update_is_handed_over_and_acknowledged(serve):
+    updates = []
+    server, telegram = serve(updates.append)
+    assert telegram.post(update_payload(1, 42, 'ann', '/hello')) == 200
+    assert [(u['update_id'], u['message']['text']) for u in updates] == [(1, '/hello')]
+    assert server.received == 1
+
+
+def test_updates_without_the_secret_token_are_forbidden(serve):
+    updates = []
+    _, telegram = serve(updates.append, secret_token='s3cret')
+    assert telegram.post(update_payload(1, 42, 'ann', 'hi')) == 200
+    for token in ('wrong', None):
+        telegram.secret_token = token
+        assert telegram.post(update_payload(2, 42, 'ann', 'hi')) == 403
+    assert len(updates) == 1
+
+
+def test_full_update_queue_is_refused_so_telegram_retries(serve):
+    updates: queue.Queue[dict] = queue.Queue(maxsize=1)
+    server, telegram = serve(updates.put_nowait)
+    assert telegram.post(update_payload(1, 42, 'ann', 'hi')) == 200
+    assert telegram.post(update_payload(2, 42, 'ann', 'hi')) == 503
+    assert (server.received, server.rejected) == (1, 1)
+
+
+def test_ready_reports_the_bot_state(serve):
+    ready = threading.Event()
+    server, _ = serve(lambda update: None, ready=ready.is_set)
+    host, port = server.address
+
+    def probe() -> int:
+        try:
+            with urllib.request.urlopen(f'http://{host}:{port}/ready', timeout=5) as response:
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    assert probe() == 503
+    ready.set()
+    assert probe() == 200